@@ -16,20 +16,22 @@ import sys
 import os
 import math
 import datetime
-import addon_utils
-import bmesh
+import traceback
+import numpy as np
+
+from . import raster_io
+from . import shape_io
+from . import trail
+from . import image_io
+from . import vegetation
+from .heightfield import HeightField
+from . import watcher
+from .terrain_tiles import TerrainTiles, gridMesh
+from .image_cache import ImageCache, contentHash
+from .render_index import RenderIndex
+from .settings import getSettings
+from .metrics import timed
 
-from bpy.props import *
-from . import mesh_helpers
-from .settings import getSettings, setSettings
-
-from bpy.props import (
-        StringProperty,
-        EnumProperty,
-        )
-
-import bpy.utils.previews
-from bpy.types import WindowManager
 from mathutils import Vector
 
 watchName = "Watch"
@@ -41,11 +43,34 @@ vantageFile = "vantage.shp"
 waterFile = "water.tif"
 emptyFile = "empty.txt"
 CRS = "EPSG:3358"
+# timer step of the watch mode, ticks only drain the watcher queue #
+drainStep = .05
+# seconds a file must stay unchanged before it is considered written #
+settleTime = .25
+# chunk size in pixels, resolution levels and level distance of the tiled
+# terrain #
+tileSize = 128
+tileLevels = 3
+tileDistance = 250.0
+# trail resampling step and boardwalk height above ground in meters #
+trailSpacing = 1.0
+trailLift = 2.5
+# water rasters hold depths above the terrain rather than water levels #
+waterDepth = False
+# memory limit in megabytes of the content addressed image cache, shared by
+# the texture and patch layers #
+imageCacheSize = 256
+imageCache = ImageCache(imageCacheSize)
+# layers decoded off the main thread, file path -> data for the handler #
+decoders = {"terrain": raster_io.readRaster, "water": raster_io.readRaster,
+            "trail": shape_io.readShapes, "vantage": shape_io.readShapes,
+            "patch": imageCache.decoder(image_io.readPNG)}
 
 class Prefs:
     def __init__(self):
-        self.watchFolder =  getSettings()['folder'] + "/" + watchName
-        self.scratchFolder =  getSettings()['folder'] + "/" + "scratch"
+        settings = getSettings()
+        self.watchFolder =  settings['folder'] + "/" + watchName
+        self.scratchFolder =  settings['folder'] + "/" + "scratch"
         self.terrainPath = os.path.join(self.watchFolder, terrainFile)
         self.DEMPath = os.path.join(self.watchFolder, DEMFile)
         self.texturePath = os.path.join(self.watchFolder, textureFile)
@@ -54,86 +79,81 @@ class Prefs:
         self.waterPath = os.path.join(self.watchFolder, waterFile)
         self.emptyPath = os.path.join(self.watchFolder, emptyFile)
 
-        self.CRS = "EPSG:" + getSettings()['CRS']
-        self.timer = getSettings()['timer']
-
-def addSide(objName,mat):
-
-    ter = bpy.data.objects[objName]
-    ter.select=True
-
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.select_all(action='DESELECT')
-    me = ter.data
+        self.CRS = "EPSG:" + settings['CRS']
+        self.timer = settings['timer']
+        self.inPlace = settings.get('inPlace', True)
+        self.budget = settings.get('budget', 40)
+        self.tiled = settings.get('tiled', False)
+        self.memoryBudget = settings.get('memoryBudget', 0)
 
-    if ter.mode == 'EDIT':
-        bm = bmesh.from_edit_mesh(ter.data)
-        vertices = bm.verts
+@timed
+def addSide(objName, mat, depth=-50, tres=3):
+    """ builds the terrain skirt: pushes the vertices on the bounding box
+    edges down to depth and assigns the passed material to the side faces.
+    Works on flat coordinate arrays without switching to edit mode """
 
-    else:
-        vertices = ter.data.vertices
-
-    verts = [ter.matrix_world * vert.co for vert in vertices]
+    me = bpy.data.objects[objName].data
+    co = getCoords(me)
+    co[edgeMask(co, tres), 2] = depth
+    setCoords(me, co)
 
-    dic={"x":[], "y":[], "z":[]}
-    for vert in verts:
-        if not math.isnan(vert[0]):
-            dic["x"].append(vert[0])
-            dic["y"].append(vert[1])
-            dic["z"].append(vert[2])
+    # side faces have normals going neither up nor down #
+    normals = np.empty(len(me.polygons) * 3, dtype=np.float32)
+    me.polygons.foreach_get("normal", normals)
+    side = np.abs(normals[2::3]) <= .2
 
-    xmin = min(dic["x"])
-    xmax = max(dic["x"])
-    ymin = min(dic["y"])
-    ymax = max(dic["y"])
-    zmin = min(dic["z"])
+    index = np.empty(len(me.polygons), dtype=np.int16)
+    me.polygons.foreach_get("material_index", index)
+    index[side] = setSlot(me, mat, 1)
+    me.polygons.foreach_set("material_index", index)
+    me.update()
 
-    tres = 3
+def getCoords(me):
+    """ returns the vertex coordinates of the passed mesh as a (n, 3)
+    float32 array, read in bulk with foreach_get """
 
-    for vert in vertices:
-        if vert.co[0] < xmin + tres and vert.co[0] > xmin-tres:
-            vert.select = True
-            vert.co[2] = -50
+    co = np.empty(len(me.vertices) * 3, dtype=np.float32)
+    me.vertices.foreach_get("co", co)
+    return co.reshape(-1, 3)
 
-        elif vert.co[1] < ymin + tres and vert.co[1] > ymin-tres:
-            vert.select = True
-            vert.co[2] = -50
 
-        elif vert.co[0] < xmax + tres and vert.co[0] > xmax-tres:
-            vert.select = True
-            vert.co[2] = -50
-        elif vert.co[1] < ymax + tres and vert.co[1] > ymax-tres:
-            vert.select = True
-            vert.co[2] = -50
-    #bpy.ops.transform.translate(value=(0, 0, -100), constraint_axis=(False, False, True), constraint_orientation='GLOBAL', mirror=False, proportional='DISABLED', proportional_edit_falloff='SHARP', proportional_size=45.2593)
+def setCoords(me, co):
+    """ writes a (n, 3) coordinate array back to the mesh vertices in bulk
+    and updates the mesh """
 
-    bmesh.update_edit_mesh(me, True)
+    me.vertices.foreach_set("co", np.ascontiguousarray(co, np.float32).ravel())
+    me.update()
 
-    def NormalInDirection( normal, direction, limit = .5):
-        return direction.dot( normal ) > limit
 
-    def GoingUp( normal, limit = .5):
-        return NormalInDirection( normal, Vector( (0, 0, 1 ) ), limit )
+def edgeMask(co, tres=3):
+    """ returns a boolean mask of the vertices lying within tres of the
+    bounding box edges of the passed coordinate array (the terrain skirt) """
 
-    def GoingDown( normal, limit = .5 ):
-        return NormalInDirection( normal, Vector( (0, 0, -1 ) ), limit )
+    x = co[:, 0]
+    y = co[:, 1]
+    valid = ~np.isnan(x)
+    xmin, xmax = x[valid].min(), x[valid].max()
+    ymin, ymax = y[valid].min(), y[valid].max()
+    return valid & ((np.abs(x - xmin) < tres) | (np.abs(x - xmax) < tres) |
+                    (np.abs(y - ymin) < tres) | (np.abs(y - ymax) < tres))
 
-    def GoingSide( normal, limit = .2 ):
-        return ( GoingUp( normal, limit ) == False and
-        GoingDown( normal, limit ) == False )
 
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
+def sceneOrigin(scene=None):
+    """ returns the georeferencing origin BlenderGIS stores in the scene,
+    which is subtracted from the coordinates of imported objects """
 
-    #Selects faces going side
+    scene = scene or bpy.context.scene
+    return scene.get("crs x", 0.0), scene.get("crs y", 0.0)
 
-    for face in ter.data.polygons:
-        face.select = GoingSide(face.normal)
 
-    bpy.ops.object.mode_set(mode='EDIT', toggle=False)
+def objectExtent(obj):
+    """ returns the (xmin, ymin, xmax, ymax) world extent of an object """
 
+    corners = [obj.matrix_world * Vector(c) for c in obj.bound_box]
+    xs = [c.x for c in corners]
+    ys = [c.y for c in corners]
+    return min(xs), min(ys), max(xs), max(ys)
 
-    changeMat(objName,mat,2)
-    bpy.ops.object.mode_set(mode='OBJECT', toggle=False)
 
 def shrinkRaster2Obj(obj, target, method="NEAREST_VERTEX",
                      offset=0, delModifier=True):
@@ -194,42 +214,52 @@ def smooth(obj, factor=2, iterations=4):
     modifier.iterations = iterations
 
 
-def changeTex(obj, texturePath):
-    """Changes the texture of an object based on the passed texturePath
-    To maximize performance texture swap is done changing surface material"""
+def changeTex(obj, texturePath, name="Raster Tec", img=None):
+    """Changes the texture of an object based on the passed texturePath, or
+    to the passed image datablock.
+    To maximize performance one image, texture and material are kept: the
+    first call creates them, later calls only reload the image pixels in
+    place and no datablocks are added"""
 
-    obj = selectOnly(obj)
+    me = bpy.data.objects[obj].data
     texPath = os.path.expanduser(texturePath)
-    # remove previous material from material slot #
-    if obj.material_slots:
-        # for slot,index in zip(obj.material_slots, range(20)):
-        for slot in obj.material_slots:
-            bpy.ops.object.material_slot_remove()
 
-    try:
-        img = bpy.data.images.load(texPath)
-
-    except:
-        raise NameError("Cannot load image [0]".format(texPath))
+    if img is None:
+        img = bpy.data.images.get(name)
+        try:
+            if img is None:
+                img = bpy.data.images.load(texPath)
+                img.name = name
+            else:
+                img.filepath = texPath
+                img.reload()
+        except:
+            raise NameError("Cannot load image {0}".format(texPath))
 
-    # Create image texture from image
-    cTex = bpy.data.textures.new("Raster Tec", type="IMAGE")
+    # Image texture and material are created once #
+    cTex = bpy.data.textures.get(name)
+    if cTex is None:
+        cTex = bpy.data.textures.new(name, type="IMAGE")
     cTex.image = img
 
-    # Create material
-    mat = bpy.data.materials.new('P')
+    mat = bpy.data.materials.get(name)
+    if mat is None:
+        mat = bpy.data.materials.new(name)
 
-    # Add texture slot for color texture
-    mtex = mat.texture_slots.add()
-    mtex.texture = cTex
-    mtex.texture_coords = 'UV'
-    mtex.use_map_color_diffuse = True
-    mtex.use_map_color_emission = True
-    mtex.emission_color_factor = 0.5
-    mtex.use_map_density = True
-    mtex.mapping = 'FLAT'
-    me = obj.data
-    me.materials.append(mat)
+        # Add texture slot for color texture
+        mtex = mat.texture_slots.add()
+        mtex.texture = cTex
+        mtex.texture_coords = 'UV'
+        mtex.use_map_color_diffuse = True
+        mtex.use_map_color_emission = True
+        mtex.emission_color_factor = 0.5
+        mtex.use_map_density = True
+        mtex.mapping = 'FLAT'
+
+    # surface slot only, the skirt keeps its side material #
+    if not me.materials or me.materials[0] != mat:
+        setSlot(me, mat.name, 0)
+    return mat
 
 
 def selectOnly(obj, delete=False):
@@ -304,6 +334,8 @@ def findNearVert(coord, targetDic, estimate=2.5):
 def calcArea(obj):
     """ Report the surface area of the active mesh """
 
+    from . import mesh_helpers
+
     obj = bpy.data.objects[obj]
     bm = mesh_helpers.bmesh_copy_from_object(obj, apply_modifiers=True)
     area = mesh_helpers.bmesh_calc_area(bm)*.2
@@ -340,7 +372,8 @@ def toggleCam(camInitial, multiple=True, adaptGrass=False):
 
         bpy.context.scene.camera = Camera
         bpy.context.scene.objects.active = Camera
-        bpy.ops.view3d.object_as_camera()
+        if bpy.ops.view3d.object_as_camera.poll():
+            bpy.ops.view3d.object_as_camera()
 
 
 def getTime(returnType):
@@ -358,15 +391,22 @@ def getTime(returnType):
         return fullTime
 
 
-def makeScratchfile(fPath, fType):
-    """ Renames the passed file relative to the current time and puts in
-    the scratch path"""
+def makeScratchfile(fPath, fType, scratchFolder=None, tag=None):
+    """ Renames the passed file relative to the current time, and tag when
+    given, and puts in the scratch path, next to the folder of the file by
+    default. Returns the new path of the (main) file"""
     out_time = getTime("time")
-    fName = os.path.basename(fPath).split(".")[0]
-    scratchFolder = os.path.normpath(os.path.dirname(fPath) +
-                    os.sep + os.pardir) +  "\\scratch"
-
-    scratchName = scratchFolder + "/" + fName + "_" + out_time
+    if tag:
+        out_time += "_" + tag
+    fName, fExt = os.path.splitext(os.path.basename(fPath))
+    if scratchFolder is None:
+        scratchFolder = os.path.join(os.path.dirname(os.path.dirname(
+                                     os.path.abspath(fPath))), "scratch")
+    if not os.path.isdir(scratchFolder):
+        os.makedirs(scratchFolder)
+
+    scratchName = os.path.join(scratchFolder, fName + "_" + out_time)
+    outFile = None
     try:
 
         if fType == "raster":
@@ -375,18 +415,25 @@ def makeScratchfile(fPath, fType):
         elif fType == "text":
             outFile = scratchName + ".txt"
             os.rename(fPath, outFile)
+        elif fType == "texture":
+            outFile = scratchName + fExt
+            if os.path.exists(outFile):
+                os.remove(outFile)
+            os.rename(fPath, outFile)
 
         if fType == "vector":
             for ext in [".shp", ".shx", ".prj", ".dbf"]:
                 fpathNew = fPath[:-4] + ext
-                outFile = scratchName + ext
-                os.rename(fpathNew, outFile)
+                os.rename(fpathNew, scratchName + ext)
+            outFile = scratchName + ".shp"
     except:
-        print("could not rename the {0} file").format(fPath)
+        print("could not rename the {0} file".format(fPath))
+    return outFile
 
 
 def particle(obj, setting = None, specieType = None, count = None, specieSize=.6, rotation=.02,
-             rotObj="OB_Y", group=False, vertexGroup=False, particle_name="particle_setting", texture=False):
+             rotObj="OB_Y", group=False, vertexGroup=False, particle_name="particle_setting", texture=False,
+             emitFrom="FACE"):
     """ Get object, specie type, specie count, and specie size
     and apply particle system """
     selectOnly(obj)
@@ -398,7 +445,7 @@ def particle(obj, setting = None, specieType = None, count = None, specieSize=.6
     psys1.name = particle_name
 
     if setting:
-        psys.settings = setting
+        psys1.settings = bpy.data.particles[setting]
 
     else:
         psys1.seed = 4
@@ -430,7 +477,11 @@ def particle(obj, setting = None, specieType = None, count = None, specieSize=.6
             active_texture = bpy.data.textures[texture]
 
         pset1.lifetime_random = 0.0
-        pset1.emit_from = 'FACE'
+        pset1.emit_from = emitFrom
+        if emitFrom == 'VERT':
+            # one particle per vertex, all shown from the first frame #
+            pset1.frame_start = pset1.frame_end = 1
+            pset1.show_unborn = True
         pset1.distribution = 'JIT'
         pset1.count = count
         pset1.use_render_emitter = True
@@ -465,6 +516,16 @@ def particle_clone(particleDic, clone):
         psys.name = i
         psys.settings = bpy.data.particles[particleDic[i]]
 
+def setSlot(me, mat, index):
+    """ puts the passed material in the given material slot of the mesh,
+    adding empty slots if needed, and returns the slot index """
+
+    while len(me.materials) <= index:
+        me.materials.append(None)
+    me.materials[index] = bpy.data.materials.get(mat)
+    return index
+
+
 def changeMat(obj, mat, slot=1):
 
     obj = bpy.data.objects[obj]
@@ -493,6 +554,8 @@ def remove(wildCard, all=False):
 
 def subdivide(cutNo):
 
+    import bmesh
+
     if bpy.ops.object.mode_set.poll():
         bpy.ops.object.mode_set(mode='EDIT')
         obj = bpy.context.active_object
@@ -505,7 +568,6 @@ class Adapt:
     def __init__(self):
 
         self.plane = "terrain"
-        self.terrain = bpy.data.objects[self.plane]
         self.treePatch = "TreePatch"
         self.trail = "trail"
         self.indexlist = []
@@ -516,66 +578,63 @@ class Adapt:
         self.humanCamera = "Camera"
         self.humanTarg = "HumanCamTarg"
 
-        self.engine = bpy.context.scene.render.engine
-        self.world = bpy.context.scene.world.name
-        self.realism = self.world.split(".")[1]
-
-
         self.vantage = "vantage"
         self.vantagetxt = "vantage.txt"
         self.target = "camtarget"
         self.vantageCam = "VantageCam"
         self.camWalk = "Camwalk"
-        self.scene = bpy.context.scene
+        self.resolve()
+        # engine and realism versions of the materials, lamps and groups #
+        self.renderIndex = RenderIndex()
+
+        # last terrain raster (elevation, geotransform, nodata), its height
+        # field, vertex mapping and the extent changed by the last terrain
+        # update #
+        self.elevation = None
+        self.heights = None
+        self.dirtyRegion = None
+        self._grid = None
+        self._waterGrid = None
+        self.tiles = None
+        # scene (x, y) of the vantage camera and target of the last update #
+        self.vantageLine = None
+        # resampled (n, 2) trail polylines in scene coordinates #
+        self.trailLines = []
+        # class -> (terrain extent, raster content hash) of the placed tree
+        # patches #
+        self.patches = {}
+
+    def resolve(self):
+        """ looks up the scene objects and the engine and realism state,
+        again whenever the session finds them stale """
 
+        self.scene = bpy.context.scene
+        self.terrain = bpy.data.objects[self.plane]
         self.clouds = bpy.data.objects["Clouds"]
         self.sun = bpy.data.objects["Sun"]
 
+        self.engine = self.scene.render.engine
+        self.world = self.scene.world.name
+        self.realism = self.world.split(".")[1]
 
+    @timed
     def changeEngine(self, mode, real):
 
-        # Change materials #
+        # Change materials, only the slots whose material changes #
         if mode != self.engine or real != self.realism:
-
-            for obj in bpy.data.objects:
-
-                for index, mat in enumerate(obj.material_slots):
-                    if not obj.hide:
-
-                        if (mat.name.split(".")[0] == self.engine[0] and
-                                "cube" not in obj.name):
-
-                            if self.realism in mat.name:
-                                newMatName = (mode[0] + "." +
-                                mat.name.split(".")[1] + "." + real)
-                            else:
-                                newMatName = (mode[0] + "." +
-                                mat.name.split(".")[1])
-
-                            mat = bpy.data.materials.get(newMatName)
-                            obj.data.materials[index] = mat
+            self.renderIndex.switchMaterials(self.engine, mode, real)
 
         if mode != self.engine:
-                for lamp in bpy.data.lamps:
-                    lampInd = lamp.name.split(".")[0]
-
-                    if lampInd == self.engine[0] or lampInd == mode[0]:
-                        newLampName = mode[0] + lamp.name[1:]
-                        if (newLampName in bpy.data.objects and
-                            not bpy.data.objects[newLampName].hide ):
-                            newLamp = bpy.data.objects[newLampName]
-                            oldLamp = bpy.data.objects[lamp.name]
-                            oldLamp.layers[0] = False
-                            oldLamp.layers[3] = True
-                            newLamp.layers[0] = True
+                self.renderIndex.switchLamps(self.engine, mode)
 
                 # Change rendere engine #
                 bpy.context.scene.render.engine = mode
                 self.engine = mode
                 # Change background #
 
-        # Change render mode #
-        for area in bpy.context.screen.areas:
+        # Change render mode, no screen in background mode #
+        screen = bpy.context.screen
+        for area in (screen.areas if screen else ()):
             if area.type == 'VIEW_3D':
                 for space in area.spaces:
                     if space.type == 'VIEW_3D':
@@ -593,23 +652,14 @@ class Adapt:
 
         newWorld = engine + "." + realism
         bpy.context.scene.world = bpy.data.worlds[newWorld]
-        self.world= bpy.data.worlds[newWorld]
+        self.world = newWorld
+        self.realism = realism
 
     def changeRealism(self,mode):
 
         self.realism = mode
-        if self.terrain.particle_systems:
-            for particle in self.terrain.particle_systems:
-                setting = particle.settings
-                if setting.count== 1:
-                    newParticle= mode + "_" + particle.name + "_single"
-                else:
-                    newParticle = mode + "_" + particle.name
-
-                if setting.render_type == 'GROUP':
-                    setting.dupli_group = bpy.data.groups[newParticle]
-                else:
-                    setting.dupli_object = bpy.data.objects[newParticle]
+        # terrain and tree patch emitters get the groups of the realism #
+        self.renderIndex.switchGroups(mode)
 
         if mode == "High":
           self.clouds.hide = True
@@ -621,9 +671,208 @@ class Adapt:
 
         self.changeEngine(self.engine,mode)
 
-    def terrainChange(self,Path, CRS):
+    def terrainGrid(self, ter, geotransform, shape):
+        """ returns the (co, inner, row, col, zOffset) mapping of the terrain
+        vertices, skirt excluded, to the raster pixels. Cached until the
+        mesh, its location or the raster grid change. None if the raster
+        does not cover the terrain """
+
+        me = ter.data
+        loc = ter.matrix_world.translation
+        key = (me.as_pointer(), len(me.vertices), geotransform, shape,
+               tuple(loc))
+        if self._grid is not None and self._grid[0] == key:
+            return self._grid[1]
+
+        co = getCoords(me)
+        # keep the skirt vertices where addSide pushed them #
+        inner = np.flatnonzero(~np.isnan(co[:, 0]) & ~edgeMask(co))
+        originX, originY = sceneOrigin(self.scene)
+        row, col = raster_io.pixelIndex(co[inner, 0] + loc.x + originX,
+                                        co[inner, 1] + loc.y + originY,
+                                        geotransform)
+        if (not len(inner) or row.min() < 0 or col.min() < 0 or
+                row.max() >= shape[0] or col.max() >= shape[1]):
+            self._grid = None
+            return None
+
+        self._grid = (key, (co, inner, row, col, loc.z))
+        return self._grid[1]
+
+    def terrainUpdate(self, Path, CRS, raster=None, tile=32):
+        """Rewrites the vertex heights of the existing terrain mesh from the
+        passed raster, read with the builtin GeoTIFF reader unless already
+        decoded (raster_io.readRaster output). Materials, UVs, modifiers and
+        particle systems stay attached.
+        The raster is diffed against the previous one in tile x tile blocks,
+        only vertices in changed blocks are rewritten and the changed extent
+        is published as dirtyRegion. Returns None if the raster is corrupt,
+        False if it is in a format the reader does not support or does not
+        cover the terrain grid
+        """
+
+        ter = bpy.data.objects[self.plane]
+        try:
+            elev, geotransform, nodata = raster or raster_io.readRaster(Path)
+        except NotImplementedError as e:
+            print("Cannot read {0} in place: {1}".format(Path, e))
+            return False
+        except (IOError, OSError, KeyError, ValueError) as e:
+            print("Cannot read {0}: {1}".format(Path, e))
+            return None
+        if geotransform is None:
+            return False
+
+        grid = self.terrainGrid(ter, geotransform, elev.shape)
+        if grid is None:
+            return False
+        co, inner, row, col, zOffset = grid
+
+        tiles = self.changedTiles(elev, geotransform, tile)
+        self.setElevation((elev, geotransform, nodata))
+        self.terrain = ter
+        if not tiles.any():
+            self.dirtyRegion = None
+            return True
+
+        changed = tiles[row // tile, col // tile]
+        index, r, c = inner[changed], row[changed], col[changed]
+        z = elev[r, c].astype(np.float32)
+        valid = ~np.isnan(z)
+        if nodata is not None:
+            valid &= z != nodata
+        co[index[valid], 2] = z[valid] - zOffset
+        setCoords(ter.data, co)
+
+        self.dirtyRegion = self.tileRegion(tiles, tile)
+        self.terrainDependents(self.dirtyRegion)
+        return True
+
+    def changedTiles(self, elev, geotransform, tile=32):
+        """ returns the mask of the tile x tile blocks where the passed raster
+        differs from the last terrain raster, all set without one """
+
+        previous = self.elevation
+        if (previous is not None and previous[0].shape == elev.shape and
+                previous[1] == geotransform):
+            return raster_io.changedTiles(previous[0], elev, tile)
+        return np.ones((-(-elev.shape[0] // tile),
+                        -(-elev.shape[1] // tile)), bool)
+
+    def tileRegion(self, tiles, tile=32):
+        """ returns the scene extent of the set tiles of the last terrain
+        raster """
+
+        elev, geotransform, nodata = self.elevation
+        bounds = raster_io.tileBounds(tiles, tile, elev.shape, geotransform)
+        if bounds is None:
+            return None
+        originX, originY = sceneOrigin(self.scene)
+        return (bounds[0] - originX, bounds[1] - originY,
+                bounds[2] - originX, bounds[3] - originY)
+
+    def terrainTiled(self, Path, raster=None, tile=32):
+        """Updates the tiled terrain, built on the first call, from the
+        passed raster. Only chunks overlapping changed tiles are rewritten.
+        The monolithic terrain object, and the vegetation on it, is hidden
+        while the tiled terrain is shown. Returns False if the raster cannot
+        be read
+        """
+
+        try:
+            elev, geotransform, nodata = raster or raster_io.readRaster(Path)
+        except (IOError, OSError, KeyError, ValueError,
+                NotImplementedError) as e:
+            print("Cannot read {0} for the tiled terrain: {1}".format(Path, e))
+            return False
+        if geotransform is None:
+            print("{0} is not georeferenced".format(Path))
+            return False
+        if self.tiles is None:
+            self.tiles = TerrainTiles(self.plane + "_tile", tileSize,
+                                      tileLevels, tileDistance)
+        tiles = self.changedTiles(elev, geotransform, tile)
+        self.setElevation((elev, geotransform, nodata))
+        mat = self.engine[0] + ".Grass" + "." + self.realism
+        self.tiles.update(elev, geotransform, nodata, sceneOrigin(self.scene),
+                          mat, tiles, tile)
+        self.tiles.selectLevels(self.scene.camera)
+
+        if bpy.data.objects.get(self.plane):
+            self.terrain.hide = True
+            self.terrain.hide_render = True
+        self.dirtyRegion = self.tileRegion(tiles, tile)
+        self.terrainDependents(self.dirtyRegion)
+        return True
+
+    def setElevation(self, raster):
+        """ keeps the passed terrain raster (elevation, geotransform,
+        nodata) and the height field answering ground queries on it """
+
+        self.elevation = raster
+        self.heights = None
+        if raster is not None and raster[1] is not None:
+            self.heights = HeightField(raster[0], raster[1], raster[2],
+                                       sceneOrigin(self.scene))
+
+    def groundHeight(self, x, y):
+        """ returns the elevation of the last terrain raster under the scene
+        coordinates x, y. None outside of the raster or on nodata """
+
+        if self.heights is None:
+            return None
+        z = self.heights.nearest(x, y)
+        return None if math.isnan(z) else z
+
+    def terrainDependents(self, region):
+        """ updates the objects following the terrain surface that lie in the
+        changed (xmin, ymin, xmax, ymax) region of the terrain """
+
+        if region is None:
+            return
+
+        def inRegion(loc):
+            return (region[0] <= loc[0] <= region[2] and
+                    region[1] <= loc[1] <= region[3])
+
+        # tangibly selected vantage camera keeps its height above ground #
+        if self.vantageLine is not None:
+            cam = bpy.data.objects[self.vantageCam]
+            ground = self.groundHeight(cam.location.x, cam.location.y)
+            if inRegion(cam.location) and ground is not None:
+                cam.location.z = ground + 12
+                bpy.data.objects[self.target].location.z = ground + 16
+
+        # trail is draped again when it crosses the changed region #
+        if self.trailLines and bpy.data.objects.get(self.trail):
+            if any(((xy[:, 0] >= region[0]) & (xy[:, 0] <= region[2]) &
+                    (xy[:, 1] >= region[1]) & (xy[:, 1] <= region[3])).any()
+                   for xy in self.trailLines):
+                self.drapeTrail()
+
+        self.dropTrees(region)
+
+    @timed
+    def terrainChange(self,Path, CRS, inPlace=False, raster=None,
+                      tiled=False):
 
     #try:
+        particle_settings = None
+        if tiled:
+            if not self.terrainTiled(Path, raster):
+                return
+            os.remove(Path)
+            return "tiled"
+
+        if inPlace and bpy.data.objects.get(self.plane):
+            updated = self.terrainUpdate(Path, CRS, raster)
+            # a corrupt raster would not import either #
+            if updated is None:
+                return
+            if updated:
+                os.remove(Path)
+                return "updated"
+
         # Check if the terrain object exist and has particles
         if bpy.data.objects.get(self.plane):
             if bpy.data.objects[self.plane].particle_systems:
@@ -648,6 +897,13 @@ class Adapt:
         if particle_settings:
             print (particle_settings)
             particle_clone(particle_settings, bpy.data.objects[self.plane])
+            for setting in particle_settings.values():
+                bpy.data.particles[setting].use_fake_user = False
+        self.terrain = bpy.data.objects[self.plane]
+        self.setElevation(raster)
+        self._grid = None
+        self.dirtyRegion = objectExtent(self.terrain)
+        self.terrainDependents(self.dirtyRegion)
         os.remove(Path)
         # makeScratchfile(Path, "raster")
 
@@ -655,21 +911,114 @@ class Adapt:
     #except:
         #print ("Train adaptation unsuccessfull")
 
-    def textureM(self,texturePath):
+    def textureM(self, texturePath, scratchFolder=None):
 
         try:
-            selectOnly(self.plane)
-            tex = makeScratchfile(texturePath, "texture")
-            changeTex(self.plane, tex)
+            # the content hash keeps textures of the same second apart #
+            digest = contentHash(texturePath)
+            tex = makeScratchfile(texturePath, "texture", scratchFolder,
+                                  digest[:8])
+            # identical textures reuse their image, the cache owns the
+            # scratch files of the images it keeps #
+            img, cached = imageCache.image(tex, "Raster Tec", digest)
+            mat = changeTex(self.plane, tex, img=img)
+            # the tiled terrain shares the same material #
+            if self.tiles:
+                for chunk in self.tiles.chunks:
+                    for me in chunk["meshes"]:
+                        setSlot(me, mat.name, 0)
             return "finished"
         except:
             print ("cannot change texture")
 
-    def waterFill(self,waterPath, CRS):
+    @timed
+    def waterFill(self, waterPath, CRS, raster=None):
+        """Updates the persistent water surface from the passed raster, read
+        with the builtin GeoTIFF reader unless already decoded. The water
+        mesh is a grid with one vertex per raster cell, built once per grid;
+        updates only write the vertex heights in bulk and cull the faces
+        touching dry (nodata) cells by giving them the transparent material.
+        Falls back to waterImport for rasters the reader cannot handle
+        """
+
+        try:
+            level, geotransform, nodata = (raster or
+                                           raster_io.readRaster(waterPath))
+        except (IOError, OSError, KeyError, ValueError,
+                NotImplementedError) as e:
+            print("Cannot read {0}: {1}".format(waterPath, e))
+            return self.waterImport(waterPath, CRS)
+        if geotransform is None:
+            return self.waterImport(waterPath, CRS)
+
+        z = level.astype(np.float32)
+        wet = ~np.isnan(z)
+        if nodata is not None:
+            wet &= z != nodata
+        # depth rasters on the terrain grid are added to the terrain #
+        if (waterDepth and self.elevation is not None and
+                self.elevation[0].shape == z.shape and
+                self.elevation[1] == geotransform):
+            wet &= z > 0
+            z = z + self.elevation[0]
+
+        water = self.waterGrid(z.shape, geotransform)
+        me = water.data
+        co = self._waterGrid[1]
+        dry = z[wet].min() - 1 if wet.any() else 0
+        co[:, 2] = np.where(wet, z, dry).ravel()
+        me.vertices.foreach_set("co", co.ravel())
+
+        # a face is shown only when its four corners are wet #
+        faceWet = wet[1:, :-1] & wet[1:, 1:] & wet[:-1, 1:] & wet[:-1, :-1]
+        me.polygons.foreach_set("material_index",
+                                (~faceWet).ravel().astype(np.int16))
+        me.update()
+
+        os.remove(waterPath)
+        return "imported"
+
+    def waterGrid(self, shape, geotransform):
+        """ returns the water object, with a grid mesh matching the raster
+        grid built when the grid changed """
+
+        water = bpy.data.objects.get(self.water)
+        if (water is not None and self._waterGrid is not None and
+                self._waterGrid[0] == (shape, geotransform,
+                                       water.data.as_pointer())):
+            return water
+
+        rows, cols = shape
+        x0, dx, rx, y0, ry, dy = geotransform
+        originX, originY = sceneOrigin(self.scene)
+        c = np.arange(cols)
+        r = np.arange(rows)
+        me = gridMesh(self.water, x0 + (c + .5) * dx - originX,
+                      y0 + (r + .5) * dy - originY,
+                      np.zeros(shape, np.float32),
+                      (c + .5) / cols, 1 - (r + .5) / rows)
+        setSlot(me, self.engine[0] + ".Water", 0)
+        setSlot(me, self.engine[0] + ".Transparent", 1)
+
+        if water is None:
+            water = bpy.data.objects.new(self.water, me)
+            self.scene.objects.link(water)
+        else:
+            old = water.data
+            water.data = me
+            if old.users == 0:
+                bpy.data.meshes.remove(old)
+        water.show_transparent = True
+        self._waterGrid = ((shape, geotransform, me.as_pointer()),
+                           getCoords(me))
+        return water
+
+    def waterImport(self,waterPath, CRS):
 
         if bpy.data.objects.get(self.water, CRS):
             self.scene.objects.unlink(bpy.data.objects[self.water])
             bpy.data.objects.remove(bpy.data.objects[self.water])
+        self._waterGrid = None
 
         try:
             bpy.ops.importgis.georaster(filepath=waterPath, importMode="DEM",
@@ -679,89 +1028,136 @@ class Adapt:
             mat = self.engine[0] + ".Water"
             changeMat(self.water, mat)
 
-            if (int(getTime("sec"))) % 2 == 0:
-                #makeScratchfile(waterPath, "raster")
-                os.remove(waterPath)
+            #makeScratchfile(waterPath, "raster")
+            os.remove(waterPath)
 
             return "imported"
         except:
             print("water patch drawing failed")
 
-    def vantageShp(self,vantagePath, CRS):
+    @timed
+    def vantageShp(self, vantagePath, CRS, shapes=None):
+        """ places the vantage camera on the first point of the vantage line
+        and its target on the last one, read with the builtin shapefile
+        reader unless already decoded """
 
+        # line objects left by the former shapefile import #
         if bpy.data.objects.get(self.vantage):
             selectOnly(self.vantage, delete=True)
 
         try:
-            bpy.ops.importgis.shapefile(filepath=vantagePath, shpCRS=CRS)
-
-            vanLine = bpy.data.objects[self.vantage]
-            cam = bpy.data.objects[self.vantageCam]
-            tar = bpy.data.objects[self.target]
-
-            me = vanLine.to_mesh(self.scene, apply_modifiers=True,
-                                 settings='PREVIEW')
-            me.transform(vanLine.matrix_world)
-            cam.location = [me.vertices[0].co.x,
-                            me.vertices[0].co.y,
-                            me.vertices[0].co.z+12]
-            tar.location = [me.vertices[-1].co.x,
-                            me.vertices[-1].co.y,
-                            me.vertices[0].co.z+16]
-            toggleCam(self.vantageCam, adaptGrass=False)
-            #makeScratchfile(vantagePath, "vector")
-            os.remove(vantagePath)
-            os.remove(vantagePath[:-4] + ".prj")
-            os.remove(vantagePath[:-4] + ".shx")
-            os.remove(vantagePath[:-4] + ".dbf")
+            shapes = shapes or shape_io.readShapes(vantagePath)
+            points = [s.points for s in shapes if len(s.points)]
+        except (IOError, OSError, ValueError, NotImplementedError) as e:
+            print("vantage not imported: {0}".format(e))
+            return
+        if not points:
+            print("vantage not imported: {0} is empty".format(vantagePath))
+            shape_io.removeShapefile(vantagePath)
+            return
 
-        except:
-            print ("vantage not imported")
+        originX, originY = sceneOrigin(self.scene)
+        first, last = points[0][0], points[-1][-1]
+        x0, y0 = first[0] - originX, first[1] - originY
+        ground = self.groundHeight(x0, y0)
+        if ground is None:
+            ground = first[2] if len(first) > 2 else 0
+        self.vantageLine = (x0, y0, last[0] - originX, last[1] - originY)
+
+        cam = bpy.data.objects[self.vantageCam]
+        tar = bpy.data.objects[self.target]
+        cam.location = [x0, y0, ground + 12]
+        tar.location = [self.vantageLine[2], self.vantageLine[3], ground + 16]
+        toggleCam(self.vantageCam, adaptGrass=False)
+        shape_io.removeShapefile(vantagePath)
+        return "imported"
 
-    def trails(self,trailPath, CRS):
+    @timed
+    def trails(self, trailPath, CRS, shapes=None):
+        """ rebuilds the trail from the polylines of the trail shapefile,
+        read with the builtin shapefile reader unless already decoded. The
+        polylines are resampled every trailSpacing meters and kept to drape
+        them again when the terrain changes """
 
-        if bpy.data.objects.get(self.trail):
-            selectOnly(self.trail, delete=True)
         try:
+            shapes = shapes or shape_io.readShapes(trailPath)
+        except (IOError, OSError, ValueError, NotImplementedError) as e:
+            print("Camera trajectory import unsucsessfull: {0}".format(e))
+            return
 
-            bpy.ops.importgis.shapefile(filepath=trailPath, shpCRS=CRS)
-            if bpy.ops.object.mode_set.poll():
-
-                bpy.ops.object.mode_set(mode='EDIT')
-                bpy.ops.mesh.remove_doubles()
-                bpy.ops.mesh.select_all(action='SELECT')
-                #bpy.ops.mesh.vertices_smooth()
-                #bpy.ops.mesh.vertices_smooth()
-
-                bpy.context.space_data.cursor_location = (-440, 29, 34)
-                bpy.ops.mesh.sort_elements(type='CURSOR_DISTANCE',
-                                           elements={'VERT'})
-                bpy.ops.object.mode_set(mode='OBJECT')
-                shrinkRaster2Obj(self.trail, self.plane,
-                                 method='NEAREST_SURFACEPOINT',
-                                 offset=1.5, delModifier=False)
-
-                bpy.ops.object.convert(target='CURVE')
-                bpy.context.object.data.bevel_object = \
-                    bpy.data.objects["T_profile"]
-                bpy.context.object.data.twist_mode = 'Z_UP'
-                bpy.context.object.data.twist_smooth = 10
-                obj = bpy.data.objects[self.trail]
-                obj.location[2]= obj.location[2] + 1
-
-                mat = self.engine[0] + ".boardwalk"
-                changeMat(self.trail, mat)
-                smooth(self.trail, .18,2)
-                os.remove(trailPath)
-                os.remove(trailPath[:-4] + ".prj")
-                os.remove(trailPath[:-4] + ".shx")
-                os.remove(trailPath[:-4] + ".dbf")
-
-                #makeScratchfile(trailPath, "vector")
-
-                return "imported"
-        except:
-            print ("Camera trajectory import unsucsessfull")
+        originX, originY = sceneOrigin(self.scene)
+        lines = []
+        for s in shapes:
+            for line in s.lines():
+                if len(line) > 1:
+                    xy = trail.resample(line[:, :2] - (originX, originY),
+                                        trailSpacing)
+                    if len(xy) > 1:
+                        lines.append(trail.smoothPath(xy, .5, 4))
+        self.trailLines = lines
+        self.drapeTrail()
+        shape_io.removeShapefile(trailPath)
+        return "imported"
+
+    def groundHeights(self, xs, ys):
+        """ returns the bilinearly interpolated elevations of the last
+        terrain raster under the scene coordinates xs, ys. NaN outside of the
+        raster and on nodata """
+
+        if self.heights is None:
+            return np.full(np.shape(xs), np.nan)
+        return self.heights.bilinear(xs, ys)
+
+    def surfaceHeights(self, xs, ys):
+        """ elevations of the terrain object under xs, ys by ray casting, for
+        terrains imported without a raster """
+
+        terrain = bpy.data.objects.get(self.plane)
+        zs = np.full(len(xs), np.nan)
+        if terrain is None or terrain.type != "MESH":
+            return zs
+        toLocal = terrain.matrix_world.inverted()
+        down = (toLocal.to_3x3() * Vector((0, 0, -1))).normalized()
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            hit = terrain.ray_cast(toLocal * Vector((x, y, 1e5)), down)
+            if hit[0]:
+                zs[i] = (terrain.matrix_world * hit[1]).z
+        return zs
+
+    def drapeTrail(self):
+        """ drapes the kept trail lines on the terrain and sweeps the
+        boardwalk profile along them into the trail mesh """
+
+        paths = []
+        for xy in self.trailLines:
+            z = self.groundHeights(xy[:, 0], xy[:, 1])
+            if np.isnan(z).all():
+                z = self.surfaceHeights(xy[:, 0], xy[:, 1])
+            z = trail.fillGaps(z)
+            if z is None:
+                continue
+            paths.append(np.column_stack(
+                [xy, trail.smoothPath(z, .5, 8) + trailLift]))
+
+        profile, closed = trail.profileCoords(
+            bpy.data.objects.get("T_profile"), self.scene)
+        me = trail.sweepMesh(self.trail, paths, profile, closed)
+        setSlot(me, self.engine[0] + ".boardwalk", 0)
+
+        obj = bpy.data.objects.get(self.trail)
+        # curve trails of the former modifier stack are replaced once #
+        if obj is not None and obj.type != "MESH":
+            selectOnly(self.trail, delete=True)
+            obj = None
+        if obj is None:
+            obj = bpy.data.objects.new(self.trail, me)
+            self.scene.objects.link(obj)
+        else:
+            old = obj.data
+            obj.data = me
+            if old.users == 0:
+                bpy.data.meshes.remove(old)
+        return obj
 
     def treePatchFill_old(self, patch, watchFolder):
 
@@ -806,391 +1202,180 @@ class Adapt:
         except:
             print ("tree drawing failed")
 
-    def treePatchFill(self, patch, watchFolder):
-
-        patchPath = os.path.join(watchFolder, patch)
-        patchType = patch.split("_")[1]
-        textureName = "particle_" + patchType
-        img = bpy.data.images.load(patchPath)
-        specieType = self.realism + "_" + patchType
+    @timed
+    def treePatchFill(self, patch, patchPath, image=None):
+        """Places the trees of a patch_<class>.png raster, read through the
+        image cache unless already decoded as (content hash, array).
+        Positions are sampled for the class over the terrain extent
+        (vegetation.stratifiedSample) at the former emitter densities and
+        written as the vertices of a TreePatch_<class> object that emits one
+        particle of the class group per vertex. Rasters with the content of
+        the last placed one are skipped and, like failures, return None
+        """
+
+        patchType = os.path.splitext(patch)[0].split("_")[1]
+        try:
+            digest, image = image or imageCache.read(patchPath,
+                                                     image_io.readPNG)
+        except (IOError, OSError, ValueError, NotImplementedError) as e:
+            print("Cannot read {0}: {1}".format(patchPath, e))
+            return
+        extent = self.terrainExtent()
+        if extent is None:
+            return
+        if (self.patches.get(patchType) == (extent, digest) and
+                bpy.data.objects.get(self.treePatch + "_" + patchType)):
+            return
 
         if patchType == "class3":
-            density = 700
+            count = 700
         else:
-            density = 500
-
-
-        if patchType not in self.terrain.particle_systems:
-            if patchType not in bpy.data.particles:
-                particle(self.plane, specieType = specieType, count = density, group=True,
-                particle_name=patchType)
-
-            else:
-                particle(self.plane, setting = pathType)
-
-        if textureName not in bpy.data.textures:
-            bpy.data.textures.new(textureName, type='IMAGE')
-
-        bpy.data.textures[textureName].image = img
-        self.terrain.particle_systems[patchType].settings.\
-        active_texture = bpy.data.textures[textureName]
-
+            count = 500
+        area = (extent[2] - extent[0]) * (extent[3] - extent[1])
+        xy = vegetation.stratifiedSample(
+            vegetation.patchDensity(image), extent, math.sqrt(area / count),
+            vegetation.classSeed(patchType))
+        z = self.groundHeights(xy[:, 0], xy[:, 1])
+        if len(z) and np.isnan(z).all():
+            z = self.surfaceHeights(xy[:, 0], xy[:, 1])
+        placed = ~np.isnan(z)
+
+        obj = self.treeObject(patchType)
+        vegetation.setPoints(obj, np.column_stack([xy[placed], z[placed]]))
+        obj.particle_systems[patchType].settings.count = int(placed.sum())
+        self.patches[patchType] = (extent, digest)
         return "imported"
 
-class ModalTimerOperator(bpy.types.Operator):
-        """Operator which interatively runs from a timer"""
-
-        bl_idname = "wm.modal_timer_operator"
-        bl_label = "Modal Timer Operator"
-        _timer = 0
-        _timer_count = 0
-
-        def modal(self, context, event):
-            if event.type in {"RIGHTMOUSE", "ESC"}:
-                return {"CANCELLED"}
-
-            # this condition encomasses all the actions required for watching
-            # the folder and related file/object operations .
-
-            if event.type == "TIMER":
-
-                if self._timer.time_duration != self._timer_count:
-                    self._timer_count = self._timer.time_duration
-                    fileList = (os.listdir(self.prefs.watchFolder))
-
-                    if terrainFile in fileList:
-                        self.adapt.terrainChange(self.prefs.terrainPath,self.prefs.CRS)
-                        self.adaptMode = "TERRAIN"
-
-                    if waterFile in fileList:
-                        self.adapt.waterFill(self.prefs.waterPath, self.prefs.CRS)
-                        self.adaptMode = "WATER"
-
-                    if textureFile in fileList:
-                        selectOnly(self.plane)
-                        self.adapt.textureM()
-                        self.adaptMode = "TEXTURE"
-
-                    if trailFile in fileList:
-                        self.adapt.trails(self.prefs.trailPath, self.prefs.CRS)
-                        self.adaptMode = "TRAIL"
-
-                    if emptyFile in fileList:
-                        if self.terrain.particle_systems:
-                                for i in self.terrain.modifiers:
-                                    if "Particle" in i.name:
-                                        self.terrain.modifiers.remove(i)
-                        os.remove(self.prefs.emptyPath)
-                        #makeScratchfile(self.prefs.emptyPath, "text")
-
-                    if vantageFile in fileList:
-                        self.adapt.vantageShp(self.prefs.vantagePath, self.prefs.CRS)
-                        self.adaptMode = "VANTAGE"
-
-                    # Multiple Instance objects #
-
-                    # Tree patches #
-                    for fileName in fileList:
-                        if(
-                            fileName.startswith("patch_") and
-                            fileName[-4:] == ".png" and
-                            fileName not in bpy.data.images):
-                            self.adapt.treePatchFill(fileName, self.prefs.watchFolder)
-                            self.adaptMode = "PATCH"
-
-
-            return {"PASS_THROUGH"}
-
-        def execute(self, context):
-
-            bpy.context.space_data.show_manipulator = False
-            wm = context.window_manager
-            wm.modal_handler_add(self)
-
-            self.treePatch = "TreePatch"
-            self.emptyTree = "empty.txt"
-            self.terrain = bpy.data.objects["terrain"]
-            self.adaptMode = None
-            self.prefs = Prefs()
-            self.adapt = Adapt()
-            self.adapt.realism = "High"
-            self._timer = wm.event_timer_add(self.prefs.timer, context.window)
-
-            for file in os.listdir(self.prefs.watchFolder):
-                try:
-                    os.remove(os.path.join(self.prefs.watchFolder, file))
-                except:
-                    print("Could not remove file")
-
-            #for img in bpy.data.images:
-                #if "patch_" in img.name:
-                    #bpy.data.images.remove(img, do_unlink=True)
-
-            #for i in self.terrain.modifiers:
-                #if "Particle" in i.name:
-                    #self.terrain.modifiers.remove(i)
-
-            #for tex in bpy.data.textures:
-                #if "class" in tex.name:
-                    #bpy.data.textures.remove(tex, do_unlink=True)
-
-            return {"RUNNING_MODAL"}
-
-        def cancel(self, context):
-            wm = context.window_manager
-            wm.event_timer_remove(self._timer)
-
-
-class BirdCam(bpy.types.Operator):
-
-    """switch to user camera mode and runs animation walkthrough """
-
-    bl_idname = "wm.birdcam"
-    bl_label = "toggle_through_Birdviews"
-
-    def execute(self, context):
-
-        toggleCam("Bird_", adaptGrass=False)
-
-        return {'FINISHED'}
-
-
-class HumanCam(bpy.types.Operator):
-
-    """switch to user camera mode and runs animation walkthrough """
-
-    bl_idname = "wm.humancam"
-    bl_label = "toggle_through_Birdviews"
-
-    def execute(self, context):
-
-        toggleCam("Human_", adaptGrass=False)
-
-        return {'FINISHED'}
-
-
-class RotaryCam(bpy.types.Operator):
-
-    """switch to user camera mode and runs animation walkthrough """
-
-    bl_idname = "wm.rotarycam"
-    bl_label = "rotating_bird_view"
-
-    def execute(self, context):
-
-        toggleCam("Rotary_")
-        bpy.ops.screen.animation_play()
-
-        return {'FINISHED'}
-
+    def treeObject(self, patchType):
+        """ returns the instancing object of a patch class, created with its
+        particle system on first use. The class emitter left on the
+        terrain by the former placement is removed """
+
+        for modifier in list(self.terrain.modifiers):
+            if (modifier.type == "PARTICLE_SYSTEM" and
+                    modifier.particle_system.name == patchType):
+                self.terrain.modifiers.remove(modifier)
+
+        name = self.treePatch + "_" + patchType
+        obj = bpy.data.objects.get(name)
+        if obj is None:
+            obj = bpy.data.objects.new(name, bpy.data.meshes.new(name))
+            self.scene.objects.link(obj)
+            particle(name, specieType=self.realism + "_" + patchType,
+                     count=1, group=True, particle_name=patchType,
+                     emitFrom="VERT")
+        return obj
+
+    def treeObjects(self):
+        """ returns the instancing objects of the placed patch classes """
+
+        return [obj for obj in bpy.data.objects
+                if obj.name.startswith(self.treePatch + "_")]
+
+    def clearTrees(self):
+        """ removes the instancing objects of all patch classes """
+
+        for obj in self.treeObjects():
+            me = obj.data
+            self.scene.objects.unlink(obj)
+            bpy.data.objects.remove(obj)
+            if me.users == 0:
+                bpy.data.meshes.remove(me)
+        self.patches = {}
+
+    def dropTrees(self, region):
+        """ moves the trees in the (xmin, ymin, xmax, ymax) region back on
+        the terrain """
+
+        for obj in self.treeObjects():
+            co = getCoords(obj.data)
+            inside = ((co[:, 0] >= region[0]) & (co[:, 0] <= region[2]) &
+                      (co[:, 1] >= region[1]) & (co[:, 1] <= region[3]))
+            if not inside.any():
+                continue
+            z = self.groundHeights(co[inside, 0], co[inside, 1])
+            valid = ~np.isnan(z)
+            co[np.flatnonzero(inside)[valid], 2] = z[valid]
+            setCoords(obj.data, co)
+
+    def terrainExtent(self):
+        """ returns the (xmin, ymin, xmax, ymax) scene extent of the terrain
+        raster, of the terrain object without one """
+
+        if self.heights is not None:
+            return self.heights.extent()
+        if bpy.data.objects.get(self.plane):
+            return objectExtent(bpy.data.objects[self.plane])
 
-class VantageCam(bpy.types.Operator):
 
-    """switch to user camera mode and runs animation walkthrough """
+def fileLayer(fileName):
+    """ returns the layer a watch folder file updates, None to ignore it """
 
-    bl_idname = "wm.vantagecam"
-    bl_label = "user_defined_views"
+    layers = {terrainFile: "terrain", waterFile: "water",
+              textureFile: "texture", trailFile: "trail",
+              vantageFile: "vantage", emptyFile: "empty"}
+    if fileName in layers:
+        return layers[fileName]
+    if fileName.startswith("patch_") and fileName[-4:] == ".png":
+        return "patch"
 
-    def execute(self, context):
 
-        toggleCam("VantageCam", adaptGrass=True)
-        return {'FINISHED'}
+def applyChange(adapt, prefs, change):
+    """ runs the Adapt handler of a completed watch folder update and
+    returns the resulting adapt mode, None when the update could not be
+    applied. Errors of the handler are printed and the update dropped, so
+    that the watch loop keeps running. The claimed file of the update is
+    removed afterwards """
 
+    try:
+        return runHandler(adapt, prefs, change)
+    except Exception:
+        print("Could not apply {0}:".format(change.path))
+        traceback.print_exc()
+    finally:
+        watcher.release(change)
 
-class mist(bpy.types.Operator):
 
-    bl_idname = "wm.mist"
-    bl_label = "mist_creator"
+def runHandler(adapt, prefs, change):
 
-    def execute(self, context):
-        if not bpy.context.scene.world.mist_settings.use_mist:
-            bpy.context.scene.world.mist_settings.use_mist = True
-            return {'FINISHED'}
+    # decoded updates no longer need their file #
+    if change.data is None and not os.path.exists(change.path):
+        return
 
-        if bpy.context.scene.world.mist_settings.use_mist:
-            bpy.context.scene.world.mist_settings.use_mist = False
-            return {'FINISHED'}
+    if change.layer == "terrain":
+        if adapt.terrainChange(change.path, prefs.CRS, prefs.inPlace,
+                               change.data, prefs.tiled):
+            return "TERRAIN"
 
-class Object_operators(bpy.types.Operator):
-    bl_idname = "objects.operator"
-    bl_label = "Object Operators"
-    button = bpy.props.StringProperty()
+    elif change.layer == "water":
+        if adapt.waterFill(change.path, prefs.CRS, change.data):
+            return "WATER"
 
-    def execute(self, context):
+    elif change.layer == "texture":
+        if adapt.textureM(change.path, prefs.scratchFolder):
+            return "TEXTURE"
 
-        world = bpy.context.scene.world.name
-        realism = world.split(".")[1]
+    elif change.layer == "trail":
+        if adapt.trails(change.path, prefs.CRS, change.data):
+            return "TRAIL"
 
-        if self.button == "TREES":
-            for i in bpy.data.objects["terrain"].modifiers:
+    elif change.layer == "empty":
+        if adapt.terrain.particle_systems:
+            for i in adapt.terrain.modifiers:
                 if "Particle" in i.name:
-                    bpy.data.objects["terrain"].modifiers.remove(i)
-
-        elif self.button == "TRAIL":
-            remove("trail")
-
-        return{'FINISHED'}
-
-
-class Engine_buttons(bpy.types.Operator):
-    bl_idname = "render.engine"
-    bl_label = "Change render Engine"
-    engineButton = bpy.props.StringProperty()
-
-    def execute(self, context):
-
-        engine = bpy.context.scene.render.engine
-        world = bpy.context.scene.world.name
-        realism = world.split(".")[1]
-
-        if self.engineButton == "BLENDER_RENDER":
-
-            if realism == "High" and engine != "BLENDER_RENDER" :
-                Adapt().changeEngine("BLENDER_RENDER",real=realism)
-                self.mode = "BLENDER_RENDER"
-                Adapt().realism = realism
-                Adapt().engine = "BLENDER_RENDER"
-                Adapt().UpdateWorld("BLENDER_RENDER", "High")
-
-            else:
-                bpy.ops.error.message('INVOKE_DEFAULT',
-                                      type = "Error",
-                                      message = "Blender renderer can be only used in realistic mode")
-
-        elif self.engineButton == 'CYCLES':
-
-            if engine != "CYCLES":
-
-                Adapt().changeEngine("CYCLES", real=realism)
-                Adapt().engine= "CYCLES"
-                Adapt().realism = realism
-                Adapt().UpdateWorld("CYCLES", realism)
-
-        elif self.engineButton == 'Low':
-
-            if engine == "CYCLES":
-                Adapt().changeEngine(engine,real = 'Low')
-                Adapt().changeRealism("Low")
-                Adapt().UpdateWorld("CYCLES",'Low')
-            else:
-                bpy.ops.error.message('INVOKE_DEFAULT',
-                                      type = "Error",
-                                      message = "Low poly rendering can be only used in Cycles renderer")
-
-        elif self.engineButton == 'High':
-
-            Adapt().changeEngine(engine,real = 'High')
-            Adapt().changeRealism("High")
-            Adapt().realism = "High"
-            Adapt().UpdateWorld(engine,'High')
-
-        if self.engineButton == "Render":
-            bpy.context.space_data.viewport_shade = 'RENDERED'
-
-        return{'FINISHED'}
-
-# Panel
-class TLGUI(bpy.types.Panel):
-    # Create a Panel in the Tool Shelf
-    bl_category = "Tangible Landscape"
-    bl_label = "Tangibe Landscape "
-    bl_space_type = 'VIEW_3D'
-    bl_region_type = 'TOOLS'
-
-    # Draw
-    def draw(self, context):
-
-        layout = self.layout
-        wm = context.window_manager
-        # scene = context.scene
-        box = layout.box()
-        box.label('System options')
-        row = box.row(align=True)
-        row.operator("wm.modal_timer_operator",
-                     text="Turn on Watch Mode",
-                     icon="GHOST_ENABLED")
-
-        # Camera Options #
-
-        box = layout.box()
-        box.alignment = 'CENTER'
-        box.label('Camera options', icon="CAMERA_DATA")
-        row = box.row(align=True)
-        row.operator("wm.vantagecam",
-                     text="Tangibly selected views",
-                     icon="MAN_TRANS")
-        row = box.row(align=True)
-        row.operator("wm.humancam", text="Preset Human views", icon="SCENE")
-        row = box.row()
-        row.operator("wm.birdcam", text="Preset Birdviews", icon="HAIR")
-        row = box.row()
-        row.operator("wm.rotarycam",
-                     text="Orbiting bird view",
-                     icon="BORDER_LASSO")
-
-        box = layout.box()
-        box.label('Atomospheric adjustments')
-
-        row4 = box.row()
-        row4.operator("wm.mist", text="Toggle Mist", icon="FORCE_TURBULENCE")
-
-        box = layout.box()
-        box.label('Object operations')
-
-        row1 = box.row()
-        row1.operator("objects.operator", text="Remove trees").button = "TREES"
-        row2 = box.row()
-        row2.operator("objects.operator", text="Trail").button = "TRAIL"
-        box = layout.box()
-
-        box.label('Rendering and Realism')
-        box.alignment = 'CENTER'
-        row4 = box.row()
-        row4.operator("render.engine",
-                      text="Blender").engineButton = "BLENDER_RENDER"
-        row4.operator("render.engine",
-                      text="Cycles").engineButton = "CYCLES"
-        row4.operator("render.engine",
-                      text="Render").engineButton = "Render"
-
-        row5 = box.row()
-        row5.label("Realism")
-        row6 = box.row()
-        row6.operator("render.engine",
-                      text="Low poly").engineButton = "Low"
-        row6.operator("render.engine",
-                      text="Realistic").engineButton = "High"
-
-        layout.row().separator()
-
-class MessageOperator(bpy.types.Operator):
-    bl_idname = "error.message"
-    bl_label = "Message"
-    type = StringProperty()
-    message = StringProperty()
-
-    def execute(self, context):
-        self.report({'INFO'}, self.message)
-        print(self.message)
-        return {'FINISHED'}
-
-    def invoke(self, context, event):
-        wm = context.window_manager
-        return wm.invoke_popup(self, width= 400, height=1000)
-
-    def draw(self, context):
-        self.layout.label(self.message)
-
-
-def register():
-
-    bpy.utils.register_module(__name__)
-
-def unregister():
-    bpy.utils.unregister_module(__name__)
-
-# def register(module):
-
-if __name__ == "__main__":
-    # register all Classes
-    register()
+                    adapt.terrain.modifiers.remove(i)
+        adapt.clearTrees()
+        os.remove(change.path)
+        #makeScratchfile(prefs.emptyPath, "text")
+        return "EMPTY"
+
+    elif change.layer == "vantage":
+        if adapt.vantageShp(change.path, prefs.CRS, change.data):
+            return "VANTAGE"
+
+    # Multiple Instance objects #
+
+    # Tree patches #
+    elif change.layer == "patch":
+        if adapt.treePatchFill(change.name, change.path, change.data):
+            return "PATCH"
@@ -29,19 +29,22 @@ bl_info = {
  "tracker_url": "",
  "category": "view_3D"}
 
-import bpy, os
-import addon_utils
+import bpy
+# only the operators and preferences load with the addon, the watch mode
+# and its readers are imported by the first operator that needs them #
 from . import prefs
-from . import Modeling3D
-from .settings import getSettings, setSettings
+from . import ui
+from .settings import flushSettings
 
 def register():
 
     bpy.utils.register_module(__name__) #register all imported operators of the current
-    prefs = bpy.context.user_preferences.addons[__package__].preferences
+    ui.session.register()
 
 def unregister():
 
+    ui.session.unregister()
+    flushSettings()
     bpy.utils.unregister_module(__name__)
 
 if __name__ == "__main__":
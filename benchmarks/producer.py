@@ -0,0 +1,323 @@
+# Synthetic stand-in for the GRASS side of Tangible Landscape: writes
+# changing terrain.tif, water.tif, patch_class*.png, trail.shp and
+# vantage.shp files into a watch folder at set sizes and rates, so that the
+# watch mode can be measured without a scanner. Only needs numpy.
+#
+#   python producer.py WATCHFOLDER --size 512 --duration 60 \
+#       --rate terrain=1 --rate water=.5 --rate patch=.5
+#
+# Files are written under a temporary name and renamed into place, the way
+# a finished GRASS export appears. Shapefiles are renamed last, after their
+# index and table. A JSON summary of the files written is printed at the
+# end.
+
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+
+import numpy as np
+
+layers = ("terrain", "water", "patch", "trail", "vantage")
+# updates per second of every layer #
+defaultRates = {"terrain": 1.0, "water": .5, "patch": .5, "trail": .2,
+                "vantage": .1}
+patchClasses = ("class1", "class2", "class3")
+noData = -9999.0
+
+
+def replaceFile(path, write):
+    """ calls write(temporary path) and renames the result to path """
+
+    folder, name = os.path.split(path)
+    temp = os.path.join(folder, "." + name + ".part")
+    write(temp)
+    os.replace(temp, path)
+
+
+def writeGeoTiff(path, data, geotransform, nodata=None):
+    """ writes a single band float32 GeoTIFF, one uncompressed strip per
+    row, georeferenced by pixel scale and tie point """
+
+    data = np.ascontiguousarray(data, "<f4")
+    height, width = data.shape
+    x0, dx, rx, y0, ry, dy = geotransform
+    nodataText = (repr(float(nodata)).encode("ascii") + b"\x00"
+                  if nodata is not None else None)
+
+    # (tag, type, values), types 3 short, 4 long, 12 double, 2 ascii #
+    tags = [(256, 4, [width]), (257, 4, [height]), (258, 3, [32]),
+            (259, 3, [1]), (262, 3, [1]), (273, 4, None), (277, 3, [1]),
+            (278, 4, [1]), (279, 4, [width * 4] * height), (284, 3, [1]),
+            (339, 3, [3]), (33550, 12, [dx, -dy, 0.0]),
+            (33922, 12, [0.0, 0.0, 0.0, x0, y0, 0.0])]
+    if nodataText:
+        tags.append((42113, 2, nodataText))
+    sizes = {2: 1, 3: 2, 4: 4, 12: 8}
+    codes = {3: "H", 4: "I", 12: "d"}
+
+    ifdSize = 2 + 12 * len(tags) + 4
+    extra = 8 + ifdSize
+    payloads = {}
+    for tag, kind, values in tags:
+        count = len(values) if values is not None else height
+        if count * sizes[kind] > 4:
+            payloads[tag] = extra
+            extra += count * sizes[kind]
+            extra += extra % 2
+    offsets = [extra + row * width * 4 for row in range(height)]
+
+    ifd = [struct.pack("<H", len(tags))]
+    blobs = []
+    for tag, kind, values in tags:
+        if values is None:
+            values = offsets
+        count = len(values)
+        raw = values if kind == 2 else struct.pack(
+            "<" + codes[kind] * count, *values)
+        if tag in payloads:
+            ifd.append(struct.pack("<HHII", tag, kind, count, payloads[tag]))
+            blobs.append(raw + b"\x00" * (len(raw) % 2))
+        else:
+            ifd.append(struct.pack("<HHI", tag, kind, count) +
+                       raw.ljust(4, b"\x00"))
+    ifd.append(struct.pack("<I", 0))
+
+    with open(path, "wb") as f:
+        f.write(b"II" + struct.pack("<HI", 42, 8))
+        f.write(b"".join(ifd))
+        f.write(b"".join(blobs))
+        f.write(data.tobytes())
+
+
+def writePNG(path, image):
+    """ writes an (rows, cols, 4) uint8 array as an RGBA PNG """
+
+    image = np.ascontiguousarray(image, np.uint8)
+    height, width = image.shape[:2]
+    rows = np.zeros((height, width * 4 + 1), np.uint8)
+    rows[:, 1:] = image.reshape(height, -1)
+
+    def chunk(kind, body):
+        return (struct.pack(">I", len(body)) + kind + body +
+                struct.pack(">I", zlib.crc32(kind + body) & 0xffffffff))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6,
+                                           0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 1)))
+        f.write(chunk(b"IEND", b""))
+
+
+def writeLines(path, lines):
+    """ writes polylines, each an (n, 2) array, as a shapefile with an
+    index and an id table. The .shp is renamed into place last """
+
+    root = os.path.splitext(path)[0]
+    records = []
+    for line in lines:
+        line = np.asarray(line, "<f8")
+        box = line.min(axis=0).tolist() + line.max(axis=0).tolist()
+        records.append(struct.pack("<i4d2ii", 3, box[0], box[1], box[2],
+                                   box[3], 1, len(line), 0) +
+                       line.tobytes())
+    points = np.concatenate([np.asarray(l) for l in lines])
+    bbox = points.min(axis=0).tolist() + points.max(axis=0).tolist()
+
+    def header(length):
+        return (struct.pack(">i20xi", 9994, length // 2) +
+                struct.pack("<ii4d4d", 1000, 3, bbox[0], bbox[1], bbox[2],
+                            bbox[3], 0, 0, 0, 0))
+
+    body, index = [], []
+    offset = 100
+    for number, content in enumerate(records, 1):
+        index.append(struct.pack(">ii", offset // 2, len(content) // 2))
+        body.append(struct.pack(">ii", number, len(content) // 2) + content)
+        offset += 8 + len(content)
+
+    with open(root + ".shx", "wb") as f:
+        f.write(header(100 + 8 * len(records)) + b"".join(index))
+
+    today = time.localtime()
+    with open(root + ".dbf", "wb") as f:
+        f.write(struct.pack("<B3BIHH20x", 3, today.tm_year - 1900,
+                            today.tm_mon, today.tm_mday, len(records),
+                            32 + 32 + 1, 1 + 10))
+        f.write(struct.pack("<11sc4xBB14x", b"id", b"N", 10, 0))
+        f.write(b"\x0d")
+        for number in range(len(records)):
+            f.write(b" " + str(number).rjust(10).encode("ascii"))
+        f.write(b"\x1a")
+
+    replaceFile(path, lambda temp: open(temp, "wb").write(
+        header(offset) + b"".join(body)))
+
+
+class Producer:
+    """Writes the layers of a size x size cells model covering extent
+    metres from (x0, y0), changing a little with every step like a model
+    being sculpted"""
+
+    def __init__(self, folder, size=512, extent=750.0, origin=(0.0, 0.0),
+                 seed=0):
+
+        self.folder = folder
+        self.size = size
+        self.extent = extent
+        self.x0, self.y0 = origin
+        self.cell = extent / float(size)
+        self.rng = np.random.RandomState(seed)
+        # hills as (x, y, radius, height) in model units of [0, 1] #
+        self.hills = np.column_stack([self.rng.random_sample((12, 2)),
+                                      .05 + .15 * self.rng.random_sample(12),
+                                      10 + 40 * self.rng.random_sample(12)])
+        centres = (np.arange(size) + .5) / size
+        self.u, self.v = np.meshgrid(centres, centres[::-1])
+        self.written = dict((layer, 0) for layer in layers)
+        self.bytes = dict((layer, 0) for layer in layers)
+
+    @property
+    def geotransform(self):
+        return (self.x0, self.cell, 0.0, self.y0 + self.extent, 0.0,
+                -self.cell)
+
+    def elevation(self, step):
+        """ the terrain at a step: the hills drift slowly over a tilted
+        plane """
+
+        z = 100 + 20 * self.u + 10 * self.v
+        for i, (x, y, r, h) in enumerate(self.hills):
+            x = (x + .01 * step * np.cos(i)) % 1
+            y = (y + .01 * step * np.sin(i)) % 1
+            z += h * np.exp(-((self.u - x) ** 2 + (self.v - y) ** 2) /
+                            (2 * r * r))
+        return z.astype(np.float32)
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    def _done(self, layer, path):
+
+        self.written[layer] += 1
+        self.bytes[layer] += os.path.getsize(path)
+
+    def terrain(self, step):
+
+        path = self._path("terrain.tif")
+        replaceFile(path, lambda temp: writeGeoTiff(
+            temp, self.elevation(step), self.geotransform))
+        self._done("terrain", path)
+
+    def water(self, step):
+        """ a flat water level over the low third of the terrain """
+
+        z = self.elevation(step)
+        level = np.percentile(z, 30)
+        surface = np.where(z < level, level, noData).astype(np.float32)
+        path = self._path("water.tif")
+        replaceFile(path, lambda temp: writeGeoTiff(
+            temp, surface, self.geotransform, noData))
+        self._done("water", path)
+
+    def patch(self, step):
+        """ one class raster per step, blobs moving with the step """
+
+        name = patchClasses[step % len(patchClasses)]
+        i = patchClasses.index(name)
+        x = (.3 + .2 * i + .02 * step) % 1
+        y = (.5 + .1 * np.sin(step + i)) % 1
+        density = np.exp(-((self.u - x) ** 2 + (self.v - y) ** 2) / .02)
+        image = np.zeros(self.u.shape + (4,), np.uint8)
+        image[..., i] = 255
+        image[..., 3] = (density > .3) * 255
+        path = self._path("patch_{0}.png".format(name))
+        replaceFile(path, lambda temp: writePNG(temp, image))
+        self._done("patch", path)
+
+    def _line(self, step, points):
+
+        t = np.linspace(0, 1, points)
+        x = .1 + .8 * t
+        y = .5 + .3 * np.sin(2 * np.pi * (t + .05 * step))
+        return np.column_stack([self.x0 + x * self.extent,
+                                self.y0 + y * self.extent])
+
+    def trail(self, step):
+
+        path = self._path("trail.shp")
+        writeLines(path, [self._line(step, 60)])
+        self._done("trail", path)
+
+    def vantage(self, step):
+        """ a two point line: the viewer and where they look """
+
+        line = self._line(step, 60)
+        path = self._path("vantage.shp")
+        writeLines(path, [line[[step % 50, step % 50 + 10]]])
+        self._done("vantage", path)
+
+    def run(self, rates, duration):
+        """ writes every layer at its rate in updates per second for
+        duration seconds """
+
+        start = time.time()
+        due = dict((layer, start) for layer, rate in rates.items() if rate)
+        steps = dict((layer, 0) for layer in due)
+        while due:
+            layer = min(due, key=due.get)
+            if due[layer] - start > duration:
+                break
+            time.sleep(max(0.0, due[layer] - time.time()))
+            getattr(self, layer)(steps[layer])
+            steps[layer] += 1
+            due[layer] += 1.0 / rates[layer]
+        return time.time() - start
+
+    def summary(self, elapsed):
+
+        return {"size": self.size, "elapsed": elapsed,
+                "written": self.written, "bytes": self.bytes}
+
+
+def parseRate(text):
+
+    layer, rate = text.split("=")
+    if layer not in layers:
+        raise argparse.ArgumentTypeError("unknown layer " + layer)
+    return layer, float(rate)
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(prog="producer.py")
+    parser.add_argument("folder", help="watch folder to write into")
+    parser.add_argument("--size", type=int, default=512,
+                        help="terrain and patch rasters are size x size")
+    parser.add_argument("--extent", type=float, default=750.0,
+                        help="model width in metres")
+    parser.add_argument("--origin", type=float, nargs=2, default=(0.0, 0.0),
+                        help="lower left corner of the model")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="seconds to produce for")
+    parser.add_argument("--rate", type=parseRate, action="append",
+                        default=[], help="layer=updates per second, 0 "
+                        "turns a layer off")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rates = dict(defaultRates)
+    rates.update(args.rate)
+    producer = Producer(args.folder, args.size, args.extent, args.origin,
+                        args.seed)
+    elapsed = producer.run(rates, args.duration)
+    print(json.dumps(producer.summary(elapsed)))
+    sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Startup benchmark of the addon: times importing the package and running
+# its register() in background Blender, and fails when either regressed
+# against the stored baseline or when enabling the addon loaded modules that
+# should only load on first use.
+#
+#   blender -b --factory-startup --python benchmarks/startup.py -- [options]
+#
+# The addon is imported from the folder above this script under the name
+# given by --module, which must be the folder name Blender installs it as.
+
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import importlib
+
+import bpy
+
+here = os.path.dirname(os.path.abspath(__file__))
+addonDir = os.path.dirname(here)
+
+# modules enabling the addon must not import, relative ones are addon
+# submodules #
+lazyModules = [".Modeling3D", ".mesh_helpers", ".raster_io", ".shape_io",
+               "numpy", "bmesh", "bpy.utils.previews"]
+
+
+def parseArgs():
+
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="startup.py")
+    parser.add_argument("--module", default=os.path.basename(addonDir),
+                        help="package name of the addon")
+    parser.add_argument("--runs", type=int, default=5,
+                        help="import and register cycles, the median counts")
+    parser.add_argument("--baseline",
+                        default=os.path.join(here, "startup.json"),
+                        help="file with the reference timings")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="allowed slowdown factor over the baseline")
+    parser.add_argument("--slack", type=float, default=5.0,
+                        help="allowed slowdown in ms on top of the factor")
+    parser.add_argument("--update", action="store_true",
+                        help="store the measured timings as the baseline")
+    return parser.parse_args(argv)
+
+
+def unload(module):
+    """ drops the addon package from sys.modules so it imports again """
+
+    for name in list(sys.modules):
+        if name == module or name.startswith(module + "."):
+            del sys.modules[name]
+    # the old operator classes must be gone before the next register #
+    gc.collect()
+
+
+def measure(module):
+    """ returns the import and register times in ms of one cycle and the
+    modules loaded by them """
+
+    before = set(sys.modules)
+    start = time.perf_counter()
+    mod = importlib.import_module(module)
+    imported = time.perf_counter()
+    mod.register()
+    registered = time.perf_counter()
+    loaded = set(sys.modules) - before
+
+    mod.unregister()
+    unload(module)
+    return ((imported - start) * 1000.0, (registered - imported) * 1000.0,
+            loaded)
+
+
+def median(values):
+
+    values = sorted(values)
+    mid = len(values) // 2
+    if len(values) % 2:
+        return values[mid]
+    return (values[mid - 1] + values[mid]) / 2.0
+
+
+def main():
+
+    args = parseArgs()
+    sys.path.insert(0, os.path.dirname(addonDir))
+
+    imports, registers, loaded = [], [], set()
+    for run in range(args.runs):
+        importTime, registerTime, modules = measure(args.module)
+        imports.append(importTime)
+        registers.append(registerTime)
+        loaded |= modules
+    result = {"import": median(imports), "register": median(registers),
+              "blender": bpy.app.version_string}
+    print("import {0:.1f} ms, register {1:.1f} ms (median of {2})".format(
+        result["import"], result["register"], args.runs))
+
+    failures = []
+    for name in lazyModules:
+        full = args.module + name if name[0] == "." else name
+        if full in loaded:
+            failures.append("{0} is imported when enabling the addon".format(
+                full))
+
+    if args.update or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent="\t")
+        print("baseline written to {0}".format(args.baseline))
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("import", "register"):
+            limit = baseline[key] * args.tolerance + args.slack
+            if result[key] > limit:
+                failures.append(
+                    "{0} took {1:.1f} ms, baseline {2:.1f} ms, limit "
+                    "{3:.1f} ms".format(key, result[key], baseline[key],
+                                        limit))
+
+    for failure in failures:
+        print("FAIL: " + failure)
+    sys.exit(1 if failures else 0)
+
+
+main()
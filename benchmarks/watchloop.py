@@ -0,0 +1,172 @@
+# End-to-end benchmark of the watch mode: runs producer.py against a watch
+# folder and the headless watch loop in background Blender, then reports
+# the updates applied per second and the file to scene latency percentiles
+# of every layer, for each terrain size.
+#
+#   blender -b lab.blend --python benchmarks/watchloop.py -- \
+#       --sizes 128 256 512 1024 2048 4096 --duration 30 --out results.json
+#
+# The .blend must be a Tangible Landscape scene: a terrain object, the
+# cameras, Clouds and Sun, and the engine and realism worlds. Rendering is
+# left alone and Cycles is set to the CPU.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib
+import subprocess
+
+import bpy
+
+here = os.path.dirname(os.path.abspath(__file__))
+addonDir = os.path.dirname(here)
+
+sys.path.insert(0, here)
+import producer
+
+
+def parseArgs():
+
+    argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="watchloop.py")
+    parser.add_argument("--module", default=os.path.basename(addonDir),
+                        help="package name of the addon")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[128, 256, 512, 1024, 2048, 4096],
+                        help="terrain sizes in cells per side")
+    parser.add_argument("--duration", type=float, default=30.0,
+                        help="seconds the producer writes for, per size")
+    parser.add_argument("--drain", type=float, default=30.0,
+                        help="seconds allowed to apply what is left after")
+    parser.add_argument("--rate", type=producer.parseRate, action="append",
+                        default=[], help="layer=updates per second")
+    parser.add_argument("--extent", type=float, default=750.0)
+    parser.add_argument("--origin", type=float, nargs=2, default=None,
+                        help="lower left corner, the scene origin by "
+                        "default")
+    parser.add_argument("--folder", default=None,
+                        help="watch folder, a temporary one by default")
+    parser.add_argument("--out", default=None, help="JSON results file")
+    return parser.parse_args(argv)
+
+
+def startProducer(args, folder, size, origin):
+
+    python = getattr(bpy.app, "binary_path_python", None) or sys.executable
+    command = [python, os.path.join(here, "producer.py"), folder,
+               "--size", str(size), "--duration", str(args.duration),
+               "--extent", str(args.extent),
+               "--origin", str(origin[0]), str(origin[1])]
+    for layer, rate in args.rate:
+        command += ["--rate", "{0}={1}".format(layer, rate)]
+    return subprocess.Popen(command, stdout=subprocess.PIPE,
+                            universal_newlines=True)
+
+
+def watchLoop(headless, prefs, producerProcess, drain, tick=.01):
+    """ runs the headless watch loop until the producer is done and its
+    updates are applied, or drain seconds after it finished. Returns the
+    applied updates per layer """
+
+    finished = []
+
+    def done(loop):
+        if not finished and producerProcess.poll() is not None:
+            finished.append(time.time())
+        return bool(finished) and (not loop.pending or
+                                   time.time() - finished[0] > drain)
+
+    loop = headless.WatchLoop(prefs).start()
+    try:
+        loop.run(until=done, tick=tick)
+    finally:
+        loop.stop()
+    return loop.applied
+
+
+def runSize(Modeling3D, headless, metrics, args, folder, size):
+
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    metrics.clear()
+
+    prefs = Modeling3D.Prefs()
+    prefs.watchFolder = folder
+    origin = args.origin or Modeling3D.sceneOrigin(bpy.context.scene)
+
+    start = time.time()
+    process = startProducer(args, folder, size, origin)
+    applied = watchLoop(headless, prefs, process, args.drain)
+    elapsed = time.time() - start
+    written = json.loads(process.communicate()[0].strip().splitlines()[-1])
+
+    layers = {}
+    for kind, name, count, p50, p95, peak in metrics.summary("latency"):
+        layers[name] = {"written": written["written"].get(name, 0),
+                        "applied": applied.get(name, 0),
+                        "perSecond": applied.get(name, 0) / elapsed,
+                        "p50": p50, "p95": p95, "max": peak}
+    handlers = dict((name, {"count": count, "p50": p50, "p95": p95,
+                            "max": peak})
+                    for kind, name, count, p50, p95, peak in
+                    metrics.summary("handler"))
+    return {"size": size, "elapsed": elapsed,
+            "perSecond": sum(applied.values()) / elapsed,
+            "layers": layers, "handlers": handlers}
+
+
+def report(result):
+
+    print("{0}x{0}: {1:.2f} updates/s over {2:.1f} s".format(
+        result["size"], result["perSecond"], result["elapsed"]))
+    print("    {0:<8} {1:>7} {2:>7} {3:>8} {4:>8} {5:>8} {6:>8}".format(
+        "layer", "written", "applied", "per s", "p50 ms", "p95 ms",
+        "max ms"))
+    for name, layer in sorted(result["layers"].items()):
+        print("    {0:<8} {1:>7} {2:>7} {3:>8.2f} {4:>8.0f} {5:>8.0f} "
+              "{6:>8.0f}".format(name, layer["written"], layer["applied"],
+                                 layer["perSecond"], layer["p50"],
+                                 layer["p95"], layer["max"]))
+
+
+def main():
+
+    args = parseArgs()
+    sys.path.insert(0, os.path.dirname(addonDir))
+    Modeling3D = importlib.import_module(args.module + ".Modeling3D")
+    headless = importlib.import_module(args.module + ".headless")
+    metrics = importlib.import_module(args.module + ".metrics")
+
+    scene = bpy.context.scene
+    if hasattr(scene, "cycles"):
+        scene.cycles.device = 'CPU'
+
+    folder = args.folder or tempfile.mkdtemp(prefix="tl_watch_")
+    os.makedirs(folder, exist_ok=True)
+    results = []
+    try:
+        for size in args.sizes:
+            result = runSize(Modeling3D, headless, metrics.handlerMetrics,
+                             args, folder, size)
+            report(result)
+            results.append(result)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"blender": bpy.app.version_string,
+                       "duration": args.duration, "results": results},
+                      f, indent="\t")
+
+
+main()
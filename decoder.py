@@ -0,0 +1,78 @@
+# Background decoding of watch folder files, so that only applying the
+# results to bpy data is left for the main thread.
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DecodePool:
+    """Decodes handed-off files on worker threads with the decoder
+    registered for their layer, decoders(path) -> data. Threads are used
+    rather than processes as file reads, zlib and numpy copies release the
+    GIL and the arrays need no pickling. Updates of layers without a decoder
+    pass straight through with data None.
+
+    discard(update) is called for the older versions dropped, once no
+    worker reads them any more"""
+
+    def __init__(self, decoders, workers=2, discard=None):
+
+        self.decoders = decoders
+        self.discard = discard
+        self._executor = ThreadPoolExecutor(workers)
+        self._jobs = {}
+        # dropped versions whose decoding could not be cancelled #
+        self._stale = []
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def submit(self, update):
+        """ starts decoding an update, dropping a pending older version """
+
+        key = (update.layer, update.name)
+        if key in self._jobs:
+            self._drop(*self._jobs[key])
+        decode = self.decoders.get(update.layer)
+        future = None
+        if decode is not None:
+            future = self._executor.submit(decode, update.path)
+        self._jobs[key] = (update, future)
+
+    def _drop(self, update, future):
+
+        if future is None or future.cancel():
+            if self.discard is not None:
+                self.discard(update)
+        else:
+            self._stale.append((update, future))
+
+    def ready(self):
+        """ returns the updates whose decoding finished, with their data, in
+        sequence order. Failed decodes are returned with data None """
+
+        for update, future in [j for j in self._stale if j[1].done()]:
+            self._stale.remove((update, future))
+            if self.discard is not None:
+                self.discard(update)
+
+        done = []
+        for key, (update, future) in list(self._jobs.items()):
+            if future is not None:
+                if not future.done():
+                    continue
+                try:
+                    update = update._replace(data=future.result())
+                except Exception as e:
+                    print("Could not decode {0}: {1}".format(update.path, e))
+            del self._jobs[key]
+            done.append(update)
+        return sorted(done, key=lambda u: u.seq)
+
+    def shutdown(self):
+
+        for update, future in self._jobs.values():
+            if future is not None:
+                future.cancel()
+        self._jobs.clear()
+        self._stale = []
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,218 @@
+# The watch mode loop without the modal operator: watches the folder,
+# decodes and applies updates with the Adapt handlers from a plain loop, so
+# it runs in background Blender on render nodes and in benchmarks. The modal
+# operator drives the same loop from its window timer.
+#
+#   blender -b lab.blend --python scripts/watch_headless.py -- \
+#       --module tangible_landscape --render /tmp/frames
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import traceback
+
+import bpy
+
+from . import watcher
+from .Modeling3D import (Prefs, Adapt, applyChange, fileLayer, decoders,
+                         drainStep, settleTime)
+from .decoder import DecodePool
+from .scheduler import UpdateScheduler
+from .memory import MemoryTracker
+from .metrics import handlerMetrics
+
+
+class WatchLoop:
+    """Runs watch folder updates through the Adapt handlers one tick at a
+    time: completely written files are decoded on worker threads and
+    applied by priority within the per-tick budget, the rest carries to the
+    next tick.
+
+    When renderFolder is set the scene camera is rendered to a numbered
+    image there after every tick that applied an update"""
+
+    def __init__(self, prefs=None, adapt=None, renderFolder=None,
+                 metrics=handlerMetrics):
+
+        self.prefs = prefs or Prefs()
+        self.adapt = adapt
+        self.renderFolder = renderFolder
+        self.metrics = metrics
+        self.adaptMode = None
+        # updates applied per layer #
+        self.applied = {}
+        self.rendered = 0
+        self.watcher = None
+
+    @property
+    def pending(self):
+        """ number of updates handed off, being decoded or queued """
+
+        if self.watcher is None:
+            return 0
+        return len(self.handoff) + len(self.decoder) + len(self.scheduler)
+
+    def start(self, clear=True):
+        """ starts watching the folder, emptying it first unless clear is
+        False """
+
+        folder = self.prefs.watchFolder
+        if clear:
+            for file in os.listdir(folder):
+                path = os.path.join(folder, file)
+                try:
+                    # claimed updates left by an earlier run #
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    print("Could not remove file")
+        if self.adapt is None:
+            self.adapt = Adapt()
+
+        # the update speed is the polling period when file system events
+        # are not available #
+        self.watcher = watcher.FolderWatcher(folder, fileLayer,
+                                             interval=self.prefs.timer)
+        self.watcher.start()
+        # shapefiles are complete once their index and table are too #
+        self.handoff = watcher.Handoff(settleTime, {".shp": (".shx", ".dbf")})
+        # superseded versions give back their claimed files #
+        self.decoder = DecodePool(decoders, discard=watcher.release)
+        self.scheduler = UpdateScheduler(self.prefs.budget,
+                                         discard=watcher.release)
+        self.memory = MemoryTracker(self.prefs.memoryBudget)
+        return self
+
+    def stop(self):
+
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.decoder.shutdown()
+            self.watcher = None
+
+    def step(self, camera=None):
+        """ runs one tick and returns the (update, adapt mode) pairs run,
+        the adapt mode being None for updates that could not be applied.
+        The tiled terrain levels follow camera, the scene camera by
+        default """
+
+        for change in self.handoff.collect(self.watcher.drain()):
+            self.decoder.submit(change)
+        for change in self.decoder.ready():
+            self.scheduler.push(change)
+        adapt = self.adapt
+        if adapt.tiles:
+            adapt.tiles.selectLevels(camera or adapt.scene.camera)
+        if not self.scheduler:
+            self.memory.sample(1.0)
+            return []
+
+        done = self.scheduler.run(self.apply)
+        applied = False
+        for change, adaptMode in done:
+            # updates that could not be applied are not counted #
+            if not adaptMode:
+                continue
+            self.adaptMode = adaptMode
+            # from the file being written to its update applied #
+            self.metrics.record("latency", change.layer,
+                                (time.time() - change.time) * 1000)
+            layer = change.layer
+            self.applied[layer] = self.applied.get(layer, 0) + 1
+            applied = True
+        self.memory.sample()
+        self.memory.purge()
+        if applied and self.renderFolder:
+            self.render()
+        return done
+
+    def apply(self, change):
+        """ applies an update and returns its adapt mode, None when it
+        failed. Errors stay with their update """
+
+        try:
+            # datablocks created by the handlers are tracked as owned #
+            return self.memory.run(applyChange, self.adapt, self.prefs,
+                                   change)
+        except Exception:
+            print("Could not apply {0}:".format(change.path))
+            traceback.print_exc()
+            watcher.release(change)
+
+    def render(self):
+        """ renders the scene camera to the next numbered image of the
+        render folder and returns its path """
+
+        scene = self.adapt.scene
+        self.rendered += 1
+        path = os.path.join(self.renderFolder, "update_{0:05d}{1}".format(
+            self.rendered, scene.render.file_extension))
+        scene.render.filepath = path
+        bpy.ops.render.render(write_still=True)
+        return path
+
+    def run(self, duration=None, until=None, tick=drainStep):
+        """ steps every tick seconds for duration seconds, or until
+        until(loop) is true, and forever without either. The watcher is
+        stopped when a tick fails """
+
+        start = time.time()
+        try:
+            while True:
+                began = time.time()
+                self.step()
+                if duration is not None and began - start >= duration:
+                    break
+                if until is not None and until(self):
+                    break
+                time.sleep(max(0.0, tick - (time.time() - began)))
+        except BaseException:
+            self.stop()
+            raise
+
+
+def main(argv=None):
+    """ command line entry point, runs the loop on the open .blend """
+
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv \
+            else []
+    parser = argparse.ArgumentParser(prog="watch_headless.py")
+    parser.add_argument("--folder", default=None,
+                        help="watch folder, the one of the settings by "
+                        "default")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="seconds to run for, until interrupted by "
+                        "default")
+    parser.add_argument("--render", default=None, metavar="FOLDER",
+                        help="render the scene camera into the folder "
+                        "after every applied update")
+    parser.add_argument("--device", default="CPU", choices=("CPU", "GPU"),
+                        help="Cycles render device")
+    parser.add_argument("--keep", action="store_true",
+                        help="keep the files already in the watch folder")
+    args = parser.parse_args(argv)
+
+    prefs = Prefs()
+    if args.folder:
+        prefs.watchFolder = args.folder
+    if args.render:
+        os.makedirs(args.render, exist_ok=True)
+    scene = bpy.context.scene
+    if hasattr(scene, "cycles"):
+        scene.cycles.device = args.device
+
+    loop = WatchLoop(prefs, renderFolder=args.render).start(not args.keep)
+    print("Watching {0}".format(prefs.watchFolder))
+    try:
+        loop.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.stop()
+    print("Applied {0} updates, rendered {1} images".format(
+        sum(loop.applied.values()), loop.rendered))
@@ -0,0 +1,124 @@
+# Height queries on the terrain raster grid. Lookups go straight from the
+# coordinates to the pixels through the geotransform, no mesh vertices are
+# visited.
+
+import numpy as np
+
+
+class HeightField:
+    """Nearest, bilinear, gradient, slope and normal queries on a north-up
+    elevation raster, in scene coordinates (world coordinates minus the
+    origin). Every query takes scalars or arrays of any shape and returns
+    the same shape; points outside of the raster or on nodata give NaN"""
+
+    def __init__(self, elev, geotransform, nodata=None, origin=(0, 0)):
+
+        z = np.asarray(elev, np.float32)
+        if nodata is not None and not np.isnan(nodata):
+            holes = z == nodata
+            if holes.any():
+                z = np.where(holes, np.float32(np.nan), z)
+        self.z = z
+        x0, dx, rx, y0, ry, dy = geotransform
+        self.geotransform = (x0 - origin[0], dx, rx, y0 - origin[1], ry, dy)
+        self.origin = tuple(origin)
+
+    @property
+    def shape(self):
+        return self.z.shape
+
+    def extent(self):
+        """ returns the (xmin, ymin, xmax, ymax) scene extent of the grid """
+
+        x0, dx, rx, y0, ry, dy = self.geotransform
+        h, w = self.z.shape
+        xs, ys = (x0, x0 + w * dx), (y0, y0 + h * dy)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _pixels(self, x, y):
+        """ fractional column and row of the coordinates, pixel centres on
+        whole numbers """
+
+        x0, dx, rx, y0, ry, dy = self.geotransform
+        fc = (np.asarray(x, np.float64) - x0) / dx - .5
+        fr = (np.asarray(y, np.float64) - y0) / dy - .5
+        return fc, fr
+
+    def _result(self, values, x):
+        return float(values) if np.ndim(x) == 0 else values
+
+    def contains(self, x, y):
+        """ whether the coordinates lie on the raster """
+
+        fc, fr = self._pixels(x, y)
+        h, w = self.z.shape
+        return (fc >= -.5) & (fc < w - .5) & (fr >= -.5) & (fr < h - .5)
+
+    def index(self, x, y):
+        """ returns the row and column of the pixels containing the
+        coordinates, clipped to the raster """
+
+        fc, fr = self._pixels(x, y)
+        h, w = self.z.shape
+        row = np.clip(np.floor(fr + .5).astype(np.int64), 0, h - 1)
+        col = np.clip(np.floor(fc + .5).astype(np.int64), 0, w - 1)
+        return row, col
+
+    def nearest(self, x, y):
+        """ returns the height of the pixels containing the coordinates """
+
+        row, col = self.index(x, y)
+        z = np.where(self.contains(x, y), self.z[row, col], np.nan)
+        return self._result(z, x)
+
+    def _cell(self, x, y):
+        """ returns the four pixel centres around the coordinates and the
+        position of the coordinates between them """
+
+        fc, fr = self._pixels(x, y)
+        h, w = self.z.shape
+        fc = np.clip(fc, 0, w - 1)
+        fr = np.clip(fr, 0, h - 1)
+        c0 = np.clip(np.floor(fc).astype(np.int64), 0, max(w - 2, 0))
+        r0 = np.clip(np.floor(fr).astype(np.int64), 0, max(h - 2, 0))
+        c1 = np.minimum(c0 + 1, w - 1)
+        r1 = np.minimum(r0 + 1, h - 1)
+        z = self.z
+        return (z[r0, c0], z[r0, c1], z[r1, c0], z[r1, c1],
+                fc - c0, fr - r0)
+
+    def bilinear(self, x, y):
+        """ returns the heights interpolated between the four surrounding
+        pixel centres, NaN next to nodata """
+
+        z00, z01, z10, z11, tc, tr = self._cell(x, y)
+        z = ((z00 * (1 - tc) + z01 * tc) * (1 - tr) +
+             (z10 * (1 - tc) + z11 * tc) * tr)
+        z = np.where(self.contains(x, y), z, np.nan)
+        return self._result(z, x)
+
+    def gradient(self, x, y):
+        """ returns the dz/dx and dz/dy of the bilinear surface """
+
+        z00, z01, z10, z11, tc, tr = self._cell(x, y)
+        x0, dx, rx, y0, ry, dy = self.geotransform
+        dzdx = ((z01 - z00) * (1 - tr) + (z11 - z10) * tr) / dx
+        dzdy = ((z10 - z00) * (1 - tc) + (z11 - z01) * tc) / dy
+        outside = ~self.contains(x, y)
+        dzdx = np.where(outside, np.nan, dzdx)
+        dzdy = np.where(outside, np.nan, dzdy)
+        return self._result(dzdx, x), self._result(dzdy, x)
+
+    def slope(self, x, y):
+        """ returns the slope in degrees """
+
+        dzdx, dzdy = self.gradient(x, y)
+        return np.degrees(np.arctan(np.hypot(dzdx, dzdy)))
+
+    def normal(self, x, y):
+        """ returns the unit surface normals as (..., 3) array """
+
+        dzdx, dzdy = self.gradient(x, y)
+        n = np.stack(np.broadcast_arrays(-np.asarray(dzdx),
+                                         -np.asarray(dzdy), 1.0), axis=-1)
+        return n / np.sqrt((n ** 2).sum(axis=-1))[..., None]
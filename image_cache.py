@@ -0,0 +1,192 @@
+# Content addressed cache of the images read from the watch folder: decoded
+# arrays for the decoder threads and image datablocks for the main thread.
+# Entries are keyed by the SHA-1 of the file, not by its name.
+
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+import bpy
+
+from . import image_io
+
+
+def contentHash(path, blockSize=1 << 20):
+    """ returns the SHA-1 hex digest of the file contents """
+
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def imageBytes(path):
+    """ estimated size in memory of the image once loaded as RGBA bytes """
+
+    size = image_io.pngSize(path)
+    if size is None:
+        return os.path.getsize(path) * 4
+    return size[0] * size[1] * 4
+
+
+class ImageCache:
+    """Keeps decoded arrays and image datablocks by content hash, least
+    recently used first out, within limit megabytes each.
+
+    Identical content is never decoded or loaded twice, whatever its file
+    name. New image content is reloaded in place into the current image,
+    the most recently used one, unless that content was seen before: only
+    recurring content keeps a datablock of its own, while there is room,
+    after which the least recently used image is reloaded instead. Hits,
+    misses, in place replacements and evictions are counted"""
+
+    # image contents remembered for telling recurring ones #
+    seenSize = 1024
+
+    def __init__(self, limit=256):
+
+        self.limit = limit * 1024 ** 2
+        self.hits = 0
+        self.misses = 0
+        self.replaced = 0
+        self.evicted = 0
+        self._arrays = OrderedDict()
+        self._images = OrderedDict()
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._arrays) + len(self._images)
+
+    def arrayBytes(self):
+        return sum(a.nbytes for a in self._arrays.values()
+                   if hasattr(a, "nbytes"))
+
+    def imageBytes(self):
+        return sum(entry[2] for entry in self._images.values())
+
+    def stats(self):
+        """ returns the counters and sizes as a dict """
+
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hitRate": self.hits / float(lookups) if lookups else 0.0,
+                "replaced": self.replaced, "evicted": self.evicted,
+                "arrays": len(self._arrays), "images": len(self._images),
+                "bytes": self.arrayBytes() + self.imageBytes()}
+
+    def read(self, path, decode):
+        """ returns the content hash of the file and decode(path), decoding
+        only content not seen before. The returned data is shared between
+        hits and must not be modified. Safe to call from worker threads """
+
+        digest = contentHash(path)
+        with self._lock:
+            if digest in self._arrays:
+                self._arrays.move_to_end(digest)
+                self.hits += 1
+                return digest, self._arrays[digest]
+        data = decode(path)
+        with self._lock:
+            self.misses += 1
+            self._arrays[digest] = data
+            while len(self._arrays) > 1 and self.arrayBytes() > self.limit:
+                self._arrays.popitem(last=False)
+                self.evicted += 1
+        return digest, data
+
+    def decoder(self, decode):
+        """ returns a DecodePool decoder going through the cache """
+
+        return lambda path: self.read(path, decode)
+
+    def _see(self, digest):
+        """ counts the lookups of the content """
+
+        self._seen[digest] = self._seen.pop(digest, 0) + 1
+        while len(self._seen) > self.seenSize:
+            self._seen.popitem(last=False)
+
+    def _reload(self, digest, path):
+        """ reloads the image of the entry from path, returns it or None
+        when its datablock is gone """
+
+        oldName, oldPath, oldBytes = self._images.pop(digest)
+        img = bpy.data.images.get(oldName)
+        if img is not None:
+            img.filepath = path
+            img.reload()
+            self.replaced += 1
+        self._removeFile(oldPath, path)
+        return img
+
+    def image(self, path, name, digest=None):
+        """Returns an image datablock with the contents of the file at path
+        and whether it was cached. On a hit the file at path is removed, the
+        cached image keeps reading from its own file. Cached images own
+        their file until they are evicted. Main thread only"""
+
+        digest = digest or contentHash(path)
+        self._see(digest)
+        entry = self._images.get(digest)
+        img = bpy.data.images.get(entry[0]) if entry else None
+        if img is not None:
+            self._images.move_to_end(digest)
+            self.hits += 1
+            if os.path.abspath(path) != os.path.abspath(entry[1]):
+                os.remove(path)
+            return img, True
+        if entry:
+            del self._images[digest]
+        self.misses += 1
+
+        nbytes = imageBytes(path)
+        img = None
+        if self._images:
+            current = next(reversed(self._images))
+            if self._seen.get(current, 0) < 2:
+                img = self._reload(current, path)
+        if img is None and self._images and \
+                self.imageBytes() + nbytes > self.limit:
+            img = self._reload(next(iter(self._images)), path)
+        if img is None:
+            img = bpy.data.images.load(path)
+            # kept for reuse while unassigned, removed on eviction #
+            img.use_fake_user = True
+        img.name = "{0}.{1}".format(name, digest[:8])
+        self._images[digest] = (img.name, path, nbytes)
+        self._evictImages()
+        return img, False
+
+    def _removeFile(self, path, keep):
+
+        if path != keep and os.path.exists(path):
+            os.remove(path)
+
+    def _evictImages(self):
+        """ removes least recently used images nothing else uses while the
+        images are over the limit """
+
+        newest = next(reversed(self._images))
+        for digest in list(self._images):
+            if digest == newest or self.imageBytes() <= self.limit:
+                break
+            name, path, nbytes = self._images[digest]
+            img = bpy.data.images.get(name)
+            if img is not None and img.users > 1:
+                continue
+            if img is not None:
+                bpy.data.images.remove(img)
+            del self._images[digest]
+            self._removeFile(path, None)
+            self.evicted += 1
+
+    def clear(self):
+        """ forgets all entries, leaving the datablocks and files alone """
+
+        with self._lock:
+            self._arrays.clear()
+        self._images.clear()
+        self._seen.clear()
@@ -0,0 +1,160 @@
+# PNG reader for the class rasters written into the watch folder. Decodes
+# grey, palette and RGB(A) images of any bit depth to numpy arrays.
+
+import struct
+import zlib
+
+import numpy as np
+
+pngSignature = b"\x89PNG\r\n\x1a\n"
+
+# samples per pixel of the PNG colour types #
+colorChannels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+
+def _paeth(a, b, c):
+    """ Paeth predictor of integer arrays, a left, b up and c upper left """
+
+    pa, pb, pc = np.abs(b - c), np.abs(a - c), np.abs(a + b - 2 * c)
+    return np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c))
+
+
+def _unfilterRun(lines, prev, kinds, bpp, band=512):
+    """ reverses a run of rows filtered with Average (3) or Paeth (4).
+    Every byte depends on its left and upper neighbours, so the pixels of
+    a band of rows are reconstructed one anti-diagonal at a time, all of a
+    diagonal at once """
+
+    count, stride = lines.shape
+    if count > band:
+        out = np.empty((count, stride), np.uint8)
+        for y in range(0, count, band):
+            out[y:y + band] = _unfilterRun(lines[y:y + band], prev,
+                                           kinds[y:y + band], bpp, band)
+            prev = out[y + band - 1] if y + band < count else None
+        return out
+
+    width = stride // bpp
+    # skewed so that diagonal c holds pixel x of row r - 1 at x + r + 1,
+    # row 0 being the previous row and x = -1 staying zero #
+    r = np.arange(1, count + 1)[:, None]
+    c = np.arange(width)[None, :] + r + 1
+    raw = np.zeros((count + width + 1, count + 1, bpp), np.int16)
+    raw[c, r] = lines.reshape(count, width, bpp)
+    done = np.zeros_like(raw)
+    done[1:width + 1, 0] = prev.reshape(width, bpp)
+    average = (kinds == 3)[:, None]
+    for d in range(2, count + width + 1):
+        r0, r1 = max(1, d - width), min(count, d - 1) + 1
+        left, up = done[d - 1, r0:r1], done[d - 1, r0 - 1:r1 - 1]
+        corner = done[d - 2, r0 - 1:r1 - 1]
+        guess = np.where(average[r0 - 1:r1 - 1], (left + up) >> 1,
+                         _paeth(left, up, corner))
+        done[d, r0:r1] = (raw[d, r0:r1] + guess) & 255
+    return done[c, r].reshape(count, stride).astype(np.uint8)
+
+
+def _unfilter(data, height, stride, bpp):
+    """ reverses the per row PNG filters of the decompressed image data """
+
+    rows = np.frombuffer(data, np.uint8)[:height * (stride + 1)]
+    rows = rows.reshape(height, stride + 1)
+    kinds = rows[:, 0]
+    out = np.empty((height, stride), np.uint8)
+    prev = np.zeros(stride, np.uint8)
+    y = 0
+    while y < height:
+        kind, line = kinds[y], rows[y, 1:]
+        if kind == 0:
+            out[y] = line
+        elif kind == 1:
+            out[y] = np.cumsum(line.reshape(-1, bpp), axis=0,
+                               dtype=np.uint8).ravel()
+        elif kind == 2:
+            out[y] = line + prev
+        elif kind in (3, 4):
+            end = y + 1
+            while end < height and kinds[end] in (3, 4):
+                end += 1
+            out[y:end] = _unfilterRun(rows[y:end, 1:], prev, kinds[y:end],
+                                      bpp)
+            y = end - 1
+        else:
+            raise ValueError("Invalid PNG filter {0}".format(kind))
+        prev = out[y]
+        y += 1
+    return out
+
+
+def readPNG(path):
+    """ reads a PNG file into a (rows, cols, channels) uint8 or uint16
+    array. Palette images are expanded to RGB, or RGBA with transparency """
+
+    with open(path, "rb") as f:
+        buf = f.read()
+    if buf[:8] != pngSignature:
+        raise ValueError("{0} is not a PNG file".format(path))
+
+    pos = 8
+    idat = []
+    palette = transparency = None
+    header = None
+    while pos + 8 <= len(buf):
+        length, kind = struct.unpack(">I4s", buf[pos:pos + 8])
+        chunk = buf[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"PLTE":
+            palette = np.frombuffer(chunk, np.uint8).reshape(-1, 3)
+        elif kind == b"tRNS":
+            transparency = np.frombuffer(chunk, np.uint8)
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ValueError("{0} has no PNG header".format(path))
+
+    width, height, bits, color, compression, filtering, interlace = header
+    if interlace:
+        raise NotImplementedError(
+            "Interlaced PNG is not supported in {0}".format(path))
+    channels = colorChannels[color]
+    stride = (width * channels * bits + 7) // 8
+    bpp = max(1, channels * bits // 8)
+    rows = _unfilter(zlib.decompress(b"".join(idat)), height, stride, bpp)
+
+    if bits == 16:
+        image = rows.view(">u2").astype(np.uint16)
+    elif bits < 8:
+        image = np.unpackbits(rows, axis=1).reshape(height, -1, bits)
+        weights = 1 << np.arange(bits - 1, -1, -1, dtype=np.uint8)
+        image = (image * weights).sum(axis=2, dtype=np.uint8)
+        image = image[:, :width * channels]
+        if color == 0:
+            image = image * np.uint8(255 // ((1 << bits) - 1))
+    else:
+        image = rows
+    image = image.reshape(height, width, channels)
+
+    if color == 3 and palette is not None:
+        index = image[..., 0]
+        if transparency is not None:
+            alpha = np.full(len(palette), 255, np.uint8)
+            alpha[:len(transparency)] = transparency[:len(palette)]
+            image = np.dstack([palette[index], alpha[index]])
+        else:
+            image = palette[index]
+    return image
+
+
+def pngSize(path):
+    """ returns the (width, height) of a PNG file from its header, None for
+    other files """
+
+    with open(path, "rb") as f:
+        head = f.read(24)
+    if head[:8] != pngSignature or head[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", head[16:24])
@@ -0,0 +1,144 @@
+# Datablock and resident memory accounting for long watch mode sessions.
+
+import os
+import sys
+import time
+import ctypes
+from collections import deque
+
+import bpy
+
+# bpy.data collections the handlers create datablocks in #
+trackedTypes = ("meshes", "curves", "images", "textures", "materials",
+                "particles", "objects")
+ownedTypes = ("meshes", "curves", "images", "textures", "materials",
+              "particles")
+
+
+def residentMemory():
+    """ returns the resident memory of the process in bytes, None if it is
+    not available on this platform """
+
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/self/statm") as statm:
+                pages = int(statm.read().split()[1])
+            return pages * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            return None
+
+    if sys.platform == "win32":
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong),
+                        ("PageFaultCount", ctypes.c_ulong),
+                        ("PeakWorkingSetSize", ctypes.c_size_t),
+                        ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t),
+                        ("PeakPagefileUsage", ctypes.c_size_t)]
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+                process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        import resource
+        # peak rather than current size, bytes on macOS #
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    except ImportError:
+        return None
+
+
+class MemoryTracker:
+    """Counts datablocks per type and the resident memory on every sample,
+    flags types whose count keeps growing and purges the orphans of the
+    datablocks created while running the addon's own handlers.
+
+    Owned orphans are purged purgeLimit per call, all at once when the
+    resident memory is above budget megabytes (0 disables the budget)"""
+
+    def __init__(self, budget=0, purgeLimit=20, history=120, window=10):
+
+        self.budget = budget
+        self.purgeLimit = purgeLimit
+        self.window = window
+        self.history = deque(maxlen=history)
+        self.purged = 0
+        self.owned = dict((t, set()) for t in ownedTypes)
+        self.lastSample = 0.0
+
+    def sample(self, minInterval=0):
+        """ records the current datablock counts and resident memory, at
+        most once per minInterval seconds. Returns the sample """
+
+        now = time.time()
+        if self.history and now - self.lastSample < minInterval:
+            return self.history[-1]
+        counts = dict((t, len(getattr(bpy.data, t))) for t in trackedTypes)
+        self.history.append((now, counts, residentMemory()))
+        self.lastSample = now
+        return self.history[-1]
+
+    def growing(self):
+        """ returns the types whose count rose over the last window samples
+        without ever going down """
+
+        if len(self.history) < self.window:
+            return []
+        samples = [h[1] for h in list(self.history)[-self.window:]]
+        flagged = []
+        for t in trackedTypes:
+            counts = [s[t] for s in samples]
+            if counts[-1] > counts[0] and all(
+                    b >= a for a, b in zip(counts, counts[1:])):
+                flagged.append(t)
+        return flagged
+
+    def _names(self):
+        return dict((t, set(d.name for d in getattr(bpy.data, t)))
+                    for t in ownedTypes)
+
+    def run(self, handler, *args):
+        """ runs handler(*args) and records the datablocks it created as
+        owned by the addon. Returns the handler result """
+
+        before = self._names()
+        try:
+            return handler(*args)
+        finally:
+            after = self._names()
+            for t in ownedTypes:
+                self.owned[t] |= after[t] - before[t]
+
+    def orphans(self):
+        """ returns the (type, datablock) pairs of unused owned datablocks """
+
+        found = []
+        for t in ownedTypes:
+            data = getattr(bpy.data, t)
+            for name in list(self.owned[t]):
+                block = data.get(name)
+                if block is None:
+                    self.owned[t].discard(name)
+                elif block.users == 0 and not block.use_fake_user:
+                    found.append((t, block))
+        return found
+
+    def purge(self):
+        """ removes owned orphans within the budget and returns how many """
+
+        orphans = self.orphans()
+        rss = self.history[-1][2] if self.history else None
+        if not (self.budget and rss and rss > self.budget * 1024 ** 2):
+            orphans = orphans[:self.purgeLimit]
+        for t, block in orphans:
+            self.owned[t].discard(block.name)
+            getattr(bpy.data, t).remove(block)
+        self.purged += len(orphans)
+        return len(orphans)
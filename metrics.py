@@ -0,0 +1,111 @@
+# Timings of the watch mode: the run time of every Adapt handler call and
+# the latency from a watch folder file being written to its update being
+# applied, kept in fixed size ring buffers per series.
+
+import csv
+import json
+import math
+import time
+import functools
+from collections import deque, OrderedDict
+
+# samples kept per series #
+metricsSize = 500
+
+
+def percentile(ordered, q):
+    """ nearest rank q percentile of an ascending list """
+
+    if not ordered:
+        return None
+    rank = max(int(math.ceil(q / 100.0 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class Metrics:
+    """Keeps the last size (wall clock time, milliseconds) samples of every
+    (kind, name) series, kind being "handler" for handler run times and
+    "latency" for file to scene latencies by layer, of applied updates
+    only"""
+
+    def __init__(self, size=metricsSize):
+
+        self.size = size
+        self.series = OrderedDict()
+
+    def __len__(self):
+        return len(self.series)
+
+    def record(self, kind, name, ms, stamp=None):
+
+        key = (kind, name)
+        if key not in self.series:
+            self.series[key] = deque(maxlen=self.size)
+        self.series[key].append((time.time() if stamp is None else stamp,
+                                 ms))
+
+    def summary(self, kind=None):
+        """ returns (kind, name, count, p50, p95, max) rows, of one kind
+        only when given """
+
+        rows = []
+        for (k, name), samples in self.series.items():
+            if kind is not None and k != kind:
+                continue
+            ordered = sorted(ms for stamp, ms in samples)
+            rows.append((k, name, len(ordered), percentile(ordered, 50),
+                         percentile(ordered, 95), ordered[-1]))
+        return rows
+
+    def exportCSV(self, path):
+        """ writes one kind, name, time, ms row per sample """
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["kind", "name", "time", "ms"])
+            for (kind, name), samples in self.series.items():
+                for stamp, ms in samples:
+                    writer.writerow([kind, name, "{0:.3f}".format(stamp),
+                                     "{0:.3f}".format(ms)])
+
+    def exportJSON(self, path):
+        """ writes the summary and the samples of every series """
+
+        series = []
+        for row in self.summary():
+            kind, name, count, p50, p95, peak = row
+            series.append({"kind": kind, "name": name, "count": count,
+                           "p50": p50, "p95": p95, "max": peak,
+                           "samples": list(self.series[(kind, name)])})
+        with open(path, "w") as f:
+            json.dump({"size": self.size, "series": series}, f, indent="\t")
+
+    def export(self, path):
+        """ writes JSON for .json paths and CSV otherwise """
+
+        if path.lower().endswith(".json"):
+            self.exportJSON(path)
+        else:
+            self.exportCSV(path)
+
+    def clear(self):
+        self.series.clear()
+
+
+# timings of the running addon, shown in the panel #
+handlerMetrics = Metrics()
+
+
+def timed(handler):
+    """ records the run time of every call of the handler in
+    handlerMetrics """
+
+    @functools.wraps(handler)
+    def run(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return handler(*args, **kwargs)
+        finally:
+            handlerMetrics.record("handler", handler.__name__,
+                                  (time.perf_counter() - start) * 1000)
+    return run
@@ -1,12 +1,23 @@
 import bpy,json
 from bpy.props import StringProperty, IntProperty, FloatProperty, BoolProperty, EnumProperty, FloatVectorProperty
 from bpy.types import Operator, Panel, AddonPreferences
-import addon_utils
 from . import bl_info
-from .settings import getSettings, setSettings
+from .settings import getSetting, setSetting
 PKG = __package__
 
 
+def settingAccess(key, default):
+    """ get and set functions of a preference kept in settings.json """
+
+    def get(self):
+        return getSetting(key, default)
+
+    def set(self, value):
+        setSetting(key, value)
+
+    return get, set
+
+
 class TL_PREFS_SHOW(bpy.types.Operator):
 
     bl_idname = "TL.pref_show"
@@ -15,6 +26,7 @@ class TL_PREFS_SHOW(bpy.types.Operator):
     bl_options = {'INTERNAL'}
 
     def execute(self, context):
+        import addon_utils
         addon_utils.modules_refresh()
         bpy.context.user_preferences.active_section = 'ADDONS'
         bpy.data.window_managers["WinMan"].addon_search = bl_info['name']
@@ -27,42 +39,66 @@ class TL_PREFS_SHOW(bpy.types.Operator):
 class TL_PREFS(AddonPreferences):
 
     bl_idname = PKG
-    def updateFolder(self, context):
-        prefs = getSettings()
-        prefs['folder'] = self.Folder
-        setSettings(prefs)
-
-    def updateCRS(self, context):
-        prefs = getSettings()
-        prefs['CRS'] = self.CRS
-        setSettings(prefs)
-
-    def updateTime(self, context):
-        prefs = getSettings()
-        prefs['timer'] = self.Timer
-        setSettings(prefs)
+    # values live in settings.json, read on first access #
+    getFolder, setFolder = settingAccess('folder', "")
+    getCRS, setCRS = settingAccess('CRS', "")
+    getTime, setTime = settingAccess('timer', 1)
+    getInPlace, setInPlace = settingAccess('inPlace', True)
+    getBudget, setBudget = settingAccess('budget', 40)
+    getTiled, setTiled = settingAccess('tiled', False)
+    getMemoryBudget, setMemoryBudget = settingAccess('memoryBudget', 0)
 
     Folder = StringProperty(
         name = "Coupling folder",
-        default = getSettings()['folder'],
         description = "Define a folder where the Blender File is located (e.g., D:/TL_coupling)",
         subtype = 'DIR_PATH',
-        update = updateFolder
+        get = getFolder,
+        set = setFolder
         )
 
     CRS = StringProperty(
         name = "Coordinate Reference System",
-        default = getSettings()['CRS'],
         description = "Type in EPSG code of the file Georeferene system e.g., 4328",
         subtype = 'NONE',
-        update = updateCRS
+        get = getCRS,
+        set = setCRS
         )
     Timer = IntProperty(
         name = "Update speed",
-        default = 1,
-        description = "Type in number of updates per seconds: This would increase the update rate at the expense of performance",
+        description = "Polling period of the watch folder in seconds, only used where file system events are not available",
         subtype = 'NONE',
-        update = updateTime
+        get = getTime,
+        set = setTime
+        )
+
+    InPlace = BoolProperty(
+        name = "In-place terrain updates",
+        description = "Keep one persistent terrain mesh and only rewrite its heights on each scan instead of re-importing it",
+        get = getInPlace,
+        set = setInPlace
+        )
+
+    Budget = IntProperty(
+        name = "Update budget (ms)",
+        min = 1,
+        description = "Time the watch mode may spend applying updates per tick, the rest carries to the next tick",
+        get = getBudget,
+        set = setBudget
+        )
+
+    Tiled = BoolProperty(
+        name = "Tiled terrain",
+        description = "Show large terrains as chunks with distance based resolution levels instead of one mesh (vegetation is not carried over)",
+        get = getTiled,
+        set = setTiled
+        )
+
+    MemoryBudget = IntProperty(
+        name = "Memory budget (MB)",
+        min = 0,
+        description = "Above this resident memory all unused datablocks left by the watch mode are purged at once, 0 purges a few per tick only",
+        get = getMemoryBudget,
+        set = setMemoryBudget
         )
 
     fontColor = FloatVectorProperty(
@@ -82,3 +118,7 @@ class TL_PREFS(AddonPreferences):
         box.prop(self, "Folder")
         box.prop(self, "CRS")
         box.prop(self, "Timer")
+        box.prop(self, "InPlace")
+        box.prop(self, "Budget")
+        box.prop(self, "Tiled")
+        box.prop(self, "MemoryBudget")
@@ -0,0 +1,327 @@
+# GeoTIFF reader for the rasters written into the watch folder: strips or
+# tiles, deflate and predictors, read through a memory map into numpy
+# arrays, plus helpers to find the changed tiles between two grids.
+
+import mmap
+import math
+import struct
+import zlib
+
+import numpy as np
+
+# TIFF field types: (struct code, size in bytes)
+fieldTypes = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8),
+    6: ("b", 1), 7: ("B", 1), 8: ("h", 2), 9: ("i", 4), 10: ("ii", 8),
+    11: ("f", 4), 12: ("d", 8), 16: ("Q", 8), 17: ("q", 8), 18: ("Q", 8)}
+
+sampleKinds = {1: "u", 2: "i", 3: "f"}
+
+NONE, DEFLATE, ADOBE_DEFLATE = 1, 8, 32946
+
+
+class GeoTiff:
+    """Reads single images of a (Big)TIFF file with GeoTIFF georeferencing.
+    Only the strips or tiles overlapping the requested window are decoded,
+    uncompressed data is read straight from a memory map of the file"""
+
+    def __init__(self, path):
+
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+            self._parse()
+        except struct.error:
+            self.close()
+            raise ValueError("{0} is truncated or corrupt".format(path))
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+
+        if getattr(self, "_map", None) is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # arrays of a failed read still view the map, it is closed
+                # once they are freed #
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _parse(self):
+
+        buf = self._map
+        order = buf[:2]
+        if order == b"II":
+            self._bo = "<"
+        elif order == b"MM":
+            self._bo = ">"
+        else:
+            raise ValueError("{0} is not a TIFF file".format(self.path))
+
+        magic = struct.unpack(self._bo + "H", buf[2:4])[0]
+        if magic == 42:
+            self._big = False
+            offset = struct.unpack(self._bo + "I", buf[4:8])[0]
+        elif magic == 43:
+            self._big = True
+            offset = struct.unpack(self._bo + "Q", buf[8:16])[0]
+        else:
+            raise ValueError("{0} is not a TIFF file".format(self.path))
+
+        tags = self._readIFD(offset)
+
+        self.width = tags[256][0]
+        self.height = tags[257][0]
+        self.bands = tags.get(277, (1,))[0]
+        bits = tags.get(258, (1,))[0]
+        kind = sampleKinds.get(tags.get(339, (1,))[0])
+        if kind is None or bits % 8:
+            raise ValueError("Unsupported sample format in {0}".format(
+                self.path))
+        self.dtype = np.dtype(self._bo + kind + str(bits // 8))
+        self.compression = tags.get(259, (NONE,))[0]
+        if self.compression not in (NONE, DEFLATE, ADOBE_DEFLATE):
+            raise NotImplementedError(
+                "TIFF compression {0} is not supported in {1}".format(
+                    self.compression, self.path))
+        self.predictor = tags.get(317, (1,))[0]
+        self.planar = tags.get(284, (1,))[0]
+
+        self.tiled = 322 in tags
+        if self.tiled:
+            self.blockWidth = tags[322][0]
+            self.blockHeight = tags[323][0]
+            self._offsets = tags[324]
+            self._counts = tags[325]
+        else:
+            self.blockWidth = self.width
+            self.blockHeight = min(tags.get(278, (self.height,))[0],
+                                   self.height)
+            self._offsets = tags[273]
+            self._counts = tags[279]
+        self._across = int(math.ceil(self.width / float(self.blockWidth)))
+        self._down = int(math.ceil(self.height / float(self.blockHeight)))
+
+        self.geotransform = self._geotransform(tags)
+        self.nodata = None
+        if 42113 in tags:
+            text = tags[42113].strip(b"\x00 ").decode("ascii")
+            try:
+                self.nodata = float(text)
+            except ValueError:
+                pass
+
+    def _readIFD(self, offset):
+
+        buf = self._map
+        bo = self._bo
+        if self._big:
+            count = struct.unpack(bo + "Q", buf[offset:offset + 8])[0]
+            entry, start, inline = 20, offset + 8, 8
+            head = bo + "HHQ"
+        else:
+            count = struct.unpack(bo + "H", buf[offset:offset + 2])[0]
+            entry, start, inline = 12, offset + 2, 4
+            head = bo + "HHI"
+        headSize = struct.calcsize(head)
+
+        tags = {}
+        for i in range(count):
+            pos = start + i * entry
+            tag, ftype, n = struct.unpack(head, buf[pos:pos + headSize])
+            if ftype not in fieldTypes:
+                continue
+            code, size = fieldTypes[ftype]
+            nbytes = n * size
+            pos += headSize
+            if nbytes > inline:
+                pos = struct.unpack(bo + ("Q" if self._big else "I"),
+                                    buf[pos:pos + inline])[0]
+            raw = buf[pos:pos + nbytes]
+            if ftype == 2:
+                tags[tag] = raw
+            elif ftype in (5, 10):
+                pairs = struct.unpack(bo + code[0] * (2 * n), raw)
+                tags[tag] = tuple(pairs[j] / float(pairs[j + 1] or 1)
+                                  for j in range(0, len(pairs), 2))
+            else:
+                tags[tag] = struct.unpack(bo + code * n, raw)
+        return tags
+
+    def _geotransform(self, tags):
+        """ returns a GDAL style (x0, dx, rx, y0, ry, dy) geotransform """
+
+        if 34264 in tags:
+            m = tags[34264]
+            gt = [m[3], m[0], m[1], m[7], m[4], m[5]]
+        elif 33550 in tags and 33922 in tags:
+            sx, sy = tags[33550][:2]
+            i, j, k, x, y, z = tags[33922][:6]
+            gt = [x - i * sx, sx, 0.0, y + j * sy, 0.0, -sy]
+        else:
+            return None
+
+        # PixelIsPoint rasters reference the pixel centres #
+        keys = tags.get(34735, ())
+        for n in range(4, len(keys) - 3, 4):
+            if keys[n] == 1025 and keys[n + 1] == 0 and keys[n + 3] == 2:
+                gt[0] -= (gt[1] + gt[2]) / 2.0
+                gt[3] -= (gt[4] + gt[5]) / 2.0
+        return tuple(gt)
+
+    @property
+    def shape(self):
+        return (self.height, self.width)
+
+    def _block(self, index):
+        """ returns a decoded strip or tile as (rows, cols, samples) array """
+
+        samples = 1 if self.planar == 2 else self.bands
+        offset = self._offsets[index]
+        count = self._counts[index]
+        size = self.blockHeight * self.blockWidth * samples
+        if not self.tiled:
+            row = index % self._down
+            size = (min(self.blockHeight,
+                        self.height - row * self.blockHeight) *
+                    self.blockWidth * samples)
+
+        if self.compression == NONE and self.predictor == 1:
+            if offset + size * self.dtype.itemsize > len(self._map):
+                raise ValueError("{0} is truncated".format(self.path))
+            data = np.frombuffer(self._map, self.dtype, size, offset)
+        else:
+            raw = self._map[offset:offset + count]
+            if self.compression != NONE:
+                try:
+                    raw = zlib.decompress(raw)
+                except zlib.error as e:
+                    raise ValueError("{0} has a corrupt block: {1}".format(
+                        self.path, e))
+            if len(raw) < size * self.dtype.itemsize:
+                raise ValueError("{0} is truncated".format(self.path))
+            data = np.frombuffer(raw, np.uint8)[:size * self.dtype.itemsize]
+            data = self._unpredict(data, samples)
+        return data.reshape(-1, self.blockWidth, samples)
+
+    def _unpredict(self, data, samples):
+
+        if self.predictor == 1:
+            return data.view(self.dtype)
+        if self.predictor == 2:
+            rows = data.view(self.dtype).reshape(-1, self.blockWidth, samples)
+            native = rows.astype(self.dtype.newbyteorder("="))
+            return np.cumsum(native, axis=1, dtype=native.dtype).ravel()
+        if self.predictor == 3:
+            # floating point predictor: byte differencing, then the bytes of
+            # each row are stored most significant plane first #
+            nbytes = self.dtype.itemsize
+            rows = data.reshape(-1, self.blockWidth * samples * nbytes)
+            rows = np.cumsum(rows, axis=1, dtype=np.uint8)
+            rows = rows.reshape(len(rows), nbytes, -1).transpose(0, 2, 1)
+            big = self.dtype.newbyteorder(">")
+            return np.ascontiguousarray(rows).view(big).ravel()
+        raise NotImplementedError("TIFF predictor {0} is not supported".format(
+            self.predictor))
+
+    def read(self, window=None, band=0):
+        """ reads a (row, col, rows, cols) window of the passed band into a
+        new native byte order array. Reads the whole image by default """
+
+        if window is None:
+            window = (0, 0, self.height, self.width)
+        row0, col0, rows, cols = window
+        if (row0 < 0 or col0 < 0 or rows <= 0 or cols <= 0 or
+                row0 + rows > self.height or col0 + cols > self.width):
+            raise ValueError("Window {0} is outside of the {1}x{2} raster"
+                             .format(window, self.height, self.width))
+
+        out = np.empty((rows, cols), self.dtype.newbyteorder("="))
+        sample = band
+        bandOffset = 0
+        if self.planar == 2:
+            sample = 0
+            bandOffset = band * self._across * self._down
+
+        bh, bw = self.blockHeight, self.blockWidth
+        for by in range(row0 // bh, (row0 + rows - 1) // bh + 1):
+            for bx in range(col0 // bw, (col0 + cols - 1) // bw + 1):
+                block = self._block(bandOffset + by * self._across + bx)
+                # intersection of the window and the block, in image space #
+                r0 = max(row0, by * bh)
+                r1 = min(row0 + rows, by * bh + len(block))
+                c0 = max(col0, bx * bw)
+                c1 = min(col0 + cols, bx * bw + bw, self.width)
+                out[r0 - row0:r1 - row0, c0 - col0:c1 - col0] = \
+                    block[r0 - by * bh:r1 - by * bh,
+                          c0 - bx * bw:c1 - bx * bw, sample]
+        return out
+
+
+def readRaster(path, window=None, band=0):
+    """ reads a GeoTIFF and returns its data array, geotransform and nodata
+    value. The geotransform is shifted to the origin of the passed window """
+
+    with GeoTiff(path) as tif:
+        data = tif.read(window, band)
+        gt = tif.geotransform
+        if window and gt:
+            row0, col0 = window[:2]
+            gt = (gt[0] + col0 * gt[1] + row0 * gt[2], gt[1], gt[2],
+                  gt[3] + col0 * gt[4] + row0 * gt[5], gt[4], gt[5])
+        return data, gt, tif.nodata
+
+
+def pixelIndex(x, y, geotransform, snap=.25):
+    """ returns the row and column arrays of the pixels containing the
+    passed coordinates. The default snap maps coordinates on either pixel
+    corners or centres (mesh vertices) to their own pixel """
+
+    x0, dx, rx, y0, ry, dy = geotransform
+    col = np.floor((np.asarray(x, np.float64) - x0) / dx + snap)
+    row = np.floor((np.asarray(y, np.float64) - y0) / dy + snap)
+    return row.astype(np.int64), col.astype(np.int64)
+
+
+def changedTiles(old, new, tile=32):
+    """ returns a (rows, cols) boolean mask of the tile x tile blocks where
+    the two rasters of the same shape differ. NaNs compare equal """
+
+    diff = old != new
+    if new.dtype.kind == "f":
+        diff &= ~(np.isnan(old) & np.isnan(new))
+    h, w = diff.shape
+    th, tw = -(-h // tile), -(-w // tile)
+    padded = np.zeros((th * tile, tw * tile), bool)
+    padded[:h, :w] = diff
+    return padded.reshape(th, tile, tw, tile).any(axis=(1, 3))
+
+
+def tileBounds(tiles, tile, shape, geotransform):
+    """ returns the (xmin, ymin, xmax, ymax) extent covering the set tiles
+    of a changedTiles mask, None when no tile is set """
+
+    rows = np.flatnonzero(tiles.any(axis=1))
+    cols = np.flatnonzero(tiles.any(axis=0))
+    if not len(rows):
+        return None
+    row0, row1 = rows[0] * tile, min((rows[-1] + 1) * tile, shape[0])
+    col0, col1 = cols[0] * tile, min((cols[-1] + 1) * tile, shape[1])
+    x0, dx, rx, y0, ry, dy = geotransform
+    xs = [x0 + c * dx + r * rx for c in (col0, col1) for r in (row0, row1)]
+    ys = [y0 + c * ry + r * dy for c in (col0, col1) for r in (row0, row1)]
+    return float(min(xs)), float(min(ys)), float(max(xs)), float(max(ys))
+
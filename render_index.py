@@ -0,0 +1,178 @@
+# Index of the engine and realism specific datablocks of the scene, so that
+# switching the render engine or the realism only touches the material
+# slots, lamps and particle groups that change.
+
+import bpy
+
+
+def parseName(name):
+    """ splits an engine specific name E.Base[.Realism] into its parts,
+    None for other names """
+
+    parts = name.split(".")
+    if len(parts) < 2 or len(parts[0]) != 1:
+        return None
+    return parts[0], parts[1], parts[2] if len(parts) > 2 else None
+
+
+class RenderIndex:
+    """Maps (engine letter, base name, realism) to material names, records
+    the object slots using each of them and pairs the lamps of both
+    engines. Objects are rescanned only when new, or when their data, slot
+    count or particle systems changed; slots changed behind the index are
+    detected when switching and left alone"""
+
+    def __init__(self):
+
+        self.materials = {}
+        self.slots = {}
+        self.lamps = {}
+        self.emitters = {}
+        self._objects = {}
+        self._counts = None
+
+    def _refreshNames(self):
+        """ rebuilds the material and lamp maps when datablocks were added
+        or removed """
+
+        counts = (len(bpy.data.materials), len(bpy.data.lamps))
+        if counts != self._counts:
+            self.materials = {}
+            for mat in bpy.data.materials:
+                parts = parseName(mat.name)
+                if parts:
+                    self.materials[parts] = mat.name
+            self.lamps = {}
+            for lamp in bpy.data.lamps:
+                parts = lamp.name.split(".", 1)
+                if len(parts[0]) == 1:
+                    self.lamps.setdefault(lamp.name[1:], {})[parts[0]] = \
+                        lamp.name
+            self._counts = counts
+
+    def refresh(self):
+        """ updates the index to the current scene data """
+
+        self._refreshNames()
+        present = set()
+        for obj in bpy.data.objects:
+            present.add(obj.name)
+            key = (obj.as_pointer(),
+                   obj.data.as_pointer() if obj.data else 0,
+                   len(obj.material_slots), len(obj.particle_systems))
+            if self._objects.get(obj.name, (None,))[0] != key:
+                self._forget(obj.name)
+                self._scan(obj, key)
+        for name in set(self._objects) - present:
+            self._forget(name)
+
+    def _scan(self, obj, key):
+
+        used = []
+        if "cube" not in obj.name:
+            for index, slot in enumerate(obj.material_slots):
+                if slot.material and parseName(slot.material.name):
+                    self.slots.setdefault(slot.material.name, set()).add(
+                        (obj.name, index))
+                    used.append((slot.material.name, index))
+        if obj.particle_systems:
+            self.emitters[obj.name] = [p.name for p in obj.particle_systems]
+        self._objects[obj.name] = (key, used)
+
+    def _forget(self, name):
+
+        key, used = self._objects.pop(name, (None, ()))
+        for mat, index in used:
+            self.slots.get(mat, set()).discard((name, index))
+        self.emitters.pop(name, None)
+
+    def _move(self, name, index, old, new):
+        """ records that the slot now uses the new material """
+
+        self.slots[old].discard((name, index))
+        self.slots.setdefault(new, set()).add((name, index))
+        key, used = self._objects[name]
+        used[used.index((old, index))] = (new, index)
+
+    def switchMaterials(self, engine, mode, real):
+        """ assigns the mode engine and real realism version of the
+        materials of the engine in the visible objects. Returns the number
+        of slots changed """
+
+        self.refresh()
+        changed = 0
+        for old in [m for m in self.slots if self.slots[m]]:
+            parts = parseName(old)
+            if parts[0] != engine[0]:
+                continue
+            target = (mode[0], parts[1], real if parts[2] else None)
+            new = self.materials.get(target)
+            if new is None or new == old:
+                continue
+            mat = bpy.data.materials[new]
+            for name, index in list(self.slots[old]):
+                obj = bpy.data.objects.get(name)
+                if obj is None or obj.hide:
+                    continue
+                current = obj.material_slots[index].material
+                if current is None or current.name != old:
+                    # changed behind the index, rescanned next refresh #
+                    self._objects[name] = ((None,), self._objects[name][1])
+                    continue
+                obj.data.materials[index] = mat
+                self._move(name, index, old, new)
+                changed += 1
+        return changed
+
+    def switchLamps(self, engine, mode):
+        """ moves the visible lamps of the mode engine to the first layer
+        and the ones of the engine to the fourth. Returns the lamps moved """
+
+        moved = 0
+        if engine[0] == mode[0]:
+            return moved
+        self._refreshNames()
+        for base, pair in self.lamps.items():
+            new = bpy.data.objects.get(pair.get(mode[0], ""))
+            if new is None or new.hide:
+                continue
+            old = bpy.data.objects.get(pair.get(engine[0], ""))
+            if old is not None:
+                old.layers[3] = True
+                old.layers[0] = False
+            new.layers[0] = True
+            moved += 1
+        return moved
+
+    def switchGroups(self, mode):
+        """ points the particle systems of the indexed emitters to the mode
+        realism version of their group or object, when there is one.
+        Returns the number of settings changed """
+
+        self.refresh()
+        changed = 0
+        for name, systems in self.emitters.items():
+            obj = bpy.data.objects.get(name)
+            if obj is None:
+                continue
+            for psys in systems:
+                setting = obj.particle_systems[psys].settings
+                target = mode + "_" + psys
+                if setting.count == 1 and (
+                        target + "_single" in bpy.data.groups or
+                        target + "_single" in bpy.data.objects):
+                    target += "_single"
+                if setting.render_type == 'GROUP':
+                    current = setting.dupli_group
+                    new = bpy.data.groups.get(target)
+                else:
+                    current = setting.dupli_object
+                    new = bpy.data.objects.get(target)
+                if new is None or current == new:
+                    continue
+                if setting.render_type == 'GROUP':
+                    setting.dupli_group = new
+                else:
+                    setting.dupli_object = new
+                changed += 1
+        return changed
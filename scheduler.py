@@ -0,0 +1,86 @@
+# Per-tick scheduling of watch folder updates.
+
+import time
+
+# lower runs first #
+layerPriority = {"terrain": 0, "water": 1, "texture": 2, "trail": 3,
+                 "vantage": 4, "empty": 5, "patch": 6}
+
+
+class UpdateScheduler:
+    """Queues pending updates by layer and file, newest version only, and
+    runs them in priority order within a per-tick budget in milliseconds.
+
+    An update is not started when its layer's average cost would overrun
+    the budget, it carries to the next tick instead. The first update of a
+    tick always runs so that work is never stuck, and updates that waited
+    maxWait ticks go first regardless of their priority. Replaced versions
+    are passed to discard(update)"""
+
+    def __init__(self, budget=40, priorities=layerPriority, maxWait=10,
+                 discard=None):
+
+        self.budget = budget
+        self.discard = discard
+        self.priorities = priorities
+        self.maxWait = maxWait
+        self.skipped = 0
+        self.lastTick = 0.0
+        self.cost = {}
+        self._queue = {}
+        self._waited = {}
+
+    def __len__(self):
+        return len(self._queue)
+
+    def push(self, update):
+        """ queues an update, replacing a pending older version of it """
+
+        key = (update.layer, update.name)
+        if key in self._queue:
+            self.skipped += 1
+            if self.discard is not None:
+                self.discard(self._queue[key])
+        else:
+            self._waited[key] = 0
+        self._queue[key] = update
+
+    def backlog(self):
+        """ returns (layer, pending count) pairs in priority order """
+
+        counts = {}
+        for layer, name in self._queue:
+            counts[layer] = counts.get(layer, 0) + 1
+        return sorted(counts.items(), key=lambda i: self._priority(i[0]))
+
+    def _priority(self, layer):
+        return self.priorities.get(layer, len(self.priorities))
+
+    def _order(self, key):
+
+        overdue = self._waited[key] >= self.maxWait
+        return (not overdue, self._priority(key[0]), self._queue[key].seq)
+
+    def run(self, apply, budget=None):
+        """ calls apply(update) for queued updates until the budget is spent
+        and returns the (update, result) pairs that ran """
+
+        budget = self.budget if budget is None else budget
+        start = time.perf_counter()
+        done = []
+        for key in sorted(self._queue, key=self._order):
+            elapsed = (time.perf_counter() - start) * 1000
+            if done and elapsed + self.cost.get(key[0], 0) > budget:
+                break
+            update = self._queue.pop(key)
+            del self._waited[key]
+            began = time.perf_counter()
+            done.append((update, apply(update)))
+            # running average of the layer's cost in milliseconds #
+            took = (time.perf_counter() - began) * 1000
+            self.cost[key[0]] = .7 * self.cost.get(key[0], took) + .3 * took
+
+        for key in self._waited:
+            self._waited[key] += 1
+        self.lastTick = (time.perf_counter() - start) * 1000
+        return done
@@ -0,0 +1,23 @@
+# Runs the watch mode in background Blender, see headless.py:
+#
+#   blender -b lab.blend --python scripts/watch_headless.py -- \
+#       --module tangible_landscape [--render FOLDER] [--duration SECONDS]
+#
+# --module is the package name the addon is installed as, by default the
+# name of the folder above this script.
+
+import os
+import sys
+import importlib
+
+addonDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else []
+module = os.path.basename(addonDir)
+if "--module" in argv:
+    i = argv.index("--module")
+    module = argv[i + 1]
+    del argv[i:i + 2]
+
+sys.path.insert(0, os.path.dirname(addonDir))
+importlib.import_module(module + ".headless").main(argv)
@@ -0,0 +1,76 @@
+# Long lived state of the addon, shared by the watch mode operator and the
+# panel buttons instead of building a new Adapt for every click.
+
+import bpy
+from bpy.app.handlers import persistent
+
+
+class Session:
+    """Owns the Adapt of the open file, made by factory() on first use, and
+    the scheduler and memory tracker of the running watch mode.
+
+    Adapt keeps its scene references and engine state between calls. They
+    are resolved again on the next use after objects or worlds were
+    added, removed or changed, or the render engine was switched outside
+    the addon. Loading another file drops Adapt and the watch mode state"""
+
+    def __init__(self, factory):
+
+        self.factory = factory
+        self.scheduler = None
+        self.memory = None
+        self._adapt = None
+        self._stale = False
+        self._handlers = []
+
+    @property
+    def adapt(self):
+
+        if self._adapt is None:
+            self._adapt = self.factory()
+            self._stale = False
+        elif self._stale:
+            self._adapt.resolve()
+            self._stale = False
+        return self._adapt
+
+    def reset(self):
+        """ forgets all state, the next use builds a new Adapt """
+
+        self._adapt = None
+        self._stale = False
+        self.scheduler = None
+        self.memory = None
+
+    def checkScene(self, scene):
+        """ marks the Adapt references stale when the scene changed in a
+        way that may invalidate them, called on every scene update """
+
+        if self._adapt is None or self._stale:
+            return
+        if (bpy.data.objects.is_updated or bpy.data.worlds.is_updated or
+                scene.render.engine != self._adapt.engine):
+            self._stale = True
+
+    def register(self):
+
+        @persistent
+        def loadPost(dummy):
+            self.reset()
+
+        @persistent
+        def sceneUpdate(scene):
+            self.checkScene(scene)
+
+        self._handlers = [(bpy.app.handlers.load_post, loadPost),
+                          (bpy.app.handlers.scene_update_post, sceneUpdate)]
+        for handlers, handler in self._handlers:
+            handlers.append(handler)
+
+    def unregister(self):
+
+        for handlers, handler in self._handlers:
+            if handler in handlers:
+                handlers.remove(handler)
+        self._handlers = []
+        self.reset()
@@ -1,18 +1,119 @@
 import os
 import json
+import atexit
+import threading
 
 cfgFile = os.path.dirname(os.path.abspath(__file__)) + '/settings.json'
 
+# seconds changes are held before being written, so that dragging a
+# preference slider writes the file once #
+writeDelay = 0.5
+
+
+class SettingsStore:
+	"""Settings file kept in memory. Values are served from memory and the
+	file is read again only when its modification time or size changed.
+
+	Changes are applied in memory at once and written together writeDelay
+	seconds after the last one, through a temporary file renamed over the
+	settings file so that an interrupted write leaves the old file intact.
+	Changes not yet written survive a reload of the file"""
+
+	def __init__(self, path, delay=writeDelay):
+
+		self.path = path
+		self.delay = delay
+		self._data = None
+		self._stamp = None
+		self._pending = {}
+		self._timer = None
+		self._lock = threading.RLock()
+
+	def _fileStamp(self):
+
+		try:
+			st = os.stat(self.path)
+		except OSError:
+			return None
+		return st.st_mtime_ns, st.st_size
+
+	def _load(self):
+		""" reads the file when it changed since the last read or write """
+
+		stamp = self._fileStamp()
+		if self._data is not None and stamp == self._stamp:
+			return
+		with open(self.path, 'r') as cfg:
+			data = json.load(cfg)
+		data.update(self._pending)
+		self._data = data
+		self._stamp = stamp
+
+	def get(self):
+		""" returns a copy of all the settings """
+
+		with self._lock:
+			self._load()
+			return dict(self._data)
+
+	def value(self, key, default=None):
+
+		with self._lock:
+			self._load()
+			return self._data.get(key, default)
+
+	def update(self, values):
+		""" changes the given settings, written after the delay """
+
+		with self._lock:
+			self._load()
+			changed = {k: v for k, v in values.items()
+					   if self._data.get(k, object()) != v}
+			if not changed:
+				return
+			self._data.update(changed)
+			self._pending.update(changed)
+			if self._timer is not None:
+				self._timer.cancel()
+			self._timer = threading.Timer(self.delay, self.flush)
+			self._timer.daemon = True
+			self._timer.start()
+
+	def flush(self):
+		""" writes the pending changes now """
+
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			if not self._pending:
+				return
+			self._load()
+			temp = self.path + '.tmp'
+			with open(temp, 'w') as cfg:
+				json.dump(self._data, cfg, indent='\t')
+				cfg.flush()
+				os.fsync(cfg.fileno())
+			os.replace(temp, self.path)
+			self._pending = {}
+			self._stamp = self._fileStamp()
+
+
+store = SettingsStore(cfgFile)
+atexit.register(store.flush)
+
 
 def getSettings():
-	with open(cfgFile, 'r') as cfg:
-		prefs = json.load(cfg)
-	return prefs
+	return store.get()
 
 def setSettings(prefs):
-	with open(cfgFile, 'w') as cfg:
-		json.dump(prefs, cfg, indent='\t')
+	store.update(prefs)
+
+def getSetting(k, default=None):
+	return store.value(k, default)
+
+def setSetting(k, value):
+	store.update({k: value})
 
-def getSetting(k):
-	prefs = getSettings()
-	return prefs.get(k, None)
+def flushSettings():
+	store.flush()
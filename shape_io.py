@@ -0,0 +1,239 @@
+# ESRI shapefile reader for the vector layers written into the watch folder.
+# Records are streamed from the .shp, .shx and .dbf as numpy coordinate
+# arrays with their attributes.
+
+import os
+import mmap
+import struct
+from collections import namedtuple
+
+import numpy as np
+
+NULL, POINT, POLYLINE, POLYGON, MULTIPOINT = 0, 1, 3, 5, 8
+
+# base shape type of the Z (+10) and M (+20) variants #
+zShapes = (11, 13, 15, 18)
+mShapes = (21, 23, 25, 28)
+
+# files written next to the .shp that belong to the same layer #
+sidecarExts = (".shx", ".dbf", ".prj", ".cpg", ".qix")
+
+
+class Shape(namedtuple("Shape", ["type", "points", "parts", "fields"])):
+    """A shapefile record: the base shape type, an (n, 2) or (n, 3) array of
+    all its points, the start index of each part in points and the dict of
+    its attributes"""
+
+    __slots__ = ()
+
+    def lines(self):
+        """ returns the points of each part as a list of arrays """
+
+        return np.split(self.points, self.parts[1:])
+
+
+class ShapeReader:
+    """Reads the records of a shapefile one at a time. The .shx index, when
+    present, gives random access through shape(i), and the .dbf table, when
+    present, the attributes of the records"""
+
+    def __init__(self, path):
+
+        self.path = path
+        root = os.path.splitext(path)[0]
+        self._maps = []
+        try:
+            self._shp = self._open(path)
+            self._shx = self._open(root + ".shx", optional=True)
+            self._dbf = self._open(root + ".dbf", optional=True)
+            self._parse()
+        except:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return self.shapes()
+
+    def _open(self, path, optional=False):
+        """ returns a read only memory map of the file, None for a missing
+        optional or an empty file """
+
+        try:
+            with open(path, "rb") as f:
+                if not os.fstat(f.fileno()).st_size:
+                    return None
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError):
+            if optional:
+                return None
+            raise
+        self._maps.append(buf)
+        return buf
+
+    def close(self):
+
+        for buf in self._maps:
+            buf.close()
+        self._maps = []
+        self._shp = self._shx = self._dbf = None
+
+    def _parse(self):
+
+        shp = self._shp
+        if shp is None or len(shp) < 100 or \
+                struct.unpack(">i", shp[:4])[0] != 9994:
+            raise ValueError("{0} is not a shapefile".format(self.path))
+        self.shapeType = struct.unpack("<i", shp[32:36])[0]
+        self.bbox = struct.unpack("<4d", shp[36:68])
+        self._end = min(len(shp), struct.unpack(">i", shp[24:28])[0] * 2)
+
+        self._offsets = None
+        if self._shx is not None and len(self._shx) >= 100:
+            index = np.frombuffer(self._shx, ">i4", offset=100,
+                                  count=(len(self._shx) - 100) // 4)
+            self._offsets = index[0::2].astype(np.int64) * 2
+
+        self.fields = []
+        self._records = 0
+        if self._dbf is not None:
+            self._parseTable()
+
+        if self._offsets is not None:
+            self.count = len(self._offsets)
+        elif self._dbf is not None:
+            self.count = self._records
+        else:
+            self.count = sum(1 for offset in self._scan())
+
+    def _parseTable(self):
+        """ reads the dBASE field descriptors """
+
+        dbf = self._dbf
+        self._records, self._headerSize, self._recordSize = \
+            struct.unpack("<IHH", dbf[4:12])
+        pos = 32
+        start = 1
+        while pos + 32 <= self._headerSize and dbf[pos] != 0x0D:
+            name = dbf[pos:pos + 11].split(b"\x00")[0].decode("ascii",
+                                                               "replace")
+            kind = chr(dbf[pos + 11])
+            size, decimals = dbf[pos + 16], dbf[pos + 17]
+            self.fields.append((name, kind, start, size, decimals))
+            start += size
+            pos += 32
+
+    def _scan(self):
+        """ yields the offsets of the records in file order, for shapefiles
+        without an index """
+
+        pos = 100
+        while pos + 8 <= self._end:
+            length = struct.unpack(">i", self._shp[pos + 4:pos + 8])[0] * 2
+            yield pos
+            pos += 8 + length
+
+    def record(self, i):
+        """ returns the attributes of the i th record as a dict """
+
+        if self._dbf is None or i >= self._records:
+            return {}
+        pos = self._headerSize + i * self._recordSize
+        raw = self._dbf[pos:pos + self._recordSize]
+        fields = {}
+        for name, kind, start, size, decimals in self.fields:
+            text = raw[start:start + size].decode("latin-1").strip(" \x00")
+            if kind in "NF":
+                try:
+                    value = float(text) if decimals or "." in text \
+                        else int(text)
+                except ValueError:
+                    value = None
+            elif kind == "L":
+                value = None if text[:1] in ("", "?") else text[:1] in "YyTt"
+            else:
+                value = text
+            fields[name] = value
+        return fields
+
+    def _shape(self, pos, i):
+        """ decodes the record starting at byte pos of the .shp """
+
+        shp = self._shp
+        length = struct.unpack(">i", shp[pos + 4:pos + 8])[0] * 2
+        content = pos + 8
+        kind = struct.unpack("<i", shp[content:content + 4])[0]
+        base = kind % 10 if kind else NULL
+        hasZ = kind in zShapes
+        fields = self.record(i)
+
+        if base == NULL:
+            return Shape(NULL, np.empty((0, 2)), np.zeros(1, np.int32),
+                         fields)
+
+        if base == POINT:
+            dims = 3 if hasZ else 2
+            points = np.frombuffer(shp, "<f8", dims, content + 4)
+            return Shape(base, points.reshape(1, dims).copy(),
+                         np.zeros(1, np.int32), fields)
+
+        if base == MULTIPOINT:
+            n = struct.unpack("<i", shp[content + 36:content + 40])[0]
+            parts = np.zeros(1, np.int32)
+            start = content + 40
+        elif base in (POLYLINE, POLYGON):
+            nParts, n = struct.unpack("<ii", shp[content + 36:content + 44])
+            parts = np.frombuffer(shp, "<i4", nParts, content + 44).copy()
+            start = content + 44 + 4 * nParts
+        else:
+            raise NotImplementedError(
+                "Shape type {0} is not supported in {1}".format(
+                    kind, self.path))
+
+        xy = np.frombuffer(shp, "<f8", 2 * n, start).reshape(n, 2)
+        if hasZ and start + 16 * n + 16 + 8 * n <= content + length:
+            points = np.empty((n, 3))
+            points[:, :2] = xy
+            points[:, 2] = np.frombuffer(shp, "<f8", n, start + 16 * n + 16)
+        else:
+            points = xy.copy()
+        return Shape(base, points, parts.astype(np.int32), fields)
+
+    def shape(self, i):
+        """ returns the i th record, needs the .shx index """
+
+        if self._offsets is None:
+            raise IndexError("{0} has no index".format(self.path))
+        return self._shape(int(self._offsets[i]), i)
+
+    def shapes(self):
+        """ yields the records in file order """
+
+        offsets = self._offsets if self._offsets is not None \
+            else self._scan()
+        for i, pos in enumerate(offsets):
+            yield self._shape(int(pos), i)
+
+
+def readShapes(path):
+    """ reads all records of a shapefile into a list of Shape """
+
+    with ShapeReader(path) as reader:
+        return list(reader)
+
+
+def removeShapefile(path):
+    """ removes the .shp at path and its sidecar files """
+
+    root = os.path.splitext(path)[0]
+    for p in [path] + [root + ext for ext in sidecarExts]:
+        if os.path.exists(p):
+            os.remove(p)
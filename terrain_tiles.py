@@ -0,0 +1,191 @@
+# Tiled, multi-resolution representation of the terrain raster for large
+# study areas.
+
+import bpy
+import numpy as np
+
+
+def gridMesh(name, xs, ys, zs, us, vs):
+    """ creates a quad grid mesh from the column coordinates xs, row
+    coordinates ys, the (rows, cols) heights zs and per vertex uvs """
+
+    rows, cols = zs.shape
+    co = np.empty((rows, cols, 3), np.float32)
+    co[..., 0] = xs[None, :]
+    co[..., 1] = ys[:, None]
+    co[..., 2] = zs
+
+    # counter clockwise quads seen from above (rows go south) #
+    index = np.arange(rows * cols).reshape(rows, cols)
+    quads = np.stack([index[1:, :-1], index[1:, 1:], index[:-1, 1:],
+                      index[:-1, :-1]], axis=-1).reshape(-1, 4)
+    faces = len(quads)
+
+    me = bpy.data.meshes.new(name)
+    me.vertices.add(rows * cols)
+    me.vertices.foreach_set("co", co.ravel())
+    me.loops.add(faces * 4)
+    me.loops.foreach_set("vertex_index", quads.ravel().astype(np.int32))
+    me.polygons.add(faces)
+    me.polygons.foreach_set("loop_start",
+                            np.arange(0, faces * 4, 4, dtype=np.int32))
+    me.polygons.foreach_set("loop_total", np.full(faces, 4, np.int32))
+
+    uv = np.empty((rows, cols, 2), np.float32)
+    uv[..., 0] = us[None, :]
+    uv[..., 1] = vs[:, None]
+    me.uv_textures.new()
+    me.uv_layers[0].data.foreach_set(
+        "uv", uv.reshape(-1, 2)[quads.ravel()].ravel())
+    me.update(calc_edges=True)
+    return me
+
+
+class TerrainTiles:
+    """Splits the terrain raster into chunks of size x size pixels. Every
+    chunk is one object with a mesh per resolution level, level l keeping
+    every 2**l th pixel. The level shown is picked from the distance to the
+    active camera, level l beyond distance * (2**l - 1). Updates only
+    rewrite the chunks overlapping changed pixels"""
+
+    def __init__(self, name="terrain_tile", size=128, levels=3,
+                 distance=250.0):
+
+        self.name = name
+        self.size = size
+        self.levels = levels
+        self.distance = distance
+        self.grid = None
+        self.chunks = []
+        self._centers = np.empty((0, 3))
+        self._shown = np.empty(0, int)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def clear(self):
+        """ removes the chunk objects and their meshes """
+
+        for chunk in self.chunks:
+            obj = chunk["object"]
+            bpy.context.scene.objects.unlink(obj)
+            bpy.data.objects.remove(obj)
+            for me in chunk["meshes"]:
+                me.use_fake_user = False
+                bpy.data.meshes.remove(me)
+        self.chunks = []
+        self.grid = None
+
+    def _heights(self, elev, nodata):
+        """ returns float32 heights with nodata filled by the lowest value """
+
+        z = elev.astype(np.float32)
+        if nodata is not None:
+            z[z == nodata] = np.nan
+        holes = np.isnan(z)
+        if holes.any():
+            z[holes] = np.nanmin(z) if not holes.all() else 0
+        return z
+
+    def _samples(self, start, stop, step):
+        """ pixel indices of a level, always including the chunk borders """
+
+        return np.unique(np.append(np.arange(start, stop + 1, step), stop))
+
+    def build(self, elev, geotransform, nodata, origin, mat=None):
+        """ creates the chunk objects of the passed raster """
+
+        self.clear()
+        z = self._heights(elev, nodata)
+        height, width = z.shape
+        x0, dx, rx, y0, ry, dy = geotransform
+        material = bpy.data.materials.get(mat) if mat else None
+        scene = bpy.context.scene
+
+        # neighbouring chunks share their border pixels #
+        for r0 in range(0, max(height - 1, 1), self.size):
+            for c0 in range(0, max(width - 1, 1), self.size):
+                r1 = min(r0 + self.size, height - 1)
+                c1 = min(c0 + self.size, width - 1)
+                chunk = {"window": (r0, r1, c0, c1), "meshes": [],
+                         "rows": [], "cols": []}
+                for level in range(self.levels):
+                    rows = self._samples(r0, r1, 2 ** level)
+                    cols = self._samples(c0, c1, 2 ** level)
+                    me = gridMesh(
+                        "{0}_{1}_{2}_{3}".format(self.name, r0, c0, level),
+                        x0 + (cols + .5) * dx - origin[0],
+                        y0 + (rows + .5) * dy - origin[1],
+                        z[np.ix_(rows, cols)],
+                        (cols + .5) / width, 1 - (rows + .5) / height)
+                    if material:
+                        me.materials.append(material)
+                    # the levels not shown have no users, kept alive for
+                    # the level switches and the orphan purge #
+                    me.use_fake_user = True
+                    chunk["meshes"].append(me)
+                    chunk["rows"].append(rows)
+                    chunk["cols"].append(cols)
+
+                obj = bpy.data.objects.new(
+                    "{0}_{1}_{2}".format(self.name, r0, c0),
+                    chunk["meshes"][0])
+                scene.objects.link(obj)
+                chunk["object"] = obj
+                self.chunks.append(chunk)
+
+        centers = []
+        for chunk in self.chunks:
+            r0, r1, c0, c1 = chunk["window"]
+            centers.append([x0 + (c0 + c1 + 1) * dx / 2 - origin[0],
+                            y0 + (r0 + r1 + 1) * dy / 2 - origin[1],
+                            z[r0:r1 + 1, c0:c1 + 1].mean()])
+        self._centers = np.array(centers)
+        self._shown = np.zeros(len(self.chunks), int)
+        self.grid = (z.shape, geotransform, origin)
+
+    def update(self, elev, geotransform, nodata, origin, mat=None,
+               dirty=None, tile=32):
+        """ rewrites the heights of the chunks overlapping the set tiles of a
+        raster_io.changedTiles mask, all chunks without one. Rebuilds the
+        chunks when the raster grid changed. Returns the chunks touched """
+
+        if self.grid != (elev.shape, geotransform, origin):
+            self.build(elev, geotransform, nodata, origin, mat)
+            return len(self.chunks)
+
+        z = self._heights(elev, nodata)
+        touched = 0
+        for chunk in self.chunks:
+            r0, r1, c0, c1 = chunk["window"]
+            if (dirty is not None and
+                    not dirty[r0 // tile:r1 // tile + 1,
+                              c0 // tile:c1 // tile + 1].any()):
+                continue
+            for me, rows, cols in zip(chunk["meshes"], chunk["rows"],
+                                      chunk["cols"]):
+                co = np.empty(len(me.vertices) * 3, np.float32)
+                me.vertices.foreach_get("co", co)
+                co[2::3] = z[np.ix_(rows, cols)].ravel()
+                me.vertices.foreach_set("co", co)
+                me.update()
+            touched += 1
+        return touched
+
+    def selectLevels(self, camera):
+        """ shows for each chunk the level matching its distance to the
+        passed camera object. Returns the number of chunks switched """
+
+        if camera is None or not self.chunks:
+            return 0
+        eye = np.array(camera.matrix_world.translation)
+        dist = np.sqrt(((self._centers - eye) ** 2).sum(axis=1))
+        levels = np.floor(np.log2(1 + dist / self.distance)).astype(int)
+        levels = np.clip(levels, 0, self.levels - 1)
+
+        switched = np.flatnonzero(levels != self._shown)
+        for i in switched:
+            chunk = self.chunks[i]
+            chunk["object"].data = chunk["meshes"][levels[i]]
+        self._shown = levels
+        return len(switched)
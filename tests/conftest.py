@@ -0,0 +1,90 @@
+# The modules tested here only need numpy and the standard library. The
+# addon package itself imports bpy, so they are imported as top level
+# modules from the addon folder, or through the addon fixture for the ones
+# using relative imports.
+
+import os
+import sys
+import types
+import importlib
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+addonDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, addonDir)
+
+
+@pytest.fixture
+def addon():
+    """ returns a function importing an addon module as part of a package
+    whose __init__ (and bpy) is never run """
+
+    if "tl_addon" not in sys.modules:
+        package = types.ModuleType("tl_addon")
+        package.__path__ = [addonDir]
+        sys.modules["tl_addon"] = package
+    return lambda name: importlib.import_module("tl_addon." + name)
+
+
+def filterRow(kind, line, prev, bpp):
+    """ applies the PNG filter kind to a row of bytes """
+
+    out = []
+    for i, x in enumerate(line):
+        a = line[i - bpp] if i >= bpp else 0
+        b = prev[i]
+        c = prev[i - bpp] if i >= bpp else 0
+        if kind == 1:
+            x -= a
+        elif kind == 2:
+            x -= b
+        elif kind == 3:
+            x -= (a + b) // 2
+        elif kind == 4:
+            p = a + b - c
+            pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+            x -= a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+        out.append(x & 255)
+    return out
+
+
+@pytest.fixture
+def png():
+    """ returns a function writing a PNG of packed rows of bytes, each row
+    with the filter of filters in turn """
+
+    def write(path, rows, width, color, bits=8, filters=(0,), palette=None,
+              transparency=None):
+
+        rows = np.asarray(rows, np.uint8)
+        channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color]
+        bpp = max(1, channels * bits // 8)
+        prev = [0] * rows.shape[1]
+        data = bytearray()
+        for y, line in enumerate(rows.tolist()):
+            kind = filters[y % len(filters)]
+            data.append(kind)
+            data.extend(filterRow(kind, line, prev, bpp))
+            prev = line
+
+        def chunk(kind, body):
+            return (struct.pack(">I", len(body)) + kind + body +
+                    struct.pack(">I", zlib.crc32(kind + body) & 0xffffffff))
+
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n")
+            f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, len(rows),
+                                               bits, color, 0, 0, 0)))
+            if palette is not None:
+                f.write(chunk(b"PLTE", np.asarray(palette, np.uint8)
+                              .tobytes()))
+            if transparency is not None:
+                f.write(chunk(b"tRNS", bytes(transparency)))
+            f.write(chunk(b"IDAT", zlib.compress(bytes(data))))
+            f.write(chunk(b"IEND", b""))
+        return path
+
+    return write
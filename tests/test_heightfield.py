@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import heightfield
+
+# 10 m pixels, the north west corner at (1000, 5000) #
+geotransform = (1000.0, 10.0, 0.0, 5000.0, 0.0, -10.0)
+
+
+def plane(height=4, width=5):
+    """ z = 100 + 2 * column - 3 * row at the pixel centres """
+
+    row, col = np.mgrid[:height, :width]
+    return (100 + 2 * col - 3 * row).astype(np.float32)
+
+
+def centre(row, col, origin=(0, 0)):
+
+    return (1005 + 10 * col - origin[0], 4995 - 10 * row - origin[1])
+
+
+def testExtent():
+
+    field = heightfield.HeightField(plane(), geotransform, origin=(1000, 4000))
+    assert field.extent() == (0, 960, 50, 1000)
+    assert field.shape == (4, 5)
+
+
+def testPixelCentres():
+
+    field = heightfield.HeightField(plane(), geotransform)
+    for row, col in ((0, 0), (2, 3), (3, 4)):
+        x, y = centre(row, col)
+        assert field.bilinear(x, y) == 100 + 2 * col - 3 * row
+        assert field.nearest(x, y) == 100 + 2 * col - 3 * row
+
+
+def testBilinearBetweenCentres():
+
+    field = heightfield.HeightField(plane(), geotransform)
+    # a quarter of the way east and 4 m south of pixel (1, 1) #
+    x, y = centre(1, 1)
+    z = field.bilinear(x + 2.5, y - 4)
+    assert isinstance(z, float)
+    assert z == pytest.approx(100 + 2 * 1.25 - 3 * 1.4)
+    assert field.nearest(x + 2.5, y - 4) == 100 + 2 - 3
+
+
+def testArrays():
+
+    field = heightfield.HeightField(plane(), geotransform, origin=(1000, 4000))
+    rows = np.array([[0, 1], [2, 3]])
+    x, y = centre(rows, np.full_like(rows, 2), (1000, 4000))
+    z = field.bilinear(x, y)
+    assert z.shape == (2, 2)
+    assert np.allclose(z, 104 - 3 * rows)
+
+
+def testEdgeHalfPixel():
+
+    field = heightfield.HeightField(plane(), geotransform)
+    # between the last centre and the raster edge the heights hold #
+    x, y = centre(0, 4)
+    assert field.bilinear(x + 4, y + 4) == 108
+    assert field.contains(x + 4, y + 4)
+
+
+def testOutsideExtent():
+
+    field = heightfield.HeightField(plane(), geotransform)
+    x = np.array([995.0, 1051.0, 1025.0, 1025.0])
+    y = np.array([4985.0, 4985.0, 5001.0, 4959.0])
+    assert not field.contains(x, y).any()
+    assert np.isnan(field.bilinear(x, y)).all()
+    assert np.isnan(field.nearest(x, y)).all()
+    assert np.isnan(field.bilinear(0, 0))
+    assert np.isnan(field.slope(0, 0))
+
+
+def testNodata():
+
+    elev = plane()
+    elev[1, 1] = -9999
+    field = heightfield.HeightField(elev, geotransform, nodata=-9999)
+    x, y = centre(1, 1)
+    assert np.isnan(field.nearest(x, y))
+    # every cell around the hole needs it #
+    assert np.isnan(field.bilinear(x - 5, y + 5))
+    assert np.isnan(field.bilinear(x + 5, y - 5))
+    assert field.bilinear(*centre(2, 3)) == 100 + 6 - 6
+
+
+def testGradientSlopeNormal():
+
+    field = heightfield.HeightField(plane(), geotransform)
+    x, y = centre(1, 2)
+    dzdx, dzdy = field.gradient(x + 3, y - 2)
+    # 2 m per 10 m column east, 3 m per 10 m row south #
+    assert dzdx == pytest.approx(.2)
+    assert dzdy == pytest.approx(.3)
+    assert field.slope(x, y) == pytest.approx(
+        np.degrees(np.arctan(np.hypot(.2, .3))))
+    normal = field.normal(np.array([x, x + 1]), np.array([y, y]))
+    assert normal.shape == (2, 3)
+    assert np.allclose(normal[0], np.array([-.2, -.3, 1]) /
+                       np.sqrt(1 + .04 + .09))
@@ -0,0 +1,160 @@
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+
+class Image:
+
+    def __init__(self, name, filepath):
+        self.name = name
+        self.filepath = filepath
+        self.users = 0
+        self.use_fake_user = False
+        self.reloads = 0
+
+    def reload(self):
+        self.reloads += 1
+
+
+class Images(list):
+    """ the part of bpy.data.images the cache uses """
+
+    def get(self, name):
+        return next((img for img in self if img.name == name), None)
+
+    def load(self, path):
+        img = Image(os.path.basename(path), path)
+        self.append(img)
+        return img
+
+
+@pytest.fixture
+def images(monkeypatch):
+    """ bpy.data.images of an empty blend file """
+
+    bpy = types.SimpleNamespace(data=types.SimpleNamespace(images=Images()))
+    monkeypatch.setitem(sys.modules, "bpy", bpy)
+    return bpy
+
+
+@pytest.fixture
+def image_cache(addon, images, monkeypatch):
+
+    module = addon("image_cache")
+    monkeypatch.setattr(module, "bpy", images)
+    return module
+
+
+@pytest.fixture
+def texture(tmp_path, png):
+    """ returns a function writing a 64 x 64 RGBA texture of one colour to a
+    new scratch file """
+
+    count = []
+
+    def write(value):
+        count.append(value)
+        rows = np.full((64, 64 * 4), value, np.uint8)
+        return png(str(tmp_path / "texture_{0}.png".format(len(count))),
+                   rows, 64, 6)
+    return write
+
+
+# room for two 64 x 64 RGBA images, in megabytes #
+twoImages = 2.5 * 64 * 64 * 4 / 1024 ** 2
+
+
+def testMissLoadsAndHitReuses(image_cache, images, texture):
+
+    cache = image_cache.ImageCache()
+    first = texture(1)
+    img, cached = cache.image(first, "Raster Tec")
+    assert not cached
+    assert img.use_fake_user
+    assert img.name.startswith("Raster Tec.")
+
+    again = texture(1)
+    img2, cached = cache.image(again, "Raster Tec")
+    assert cached and img2 is img
+    # the cached image keeps reading its own file #
+    assert not os.path.exists(again) and os.path.exists(first)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(images.data.images) == 1
+
+
+def testNewContentReloadsCurrentImage(image_cache, images, texture):
+
+    cache = image_cache.ImageCache()
+    first = texture(1)
+    img, cached = cache.image(first, "Raster Tec")
+    img2, cached = cache.image(texture(2), "Raster Tec")
+    assert img2 is img and not cached
+    assert img.reloads == 1 and cache.replaced == 1
+    assert len(images.data.images) == 1
+    assert not os.path.exists(first)
+
+
+def testRecurringContentKeepsItsImage(image_cache, images, texture):
+
+    cache = image_cache.ImageCache()
+    a, cached = cache.image(texture(1), "Raster Tec")
+    cache.image(texture(1), "Raster Tec")
+    b, cached = cache.image(texture(2), "Raster Tec")
+    assert b is not a
+    assert cache.image(texture(1), "Raster Tec") == (a, True)
+    assert len(images.data.images) == 2
+
+
+def testReloadAfterImageRemoved(image_cache, images, texture):
+
+    cache = image_cache.ImageCache()
+    img, cached = cache.image(texture(1), "Raster Tec")
+    images.data.images.remove(img)
+    img2, cached = cache.image(texture(1), "Raster Tec")
+    assert not cached and img2 is not img
+    assert img2 in images.data.images
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def testLeastRecentlyUsedReloadedOverLimit(image_cache, images, texture):
+
+    cache = image_cache.ImageCache(twoImages)
+    for value in (1, 1, 2, 2):
+        cache.image(texture(value), "Raster Tec")
+    a = images.data.images[0]
+    c, cached = cache.image(texture(3), "Raster Tec")
+    assert c is a and cache.replaced == 1
+    assert len(images.data.images) == 2
+    assert cache.stats()["images"] == 2
+
+
+def testReadDecodesOnce(image_cache, texture):
+
+    cache = image_cache.ImageCache()
+    decoded = []
+
+    def decode(path):
+        decoded.append(path)
+        return np.zeros(4)
+
+    digest, data = cache.read(texture(1), decode)
+    digest2, data2 = cache.read(texture(1), decode)
+    assert digest == digest2 and data2 is data
+    assert len(decoded) == 1
+    assert cache.stats()["hitRate"] == .5
+
+
+def testReadEvictsLeastRecentlyUsed(image_cache, texture):
+
+    cache = image_cache.ImageCache(2.5 * 800 / 1024 ** 2)
+    paths = [texture(value) for value in (1, 2, 3)]
+    decode = lambda path: np.zeros(100)
+    a = cache.read(paths[0], decode)[0]
+    cache.read(paths[1], decode)
+    cache.read(paths[2], decode)
+    assert cache.evicted == 1
+    assert a not in cache._arrays
+    assert len(cache) == 2
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+import image_io
+from conftest import filterRow
+
+
+def pixels(height, width, channels, seed=0):
+
+    rng = np.random.RandomState(seed)
+    return rng.randint(0, 256, (height, width, channels)).astype(np.uint8)
+
+
+@pytest.mark.parametrize("filters", [(0,), (1,), (2,), (3,), (4,),
+                                     (3, 3, 4, 4), (0, 1, 2, 3, 4)])
+@pytest.mark.parametrize("color", [2, 6])
+def testFilters(tmp_path, png, filters, color):
+
+    image = pixels(9, 13, image_io.colorChannels[color])
+    path = png(str(tmp_path / "patches.png"), image.reshape(9, -1), 13,
+               color, filters=filters)
+    assert np.array_equal(image_io.readPNG(path), image)
+
+
+def testFilterRunInBands():
+
+    image = pixels(7, 5, 3, seed=1).reshape(7, -1)
+    kinds = np.array([3, 4, 4, 3, 4, 3, 3])
+    prev = pixels(1, 5, 3, seed=2).reshape(-1)
+    lines, before = [], prev.tolist()
+    for kind, line in zip(kinds, image.tolist()):
+        lines.append(filterRow(kind, line, before, 3))
+        before = line
+    lines = np.array(lines, np.uint8)
+    for band in (2, 3, 512):
+        out = image_io._unfilterRun(lines, prev, kinds, 3, band)
+        assert np.array_equal(out, image)
+
+
+def testGrey(tmp_path, png):
+
+    image = pixels(6, 7, 1)
+    path = png(str(tmp_path / "patches.png"), image[..., 0], 7, 0,
+               filters=(4,))
+    assert np.array_equal(image_io.readPNG(path), image)
+
+    path = png(str(tmp_path / "patches.png"), image.reshape(6, -1), 7, 0)
+    assert image_io.readPNG(path).shape == (6, 7, 1)
+
+
+@pytest.mark.parametrize("bits", [1, 2, 4])
+def testSubByteGrey(tmp_path, png, bits):
+
+    levels = 1 << bits
+    values = np.arange(6 * 11).reshape(6, 11) % levels
+    packed = np.packbits(np.unpackbits(values.astype(np.uint8)[..., None],
+                                       axis=2)[..., 8 - bits:]
+                         .reshape(6, -1), axis=1)
+    path = png(str(tmp_path / "patches.png"), packed, 11, 0, bits,
+               filters=(1, 2))
+    image = image_io.readPNG(path)
+    assert image.shape == (6, 11, 1)
+    # grey levels are scaled to the full byte #
+    assert np.array_equal(image[..., 0], values * (255 // (levels - 1)))
+
+
+def testGreyAlpha(tmp_path, png):
+
+    image = pixels(5, 4, 2)
+    path = png(str(tmp_path / "patches.png"), image.reshape(5, -1), 4, 4,
+               filters=(2, 3))
+    assert np.array_equal(image_io.readPNG(path), image)
+
+
+def testSixteenBit(tmp_path, png):
+
+    rng = np.random.RandomState(3)
+    image = rng.randint(0, 65536, (4, 6, 3)).astype(np.uint16)
+    rows = image.astype(">u2").view(np.uint8).reshape(4, -1)
+    path = png(str(tmp_path / "patches.png"), rows, 6, 2, 16,
+               filters=(4, 1))
+    out = image_io.readPNG(path)
+    assert out.dtype == np.uint16
+    assert np.array_equal(out, image)
+
+
+palette = [(0, 0, 0), (255, 0, 0), (0, 128, 0), (10, 20, 30)]
+
+
+def testPalette(tmp_path, png):
+
+    index = np.array([[0, 1, 2, 3], [3, 2, 1, 0]], np.uint8)
+    path = png(str(tmp_path / "patches.png"), index, 4, 3, palette=palette)
+    image = image_io.readPNG(path)
+    assert image.shape == (2, 4, 3)
+    assert np.array_equal(image, np.array(palette, np.uint8)[index])
+
+
+def testPaletteTransparency(tmp_path, png):
+
+    # two bit indices, four to a byte #
+    index = np.array([[0, 1, 2, 3], [3, 3, 0, 1]], np.uint8)
+    packed = (index[:, 0::4] << 6 | index[:, 1::4] << 4 |
+              index[:, 2::4] << 2 | index[:, 3::4])
+    path = png(str(tmp_path / "patches.png"), packed, 4, 3, 2,
+               palette=palette, transparency=[0, 128])
+    image = image_io.readPNG(path)
+    assert image.shape == (2, 4, 4)
+    assert np.array_equal(image[..., :3], np.array(palette, np.uint8)[index])
+    # entries past the tRNS chunk are opaque #
+    assert np.array_equal(image[..., 3], np.array([0, 128, 255, 255],
+                                                  np.uint8)[index])
+
+
+def testPngSize(tmp_path, png):
+
+    path = png(str(tmp_path / "patches.png"), pixels(3, 5, 3).reshape(3, -1),
+               5, 2)
+    assert image_io.pngSize(path) == (5, 3)
+    other = tmp_path / "terrain.tif"
+    other.write_bytes(b"II*\x00" + b"\x00" * 28)
+    assert image_io.pngSize(str(other)) is None
+
+
+def testNotPng(tmp_path):
+
+    path = tmp_path / "patches.png"
+    path.write_bytes(b"II*\x00" + b"\x00" * 28)
+    with pytest.raises(ValueError):
+        image_io.readPNG(str(path))
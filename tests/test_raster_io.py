@@ -0,0 +1,197 @@
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+import raster_io
+
+geotransform = (1000.0, 2.0, 0.0, 5000.0, 0.0, -2.0)
+
+
+def predict(block, dtype, predictor):
+    """ returns the bytes of a (rows, cols) block with the predictor """
+
+    if predictor == 2:
+        diff = block.astype(dtype).copy()
+        diff[:, 1:] = block[:, 1:] - block[:, :-1]
+        return diff.astype(dtype).tobytes()
+    if predictor == 3:
+        nbytes = dtype.itemsize
+        rows = block.astype(dtype.newbyteorder(">")).view(np.uint8)
+        rows = rows.reshape(len(block), -1, nbytes).transpose(0, 2, 1)
+        rows = rows.reshape(len(block), -1)
+        diff = rows.copy()
+        diff[:, 1:] = rows[:, 1:] - rows[:, :-1]
+        return diff.tobytes()
+    return block.astype(dtype).tobytes()
+
+
+def writeTiff(path, data, rowsPerStrip=None, tile=None, compress=False,
+              predictor=1, nodata=None, order="<"):
+    """ writes a single band TIFF in strips of rowsPerStrip rows or in
+    tile x tile tiles, georeferenced by pixel scale and tie point """
+
+    dtype = data.dtype.newbyteorder(order)
+    height, width = data.shape
+    blocks = []
+    if tile:
+        for r in range(0, height, tile):
+            for c in range(0, width, tile):
+                block = np.zeros((tile, tile), data.dtype)
+                part = data[r:r + tile, c:c + tile]
+                block[:len(part), :part.shape[1]] = part
+                blocks.append(block)
+    else:
+        rowsPerStrip = rowsPerStrip or height
+        blocks = [data[r:r + rowsPerStrip]
+                  for r in range(0, height, rowsPerStrip)]
+    blocks = [predict(b, dtype, predictor) for b in blocks]
+    if compress:
+        blocks = [zlib.compress(b) for b in blocks]
+
+    fmt = {"u": 1, "i": 2, "f": 3}[data.dtype.kind]
+    x0, dx, rx, y0, ry, dy = geotransform
+    tags = [(256, 4, [width]), (257, 4, [height]),
+            (258, 3, [data.dtype.itemsize * 8]),
+            (259, 3, [8 if compress else 1]), (262, 3, [1]),
+            (277, 3, [1]), (317, 3, [predictor]), (339, 3, [fmt]),
+            (33550, 12, [dx, -dy, 0.0]),
+            (33922, 12, [0.0, 0.0, 0.0, x0, y0, 0.0])]
+    offsets, counts = (324, 325) if tile else (273, 279)
+    tags += [(offsets, 4, [0] * len(blocks)),
+             (counts, 4, [len(b) for b in blocks])]
+    if tile:
+        tags += [(322, 3, [tile]), (323, 3, [tile])]
+    else:
+        tags += [(278, 4, [rowsPerStrip])]
+    if nodata is not None:
+        tags.append((42113, 2, repr(float(nodata)).encode("ascii") +
+                     b"\x00"))
+    tags.sort()
+    codes = {3: "H", 4: "I", 12: "d"}
+
+    def pack(kind, values):
+        if kind == 2:
+            return values
+        return struct.pack(order + codes[kind] * len(values), *values)
+
+    # payloads follow the IFD, the blocks follow the payloads #
+    extra = 8 + 2 + 12 * len(tags) + 4
+    payload = extra + sum(len(pack(k, v)) + len(pack(k, v)) % 2
+                          for t, k, v in tags if len(pack(k, v)) > 4)
+    start = payload
+    for i, (tag, kind, values) in enumerate(tags):
+        if tag == offsets:
+            positions = []
+            for b in blocks:
+                positions.append(start)
+                start += len(b)
+            tags[i] = (tag, kind, positions)
+
+    ifd, blobs = [struct.pack(order + "H", len(tags))], []
+    for tag, kind, values in tags:
+        raw = pack(kind, values)
+        if len(raw) > 4:
+            ifd.append(struct.pack(order + "HHII", tag, kind, len(values),
+                                   extra))
+            raw += b"\x00" * (len(raw) % 2)
+            blobs.append(raw)
+            extra += len(raw)
+        else:
+            ifd.append(struct.pack(order + "HHI", tag, kind, len(values)) +
+                       raw.ljust(4, b"\x00"))
+    ifd.append(struct.pack(order + "I", 0))
+
+    with open(path, "wb") as f:
+        f.write((b"II" if order == "<" else b"MM") +
+                struct.pack(order + "HI", 42, 8))
+        f.write(b"".join(ifd) + b"".join(blobs) + b"".join(blocks))
+
+
+def elevation(height=37, width=45, dtype=np.float32):
+
+    rng = np.random.RandomState(0)
+    return (100 + 50 * rng.random_sample((height, width))).astype(dtype)
+
+
+@pytest.mark.parametrize("rowsPerStrip", [1, 8, 37])
+def testStrips(tmp_path, rowsPerStrip):
+
+    data = elevation()
+    path = str(tmp_path / "terrain.tif")
+    writeTiff(path, data, rowsPerStrip, nodata=-9999)
+    elev, gt, nodata = raster_io.readRaster(path)
+    assert np.array_equal(elev, data)
+    assert gt == geotransform
+    assert nodata == -9999
+
+
+@pytest.mark.parametrize("compress", [False, True])
+@pytest.mark.parametrize("tile", [None, 16])
+def testPredictors(tmp_path, compress, tile):
+
+    path = str(tmp_path / "terrain.tif")
+    ints = (elevation() * 10).astype(np.int16)
+    writeTiff(path, ints, 5, tile, compress, predictor=2)
+    assert np.array_equal(raster_io.readRaster(path)[0], ints)
+
+    floats = elevation()
+    writeTiff(path, floats, 5, tile, compress, predictor=3)
+    assert np.array_equal(raster_io.readRaster(path)[0], floats)
+
+
+def testBigEndianTiles(tmp_path):
+
+    data = elevation(dtype=np.float64)
+    path = str(tmp_path / "terrain.tif")
+    writeTiff(path, data, tile=16, compress=True, predictor=3, order=">")
+    elev, gt, nodata = raster_io.readRaster(path)
+    assert elev.dtype == np.float64
+    assert np.array_equal(elev, data)
+
+
+def testWindow(tmp_path):
+
+    data = elevation()
+    path = str(tmp_path / "terrain.tif")
+    writeTiff(path, data, tile=16)
+    elev, gt, nodata = raster_io.readRaster(path, (10, 20, 20, 25))
+    assert np.array_equal(elev, data[10:30, 20:45])
+    assert gt == (1040.0, 2.0, 0.0, 4980.0, 0.0, -2.0)
+    with pytest.raises(ValueError):
+        raster_io.readRaster(path, (30, 0, 10, 10))
+
+
+def testNotTiff(tmp_path):
+
+    path = tmp_path / "terrain.tif"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+    with pytest.raises(ValueError):
+        raster_io.readRaster(str(path))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def testTruncated(tmp_path, compress):
+
+    path = tmp_path / "terrain.tif"
+    writeTiff(str(path), elevation(), 8, compress=compress)
+    whole = path.read_bytes()
+    # in the header, in the IFD and in the last strip #
+    for size in (6, 40, len(whole) - 10):
+        path.write_bytes(whole[:size])
+        with pytest.raises(ValueError):
+            raster_io.readRaster(str(path))
+
+
+def testCorruptBlock(tmp_path):
+
+    path = tmp_path / "terrain.tif"
+    writeTiff(str(path), elevation(), 37, compress=True)
+    whole = bytearray(path.read_bytes())
+    # the first bytes of the only strip, its zlib header #
+    start = len(whole) - len(zlib.compress(elevation().tobytes()))
+    whole[start:start + 2] = b"\xff\xff"
+    path.write_bytes(bytes(whole))
+    with pytest.raises(ValueError):
+        raster_io.readRaster(str(path))
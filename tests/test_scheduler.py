@@ -0,0 +1,100 @@
+from watcher import Update
+from scheduler import UpdateScheduler
+
+
+def update(seq, layer, name=None):
+    return Update(seq, layer, name or layer, "/watch/" + (name or layer), 0)
+
+
+def run(scheduler, budget=None):
+    """ runs a tick and returns the layers applied, in order """
+
+    return [u.layer for u, result in scheduler.run(lambda u: u.seq, budget)]
+
+
+def testPriorityOrder():
+
+    scheduler = UpdateScheduler()
+    for seq, layer in enumerate(["patch", "water", "trail", "terrain"], 1):
+        scheduler.push(update(seq, layer))
+    assert run(scheduler) == ["terrain", "water", "trail", "patch"]
+    assert len(scheduler) == 0
+
+
+def testResults():
+
+    scheduler = UpdateScheduler()
+    scheduler.push(update(7, "terrain"))
+    (done, result), = scheduler.run(lambda u: "TERRAIN")
+    assert (done.seq, result) == (7, "TERRAIN")
+
+
+def testNewestVersionOnly():
+
+    dropped = []
+    scheduler = UpdateScheduler(discard=dropped.append)
+    scheduler.push(update(1, "terrain"))
+    scheduler.push(update(2, "terrain"))
+    scheduler.push(update(3, "patch", "patch_class1.png"))
+    scheduler.push(update(4, "patch", "patch_class2.png"))
+    assert scheduler.skipped == 1
+    assert [u.seq for u in dropped] == [1]
+    assert [u.seq for u, r in scheduler.run(lambda u: None)] == [2, 3, 4]
+
+
+def testBudget():
+
+    scheduler = UpdateScheduler(budget=40)
+    # average costs in milliseconds of earlier runs #
+    scheduler.cost = {"terrain": 30, "water": 50, "patch": 1}
+    for seq, layer in enumerate(["terrain", "water", "patch"], 1):
+        scheduler.push(update(seq, layer))
+
+    # water would overrun the budget, it and what follows carry over #
+    assert run(scheduler) == ["terrain"]
+    assert [layer for layer, count in scheduler.backlog()] == ["water",
+                                                               "patch"]
+    # the first update of a tick always runs, the cheap patch still fits
+    # in what is left #
+    assert run(scheduler) == ["water", "patch"]
+
+
+def testLargerBudget():
+
+    scheduler = UpdateScheduler(budget=40)
+    scheduler.cost = {"terrain": 30, "water": 50, "patch": 1}
+    for seq, layer in enumerate(["terrain", "water", "patch"], 1):
+        scheduler.push(update(seq, layer))
+    assert run(scheduler, 100) == ["terrain", "water", "patch"]
+
+
+def testOverdueFirst():
+
+    scheduler = UpdateScheduler(budget=10, maxWait=2)
+    scheduler.cost = {"terrain": 100, "water": 100, "patch": 100}
+    scheduler.push(update(1, "patch"))
+    scheduler.push(update(2, "terrain"))
+    assert run(scheduler) == ["terrain"]
+
+    # a new terrain every tick does not starve the patch for ever #
+    scheduler.push(update(3, "terrain"))
+    assert run(scheduler) == ["terrain"]
+    scheduler.push(update(4, "terrain"))
+    assert run(scheduler) == ["patch"]
+    assert run(scheduler) == ["terrain"]
+
+
+def testOverdueByPriority():
+
+    scheduler = UpdateScheduler(budget=10, maxWait=1)
+    scheduler.cost = {"terrain": 100, "water": 100, "patch": 100}
+    scheduler.push(update(1, "patch"))
+    scheduler.push(update(2, "water"))
+    scheduler.push(update(3, "terrain"))
+    assert run(scheduler) == ["terrain"]
+    # the overdue water goes before the new terrain #
+    scheduler.push(update(4, "terrain"))
+    assert run(scheduler) == ["water"]
+    # both overdue now, by priority #
+    assert run(scheduler) == ["terrain"]
+    assert run(scheduler) == ["patch"]
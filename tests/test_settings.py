@@ -0,0 +1,123 @@
+import os
+import json
+import time
+
+import pytest
+
+import settings
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    """ a settings file of its own, the module store is left alone """
+
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({"timer": 0.1, "folder": "/tmp/watch"}))
+    return path
+
+
+@pytest.fixture
+def replaced(monkeypatch):
+    """ the paths written through os.replace, in order """
+
+    paths = []
+    replace = os.replace
+
+    def record(src, dst):
+        paths.append(dst)
+        replace(src, dst)
+    monkeypatch.setattr(settings.os, "replace", record)
+    return paths
+
+
+def wait(condition, timeout=2.0):
+
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(.01)
+    return condition()
+
+
+def testServedFromMemory(cfg):
+
+    store = settings.SettingsStore(str(cfg))
+    assert store.value("timer") == 0.1
+    assert store.value("missing", 3) == 3
+    values = store.get()
+    values["timer"] = 5
+    assert store.value("timer") == 0.1
+
+
+def testReloadWhenFileChanges(cfg):
+
+    store = settings.SettingsStore(str(cfg))
+    assert store.value("folder") == "/tmp/watch"
+    cfg.write_text(json.dumps({"timer": 0.1, "folder": "/tmp/lab/watch"}))
+    assert store.value("folder") == "/tmp/lab/watch"
+
+
+def testUpdatesWrittenOnceAfterDelay(cfg, replaced):
+
+    store = settings.SettingsStore(str(cfg), delay=.2)
+    for timer in (.2, .3, .4):
+        store.update({"timer": timer})
+    assert store.value("timer") == .4
+    assert json.loads(cfg.read_text())["timer"] == 0.1
+    assert wait(lambda: replaced)
+    time.sleep(.3)
+    assert replaced == [str(cfg)]
+    assert json.loads(cfg.read_text()) == {"timer": .4,
+                                           "folder": "/tmp/watch"}
+
+
+def testUnchangedValuesNotWritten(cfg, replaced):
+
+    store = settings.SettingsStore(str(cfg), delay=0)
+    store.update({"timer": 0.1})
+    store.flush()
+    assert replaced == []
+
+
+def testFlushWritesAtOnce(cfg, replaced, tmp_path):
+
+    store = settings.SettingsStore(str(cfg), delay=60)
+    store.update({"timer": .5})
+    store.flush()
+    assert replaced == [str(cfg)]
+    assert json.loads(cfg.read_text())["timer"] == .5
+    assert os.listdir(str(tmp_path)) == ["settings.json"]
+    # nothing left to write #
+    store.flush()
+    assert len(replaced) == 1
+
+
+def testInterruptedWriteKeepsFile(cfg, monkeypatch, tmp_path):
+
+    store = settings.SettingsStore(str(cfg), delay=60)
+    store.update({"timer": .5})
+    before = cfg.read_text()
+
+    def fail(*args, **kw):
+        raise IOError("disk full")
+    monkeypatch.setattr(settings.json, "dump", fail)
+    with pytest.raises(IOError):
+        store.flush()
+    assert cfg.read_text() == before
+    monkeypatch.undo()
+
+    # the change is still pending and written next time #
+    store.flush()
+    assert json.loads(cfg.read_text())["timer"] == .5
+    assert not os.path.exists(str(cfg) + ".tmp")
+
+
+def testPendingSurvivesReload(cfg):
+
+    store = settings.SettingsStore(str(cfg), delay=60)
+    store.update({"timer": .5})
+    cfg.write_text(json.dumps({"timer": 0.1, "folder": "/tmp/lab/watch",
+                               "budget": 8}))
+    assert store.get() == {"timer": .5, "folder": "/tmp/lab/watch",
+                           "budget": 8}
+    store.flush()
+    assert json.loads(cfg.read_text())["budget"] == 8
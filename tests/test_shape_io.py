@@ -0,0 +1,159 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import shape_io
+
+
+def pointRecord(x, y, z=None):
+
+    if z is None:
+        return struct.pack("<i2d", shape_io.POINT, x, y)
+    return struct.pack("<i3d2d", 11, x, y, z, 0, 0)
+
+
+def lineRecord(parts, z=False):
+    """ a polyline, or a polylineZ, record of the (n, 2|3) parts """
+
+    points = np.concatenate(parts)
+    box = points[:, :2].min(axis=0).tolist() + \
+        points[:, :2].max(axis=0).tolist()
+    starts = np.cumsum([0] + [len(p) for p in parts[:-1]])
+    record = struct.pack("<i4d2i", 13 if z else shape_io.POLYLINE,
+                         *(box + [len(parts), len(points)]))
+    record += struct.pack("<{0}i".format(len(parts)), *starts)
+    record += np.ascontiguousarray(points[:, :2], "<f8").tobytes()
+    if z:
+        record += struct.pack("<2d", points[:, 2].min(), points[:, 2].max())
+        record += np.ascontiguousarray(points[:, 2], "<f8").tobytes()
+    return record
+
+
+def writeShapefile(path, shapeType, records, fields=(), rows=(),
+                   index=True):
+    """ writes the .shp of the records, its .shx unless index is False
+    and a .dbf of (name, kind, size, decimals) fields when given """
+
+    root = os.path.splitext(path)[0]
+
+    def header(length):
+        return (struct.pack(">i20xi", 9994, length // 2) +
+                struct.pack("<ii4d4d", 1000, shapeType, 0, 0, 1, 1,
+                            0, 0, 0, 0))
+
+    body, offsets = [], []
+    offset = 100
+    for number, content in enumerate(records, 1):
+        offsets.append(struct.pack(">ii", offset // 2, len(content) // 2))
+        body.append(struct.pack(">ii", number, len(content) // 2) + content)
+        offset += 8 + len(content)
+    with open(path, "wb") as f:
+        f.write(header(offset) + b"".join(body))
+    if index:
+        with open(root + ".shx", "wb") as f:
+            f.write(header(100 + 8 * len(records)) + b"".join(offsets))
+
+    if fields:
+        size = 1 + sum(f[2] for f in fields)
+        with open(root + ".dbf", "wb") as f:
+            f.write(struct.pack("<B3BIHH20x", 3, 120, 1, 1, len(rows),
+                                32 + 32 * len(fields) + 1, size))
+            for name, kind, width, decimals in fields:
+                f.write(struct.pack("<11sc4xBB14x", name.encode("ascii"),
+                                    kind.encode("ascii"), width, decimals))
+            f.write(b"\x0d")
+            for row in rows:
+                f.write(b" ")
+                for (name, kind, width, decimals), value in zip(fields, row):
+                    text = value.ljust(width) if kind == "C" \
+                        else value.rjust(width)
+                    f.write(text.encode("latin-1"))
+            f.write(b"\x1a")
+
+
+def testPolylines(tmp_path):
+
+    path = str(tmp_path / "trail.shp")
+    first = [np.array([[0, 0], [10, 0], [10, 5.5]])]
+    second = [np.array([[1, 1], [2, 2]]), np.array([[5, 5], [6, 7], [8, 9]])]
+    writeShapefile(path, shape_io.POLYLINE,
+                   [lineRecord(first), lineRecord(second)])
+
+    shapes = shape_io.readShapes(path)
+    assert [s.type for s in shapes] == [shape_io.POLYLINE] * 2
+    assert np.array_equal(shapes[0].points, first[0])
+    lines = shapes[1].lines()
+    assert len(lines) == 2
+    assert np.array_equal(lines[1], second[1])
+
+
+def testPolylineZ(tmp_path):
+
+    path = str(tmp_path / "trail.shp")
+    line = np.array([[0, 0, 100], [3, 4, 101.5]])
+    writeShapefile(path, 13, [lineRecord([line], z=True)])
+    shape, = shape_io.readShapes(path)
+    assert shape.type == shape_io.POLYLINE
+    assert np.array_equal(shape.points, line)
+
+
+@pytest.mark.parametrize("index", [True, False])
+def testPoints(tmp_path, index):
+
+    path = str(tmp_path / "vantage.shp")
+    writeShapefile(path, shape_io.POINT,
+                   [pointRecord(1.5, 2.5), pointRecord(3, 4)], index=index)
+    with shape_io.ShapeReader(path) as reader:
+        assert len(reader) == 2
+        points = [s.points for s in reader]
+        if index:
+            assert np.array_equal(reader.shape(1).points, [[3, 4]])
+        else:
+            with pytest.raises(IndexError):
+                reader.shape(1)
+    assert np.array_equal(points[0], [[1.5, 2.5]])
+
+
+def testPointZ(tmp_path):
+
+    path = str(tmp_path / "vantage.shp")
+    writeShapefile(path, 11, [pointRecord(1, 2, 30)])
+    shape, = shape_io.readShapes(path)
+    assert np.array_equal(shape.points, [[1, 2, 30]])
+
+
+def testAttributes(tmp_path):
+
+    path = str(tmp_path / "vantage.shp")
+    fields = [("name", "C", 8, 0), ("count", "N", 5, 0),
+              ("height", "N", 8, 2), ("lit", "L", 1, 0)]
+    rows = [("tower", "12", "4.50", "T"), ("bench", "", "-1.25", "?")]
+    writeShapefile(path, shape_io.POINT,
+                   [pointRecord(0, 0), pointRecord(1, 1)], fields, rows)
+
+    first, second = shape_io.readShapes(path)
+    assert first.fields == {"name": "tower", "count": 12, "height": 4.5,
+                            "lit": True}
+    assert second.fields == {"name": "bench", "count": None,
+                             "height": -1.25, "lit": None}
+
+
+def testNotShapefile(tmp_path):
+
+    path = tmp_path / "trail.shp"
+    path.write_bytes(b"\x00" * 120)
+    with pytest.raises(ValueError):
+        shape_io.readShapes(str(path))
+
+
+def testRemoveShapefile(tmp_path):
+
+    path = str(tmp_path / "trail.shp")
+    writeShapefile(path, shape_io.POINT, [pointRecord(0, 0)],
+                   [("id", "N", 4, 0)], [("1",)])
+    keep = tmp_path / "trail.tif"
+    keep.write_bytes(b"")
+    shape_io.removeShapefile(path)
+    assert os.listdir(str(tmp_path)) == ["trail.tif"]
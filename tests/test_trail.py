@@ -0,0 +1,74 @@
+import sys
+import types
+import importlib
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def trail(monkeypatch):
+    """ the trail module, its geometry functions do not use bpy """
+
+    monkeypatch.setitem(sys.modules, "bpy", types.ModuleType("bpy"))
+    return importlib.import_module("trail")
+
+
+def testResample(trail):
+
+    xy = [(0, 0), (10, 0), (10, 5)]
+    points = trail.resample(xy, 2.0)
+    assert np.array_equal(points[0], xy[0])
+    assert np.array_equal(points[-1], xy[-1])
+    step = np.sqrt((np.diff(points, axis=0) ** 2).sum(axis=1))
+    # evenly spaced, at most spacing apart, along the path length #
+    assert len(points) == 9
+    assert np.allclose(step[:5], 15 / 8)
+
+
+def testResampleKeepsHeights(trail):
+
+    points = trail.resample([(0, 0, 100), (4, 0, 104)], 1.0)
+    assert len(points) == 7
+    assert np.allclose(points[:, 2], 100 + points[:, 0])
+
+
+def testResampleSinglePoint(trail):
+
+    assert np.array_equal(trail.resample([(3, 4), (3, 4)]), [[3, 4]])
+
+
+def testSmoothPathKeepsEnds(trail):
+
+    values = np.array([0, 10, 0, 10, 0, 10], np.float64)
+    smooth = trail.smoothPath(values, .5, 8)
+    assert smooth[0] == 0 and smooth[-1] == 10
+    assert np.ptp(smooth[1:-1]) < np.ptp(values[1:-1])
+    # the input is left alone #
+    assert values[1] == 10
+    assert np.allclose(trail.smoothPath(np.arange(6.0)), np.arange(6.0))
+
+
+def testFillGaps(trail):
+
+    values = np.array([np.nan, 1, np.nan, np.nan, 4, np.nan])
+    assert np.allclose(trail.fillGaps(values), [1, 1, 2, 3, 4, 4])
+    assert trail.fillGaps(np.full(3, np.nan)) is None
+
+
+@pytest.mark.parametrize("closed", [True, False])
+def testSweep(trail, closed):
+
+    path = np.array([(0, 0, 10), (1, 0, 11), (2, 0, 12)], np.float64)
+    profile = np.array(trail.boardProfile)
+    co, quads = trail.sweep(path, profile, closed)
+    n, m = len(path), len(profile)
+    assert co.shape == (n * m, 3)
+    assert quads.shape == ((n - 1) * (m if closed else m - 1), 4)
+    assert quads.max() < n * m
+
+    rings = co.reshape(n, m, 3)
+    # upright across the path heading +x, lateral to the right (-y) #
+    assert np.allclose(rings[:, :, 0], path[:, None, 0])
+    assert np.allclose(rings[1, :, 1], -profile[:, 0])
+    assert np.allclose(rings[1, :, 2], 11 + profile[:, 1])
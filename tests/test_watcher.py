@@ -0,0 +1,180 @@
+import os
+
+import watcher
+from watcher import ChangeEvent, Handoff, CLOSED, MOVED, DELETED
+
+
+def write(folder, name, data=b"x"):
+    """ writes a file the way the producer does: under a temporary name,
+    renamed into place """
+
+    path = os.path.join(folder, name)
+    temp = os.path.join(folder, "." + name + ".part")
+    with open(temp, "wb") as f:
+        f.write(data)
+    os.replace(temp, path)
+    return path
+
+
+def event(kind, folder, name, layer="terrain", time=0.0):
+    return ChangeEvent(kind, layer, name, os.path.join(folder, name), time)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def testSettle(tmp_path):
+
+    folder = str(tmp_path)
+    write(folder, "terrain.tif")
+    handoff = Handoff(settle=1.0)
+    assert handoff.collect([event(CLOSED, folder, "terrain.tif")], 10) == []
+    assert handoff.collect(now=10.5) == []
+    assert len(handoff) == 1
+
+    update, = handoff.collect(now=11.0)
+    assert (update.seq, update.layer, update.name) == (1, "terrain",
+                                                      "terrain.tif")
+    assert len(handoff) == 0
+
+
+def testChangedFileSettlesAgain(tmp_path):
+
+    folder = str(tmp_path)
+    path = write(folder, "terrain.tif")
+    handoff = Handoff(settle=1.0)
+    handoff.collect([event(CLOSED, folder, "terrain.tif")], 10)
+    with open(path, "ab") as f:
+        f.write(b"more")
+    assert handoff.collect(now=10.9) == []
+    assert handoff.collect(now=11.5) == []
+    assert len(handoff.collect(now=12.0)) == 1
+
+
+def testMarker(tmp_path):
+
+    folder = str(tmp_path)
+    path = write(folder, "terrain.tif")
+    handoff = Handoff(settle=1.0, requireMarker=True)
+    assert handoff.collect([event(CLOSED, folder, "terrain.tif")], 10) == []
+    assert handoff.collect(now=100) == []
+
+    write(folder, "terrain.tif" + Handoff.markerExt)
+    assert len(handoff.collect(now=100)) == 1
+    assert not os.path.exists(path + Handoff.markerExt)
+
+
+def testRenamedFileIsComplete(tmp_path):
+
+    folder = str(tmp_path)
+    write(folder, "terrain.tif")
+    handoff = Handoff(settle=1.0)
+    assert len(handoff.collect([event(MOVED, folder, "terrain.tif")],
+                               10)) == 1
+
+
+def testCoalescing(tmp_path):
+
+    folder = str(tmp_path)
+    write(folder, "terrain.tif", b"old")
+    events = [event(MOVED, folder, "terrain.tif")]
+    write(folder, "terrain.tif", b"new")
+    events.append(event(MOVED, folder, "terrain.tif"))
+    events.append(event(MOVED, folder, "water.tif", "water"))
+    write(folder, "water.tif")
+
+    handoff = Handoff()
+    updates = handoff.collect(events, 10)
+    assert sorted(u.name for u in updates) == ["terrain.tif", "water.tif"]
+    assert handoff.skipped == 1
+    terrain, = [u for u in updates if u.layer == "terrain"]
+    assert read(terrain.path) == b"new"
+
+
+def testDeletedBeforeHandoff(tmp_path):
+
+    folder = str(tmp_path)
+    write(folder, "terrain.tif")
+    handoff = Handoff(settle=1.0)
+    handoff.collect([event(CLOSED, folder, "terrain.tif")], 10)
+    os.remove(os.path.join(folder, "terrain.tif"))
+    assert handoff.collect([event(DELETED, folder, "terrain.tif")],
+                           20) == []
+    assert len(handoff) == 0
+
+
+def testCompanions(tmp_path):
+
+    folder = str(tmp_path)
+    handoff = Handoff(companions={".shp": (".shx", ".dbf")})
+    write(folder, "trail.shx")
+    write(folder, "trail.shp")
+    shp = event(MOVED, folder, "trail.shp", "trail")
+    assert handoff.collect([shp], 10) == []
+
+    write(folder, "trail.dbf")
+    update, = handoff.collect(now=10)
+    claimed = os.path.dirname(update.path)
+    assert sorted(os.listdir(claimed)) == ["trail.dbf", "trail.shp",
+                                           "trail.shx"]
+    assert os.listdir(folder) == [watcher.claimFolder]
+
+
+def testClaimAndRelease(tmp_path):
+
+    folder = str(tmp_path)
+    write(folder, "terrain.tif", b"first")
+    update, = Handoff().collect([event(MOVED, folder, "terrain.tif")], 10)
+
+    # claimed under its own name, out of the watched folder #
+    assert os.path.basename(update.path) == "terrain.tif"
+    assert os.path.dirname(os.path.dirname(update.path)) == os.path.join(
+        folder, watcher.claimFolder)
+    assert read(update.path) == b"first"
+    assert not os.path.exists(os.path.join(folder, "terrain.tif"))
+
+    watcher.release(update)
+    assert os.listdir(os.path.join(folder, watcher.claimFolder)) == []
+
+
+def testReleaseLeavesUnclaimedFiles(tmp_path):
+
+    path = write(str(tmp_path), "terrain.tif")
+    watcher.release(watcher.Update(1, "terrain", "terrain.tif", path, 0))
+    assert os.path.exists(path)
+
+
+def testNewerVersionSurvivesHandler(tmp_path):
+    """ a version written while the previous one is being applied is not
+    removed by its handler and is handed off next """
+
+    folder = str(tmp_path)
+    handoff = Handoff()
+    write(folder, "terrain.tif", b"first")
+    first, = handoff.collect([event(MOVED, folder, "terrain.tif")], 10)
+
+    # the producer writes again before the handler is done #
+    write(folder, "terrain.tif", b"second")
+    # the handler removes its file, then the claim is released #
+    os.remove(first.path)
+    watcher.release(first)
+    assert read(os.path.join(folder, "terrain.tif")) == b"second"
+
+    # moving the first version out was seen as a deletion, before the
+    # second version arrived #
+    second, = handoff.collect([event(DELETED, folder, "terrain.tif"),
+                               event(MOVED, folder, "terrain.tif")], 11)
+    assert second.seq == 2
+    assert read(second.path) == b"second"
+    assert second.path != first.path
+
+
+def testClaimOfVanishedFile(tmp_path):
+
+    folder = str(tmp_path)
+    path = write(folder, "terrain.tif")
+    assert Handoff().claim(os.path.join(folder, "water.tif"), 1) is None
+    assert os.listdir(os.path.join(folder, watcher.claimFolder)) == []
+    assert os.path.exists(path)
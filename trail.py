@@ -0,0 +1,119 @@
+# Trail engine: resamples the trail polylines, drapes them on the terrain
+# and sweeps the boardwalk profile along them into a single mesh, without
+# modifiers or curve conversion.
+
+import bpy
+import numpy as np
+
+# cross section used when there is no T_profile object, (lateral, up) #
+boardProfile = ((-1.0, 0.0), (1.0, 0.0), (1.0, .2), (-1.0, .2))
+
+
+def resample(xy, spacing=1.0):
+    """ returns points at a fixed spacing along the polyline xy, the end
+    points included """
+
+    xy = np.asarray(xy, np.float64)
+    step = np.sqrt((np.diff(xy, axis=0) ** 2).sum(axis=1))
+    dist = np.concatenate([[0], np.cumsum(step)])
+    if dist[-1] == 0:
+        return xy[:1]
+    count = max(int(np.ceil(dist[-1] / spacing)), 1) + 1
+    at = np.linspace(0, dist[-1], count)
+    return np.column_stack([np.interp(at, dist, xy[:, i])
+                            for i in range(xy.shape[1])])
+
+
+def smoothPath(values, factor=.5, iterations=4):
+    """ laplacian smoothing of per point values along a path, the end
+    points stay in place """
+
+    v = np.array(values, np.float64)
+    for i in range(iterations):
+        v[1:-1] += factor * ((v[:-2] + v[2:]) / 2 - v[1:-1])
+    return v
+
+
+def fillGaps(values):
+    """ interpolates NaN values from their valid neighbours along the path,
+    returns None when no value is valid """
+
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return None
+    index = np.arange(len(values))
+    return np.interp(index, index[valid], values[valid])
+
+
+def profileCoords(obj, scene):
+    """ returns the (lateral, up) points of a profile object and whether
+    they form a closed loop. Curves are evaluated like a bevel object """
+
+    if obj is None:
+        return np.array(boardProfile), True
+    if obj.type == "MESH":
+        me = obj.data
+        closed = len(me.edges) >= len(me.vertices)
+    else:
+        me = obj.to_mesh(scene, True, "PREVIEW")
+        closed = any(s.use_cyclic_u for s in obj.data.splines)
+    co = np.empty(len(me.vertices) * 3, np.float32)
+    me.vertices.foreach_get("co", co)
+    if me is not obj.data:
+        bpy.data.meshes.remove(me)
+    if len(co) < 6:
+        return np.array(boardProfile), True
+    return co.reshape(-1, 3)[:, :2].astype(np.float64), closed
+
+
+def sweep(path, profile, closed=True):
+    """ sweeps the profile along the (n, 3) path, keeping it upright (Z up
+    twist). Returns the vertex coordinates and the quads as arrays """
+
+    n, m = len(path), len(profile)
+    tangent = np.gradient(path[:, :2], axis=0)
+    length = np.sqrt((tangent ** 2).sum(axis=1))
+    tangent /= np.where(length > 0, length, 1)[:, None]
+    lateral = np.column_stack([tangent[:, 1], -tangent[:, 0]])
+
+    co = np.empty((n, m, 3))
+    co[..., :2] = (path[:, None, :2] +
+                   profile[None, :, 0, None] * lateral[:, None, :])
+    co[..., 2] = path[:, None, 2] + profile[None, :, 1]
+
+    ring = np.arange(n * m).reshape(n, m)
+    nxt = np.roll(ring, -1, axis=1)
+    if not closed:
+        ring, nxt = ring[:, :-1], nxt[:, :-1]
+    quads = np.stack([ring[:-1], nxt[:-1], nxt[1:], ring[1:]], axis=-1)
+    return co.reshape(-1, 3), quads.reshape(-1, 4)
+
+
+def sweepMesh(name, paths, profile, closed=True):
+    """ creates one mesh sweeping the profile along each of the paths """
+
+    coords, faces = [], []
+    offset = 0
+    for path in paths:
+        if len(path) < 2:
+            continue
+        co, quads = sweep(path, profile, closed)
+        coords.append(co)
+        faces.append(quads + offset)
+        offset += len(co)
+
+    me = bpy.data.meshes.new(name)
+    if not coords:
+        return me
+    co = np.concatenate(coords).astype(np.float32)
+    quads = np.concatenate(faces)
+    me.vertices.add(len(co))
+    me.vertices.foreach_set("co", co.ravel())
+    me.loops.add(len(quads) * 4)
+    me.loops.foreach_set("vertex_index", quads.ravel().astype(np.int32))
+    me.polygons.add(len(quads))
+    me.polygons.foreach_set("loop_start",
+                            np.arange(0, len(quads) * 4, 4, dtype=np.int32))
+    me.polygons.foreach_set("loop_total", np.full(len(quads), 4, np.int32))
+    me.update(calc_edges=True)
+    return me
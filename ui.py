@@ -0,0 +1,399 @@
+# Operators and panel of the addon. Kept apart from Modeling3D so that
+# enabling the addon registers them without importing numpy, the readers
+# and the rest of the watch mode, which load on the first operator run.
+
+import importlib
+
+import bpy
+from bpy.props import StringProperty
+
+from .session import Session
+from .metrics import handlerMetrics
+
+
+def core(module="Modeling3D"):
+    """ returns the watch mode module, importing it on first use """
+
+    return importlib.import_module("." + module, __package__)
+
+
+# the addon's Adapt and watch mode state, shared by the operators #
+session = Session(lambda: core().Adapt())
+
+
+class ModalTimerOperator(bpy.types.Operator):
+        """Operator which interatively runs from a timer"""
+
+        bl_idname = "wm.modal_timer_operator"
+        bl_label = "Modal Timer Operator"
+        _timer = 0
+
+        def modal(self, context, event):
+            if event.type in {"RIGHTMOUSE", "ESC"}:
+                self.cancel(context)
+                return {"CANCELLED"}
+
+            # this condition encomasses all the actions required for watching
+            # the folder and related file/object operations. The folder
+            # itself is watched on a background thread, idle ticks only find
+            # an empty queue. Files are handed over once they are completely
+            # written, decoded on worker threads and run by priority within
+            # the per-tick budget, the rest carries to the next tick.
+
+            if event.type == "TIMER":
+
+                # picks up the Adapt resolved again after scene changes #
+                self.loop.adapt = session.adapt
+                try:
+                    done = self.loop.step(context.scene.camera)
+                except:
+                    # the watcher and timer do not outlive the operator #
+                    self.cancel(context)
+                    raise
+                if done:
+                    self.adaptMode = self.loop.adaptMode
+                    for area in context.screen.areas:
+                        if area.type == 'VIEW_3D':
+                            area.tag_redraw()
+
+            return {"PASS_THROUGH"}
+
+        def execute(self, context):
+
+            Modeling3D = core()
+            headless = core("headless")
+            # not available when run from the search menu of another area #
+            if hasattr(context.space_data, "show_manipulator"):
+                context.space_data.show_manipulator = False
+            wm = context.window_manager
+            wm.modal_handler_add(self)
+
+            self.treePatch = "TreePatch"
+            self.emptyTree = "empty.txt"
+            self.terrain = bpy.data.objects["terrain"]
+            self.adaptMode = None
+            self.prefs = Modeling3D.Prefs()
+            self._timer = wm.event_timer_add(Modeling3D.drainStep,
+                                             context.window)
+
+            self.loop = headless.WatchLoop(self.prefs, session.adapt).start()
+            session.scheduler = self.loop.scheduler
+            session.memory = self.loop.memory
+
+            #for img in bpy.data.images:
+                #if "patch_" in img.name:
+                    #bpy.data.images.remove(img, do_unlink=True)
+
+            #for i in self.terrain.modifiers:
+                #if "Particle" in i.name:
+                    #self.terrain.modifiers.remove(i)
+
+            #for tex in bpy.data.textures:
+                #if "class" in tex.name:
+                    #bpy.data.textures.remove(tex, do_unlink=True)
+
+            return {"RUNNING_MODAL"}
+
+        def cancel(self, context):
+            wm = context.window_manager
+            wm.event_timer_remove(self._timer)
+            self.loop.stop()
+            session.scheduler = None
+            session.memory = None
+
+
+class BirdCam(bpy.types.Operator):
+
+    """switch to user camera mode and runs animation walkthrough """
+
+    bl_idname = "wm.birdcam"
+    bl_label = "toggle_through_Birdviews"
+
+    def execute(self, context):
+
+        core().toggleCam("Bird_", adaptGrass=False)
+
+        return {'FINISHED'}
+
+
+class HumanCam(bpy.types.Operator):
+
+    """switch to user camera mode and runs animation walkthrough """
+
+    bl_idname = "wm.humancam"
+    bl_label = "toggle_through_Birdviews"
+
+    def execute(self, context):
+
+        core().toggleCam("Human_", adaptGrass=False)
+
+        return {'FINISHED'}
+
+
+class RotaryCam(bpy.types.Operator):
+
+    """switch to user camera mode and runs animation walkthrough """
+
+    bl_idname = "wm.rotarycam"
+    bl_label = "rotating_bird_view"
+
+    def execute(self, context):
+
+        core().toggleCam("Rotary_")
+        bpy.ops.screen.animation_play()
+
+        return {'FINISHED'}
+
+
+class VantageCam(bpy.types.Operator):
+
+    """switch to user camera mode and runs animation walkthrough """
+
+    bl_idname = "wm.vantagecam"
+    bl_label = "user_defined_views"
+
+    def execute(self, context):
+
+        core().toggleCam("VantageCam", adaptGrass=True)
+        return {'FINISHED'}
+
+
+class mist(bpy.types.Operator):
+
+    bl_idname = "wm.mist"
+    bl_label = "mist_creator"
+
+    def execute(self, context):
+        if not bpy.context.scene.world.mist_settings.use_mist:
+            bpy.context.scene.world.mist_settings.use_mist = True
+            return {'FINISHED'}
+
+        if bpy.context.scene.world.mist_settings.use_mist:
+            bpy.context.scene.world.mist_settings.use_mist = False
+            return {'FINISHED'}
+
+class Object_operators(bpy.types.Operator):
+    bl_idname = "objects.operator"
+    bl_label = "Object Operators"
+    button = StringProperty()
+
+    def execute(self, context):
+
+        world = bpy.context.scene.world.name
+        realism = world.split(".")[1]
+
+        if self.button == "TREES":
+            for i in bpy.data.objects["terrain"].modifiers:
+                if "Particle" in i.name:
+                    bpy.data.objects["terrain"].modifiers.remove(i)
+            core().remove("TreePatch_")
+
+        elif self.button == "TRAIL":
+            core().remove("trail")
+
+        return{'FINISHED'}
+
+
+class Engine_buttons(bpy.types.Operator):
+    bl_idname = "render.engine"
+    bl_label = "Change render Engine"
+    engineButton = StringProperty()
+
+    def execute(self, context):
+
+        adapt = session.adapt
+        engine = adapt.engine
+        realism = adapt.realism
+
+        if self.engineButton == "BLENDER_RENDER":
+
+            if realism == "High" and engine != "BLENDER_RENDER" :
+                adapt.changeEngine("BLENDER_RENDER",real=realism)
+                adapt.UpdateWorld("BLENDER_RENDER", "High")
+
+            else:
+                bpy.ops.error.message('INVOKE_DEFAULT',
+                                      type = "Error",
+                                      message = "Blender renderer can be only used in realistic mode")
+
+        elif self.engineButton == 'CYCLES':
+
+            if engine != "CYCLES":
+
+                adapt.changeEngine("CYCLES", real=realism)
+                adapt.UpdateWorld("CYCLES", realism)
+
+        elif self.engineButton == 'Low':
+
+            if engine == "CYCLES":
+                adapt.changeEngine(engine,real = 'Low')
+                adapt.changeRealism("Low")
+                adapt.UpdateWorld("CYCLES",'Low')
+            else:
+                bpy.ops.error.message('INVOKE_DEFAULT',
+                                      type = "Error",
+                                      message = "Low poly rendering can be only used in Cycles renderer")
+
+        elif self.engineButton == 'High':
+
+            adapt.changeEngine(engine,real = 'High')
+            adapt.changeRealism("High")
+            adapt.UpdateWorld(engine,'High')
+
+        if self.engineButton == "Render" and context.screen:
+            for area in context.screen.areas:
+                if area.type == 'VIEW_3D':
+                    area.spaces.active.viewport_shade = 'RENDERED'
+
+        return{'FINISHED'}
+
+# Panel
+class TLGUI(bpy.types.Panel):
+    # Create a Panel in the Tool Shelf
+    bl_category = "Tangible Landscape"
+    bl_label = "Tangibe Landscape "
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'TOOLS'
+
+    # Draw
+    def draw(self, context):
+
+        layout = self.layout
+        wm = context.window_manager
+        # scene = context.scene
+        box = layout.box()
+        box.label('System options')
+        row = box.row(align=True)
+        row.operator("wm.modal_timer_operator",
+                     text="Turn on Watch Mode",
+                     icon="GHOST_ENABLED")
+        scheduler = session.scheduler
+        if scheduler is not None:
+            row = box.row()
+            row.label("Pending updates: {0}  (last tick {1:.0f} ms)".format(
+                len(scheduler), scheduler.lastTick))
+            for layer, count in scheduler.backlog():
+                box.row().label("    {0}: {1}".format(layer, count))
+
+        memory = session.memory
+        if memory is not None and memory.history:
+            stamp, counts, rss = memory.history[-1]
+            growing = memory.growing()
+            row = box.row()
+            row.label("Memory: {0}  (purged {1})".format(
+                "{0:.0f} MB".format(rss / 1024.0 ** 2) if rss else "n/a",
+                memory.purged))
+            for t in sorted(counts):
+                row = box.row()
+                row.alert = t in growing
+                row.label("    {0}: {1}{2}".format(
+                    t, counts[t], "  (growing)" if t in growing else ""))
+            stats = core().imageCache.stats()
+            box.row().label(
+                "Image cache: {0} hits, {1} misses, {2} replaced, "
+                "{3:.0f} MB".format(stats["hits"], stats["misses"],
+                                    stats["replaced"],
+                                    stats["bytes"] / 1024.0 ** 2))
+
+        if len(handlerMetrics):
+            box.row().label("Timings (ms)      p50 / p95 / max")
+            for kind, name, count, p50, p95, peak in \
+                    handlerMetrics.summary():
+                label = name if kind == "handler" else name + " latency"
+                box.row().label("    {0}: {1:.0f} / {2:.0f} / {3:.0f}"
+                                "  ({4})".format(label, p50, p95, peak, count))
+            box.row().operator("wm.export_metrics", text="Export timings",
+                               icon="EXPORT")
+
+        # Camera Options #
+
+        box = layout.box()
+        box.alignment = 'CENTER'
+        box.label('Camera options', icon="CAMERA_DATA")
+        row = box.row(align=True)
+        row.operator("wm.vantagecam",
+                     text="Tangibly selected views",
+                     icon="MAN_TRANS")
+        row = box.row(align=True)
+        row.operator("wm.humancam", text="Preset Human views", icon="SCENE")
+        row = box.row()
+        row.operator("wm.birdcam", text="Preset Birdviews", icon="HAIR")
+        row = box.row()
+        row.operator("wm.rotarycam",
+                     text="Orbiting bird view",
+                     icon="BORDER_LASSO")
+
+        box = layout.box()
+        box.label('Atomospheric adjustments')
+
+        row4 = box.row()
+        row4.operator("wm.mist", text="Toggle Mist", icon="FORCE_TURBULENCE")
+
+        box = layout.box()
+        box.label('Object operations')
+
+        row1 = box.row()
+        row1.operator("objects.operator", text="Remove trees").button = "TREES"
+        row2 = box.row()
+        row2.operator("objects.operator", text="Trail").button = "TRAIL"
+        box = layout.box()
+
+        box.label('Rendering and Realism')
+        box.alignment = 'CENTER'
+        row4 = box.row()
+        row4.operator("render.engine",
+                      text="Blender").engineButton = "BLENDER_RENDER"
+        row4.operator("render.engine",
+                      text="Cycles").engineButton = "CYCLES"
+        row4.operator("render.engine",
+                      text="Render").engineButton = "Render"
+
+        row5 = box.row()
+        row5.label("Realism")
+        row6 = box.row()
+        row6.operator("render.engine",
+                      text="Low poly").engineButton = "Low"
+        row6.operator("render.engine",
+                      text="Realistic").engineButton = "High"
+
+        layout.row().separator()
+
+class ExportMetrics(bpy.types.Operator):
+    """Write the handler timings and update latencies to a CSV or JSON
+    file"""
+
+    bl_idname = "wm.export_metrics"
+    bl_label = "Export timings"
+    filepath = StringProperty(subtype="FILE_PATH")
+    filter_glob = StringProperty(default="*.csv;*.json",
+                                 options={'HIDDEN'})
+
+    def execute(self, context):
+        handlerMetrics.export(self.filepath)
+        self.report({'INFO'}, "Timings written to " + self.filepath)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "timings.csv"
+        context.window_manager.fileselect_add(self)
+        return {'RUNNING_MODAL'}
+
+
+class MessageOperator(bpy.types.Operator):
+    bl_idname = "error.message"
+    bl_label = "Message"
+    type = StringProperty()
+    message = StringProperty()
+
+    def execute(self, context):
+        self.report({'INFO'}, self.message)
+        print(self.message)
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        wm = context.window_manager
+        return wm.invoke_popup(self, width= 400, height=1000)
+
+    def draw(self, context):
+        self.layout.label(self.message)
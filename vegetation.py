@@ -0,0 +1,83 @@
+# Vegetation placement from the patch class rasters: tree positions are
+# sampled from the class density with numpy and written as the vertices of
+# one instancing object per class, instead of a texture driven emitter on
+# the whole terrain.
+
+import zlib
+
+import bpy
+import numpy as np
+
+
+def patchDensity(image):
+    """ returns the (rows, cols) placement density in [0, 1] of a class
+    raster read by image_io.readPNG: its intensity times its alpha """
+
+    image = np.asarray(image)
+    scale = float(np.iinfo(image.dtype).max) if image.dtype.kind in "ui" \
+        else 1.0
+    channels = image.shape[2] if image.ndim == 3 else 1
+    if image.ndim == 2:
+        return image / scale
+    color = image[..., :3] if channels >= 3 else image[..., :1]
+    density = color.mean(axis=2) / scale
+    if channels in (2, 4):
+        density *= image[..., -1] / scale
+    return density.astype(np.float32)
+
+
+def classSeed(name):
+    """ stable random seed of a class, so unchanged areas keep their trees
+    when the patch is redrawn """
+
+    return zlib.crc32(name.encode("utf-8")) & 0x7fffffff
+
+
+def stratifiedSample(density, extent, spacing, seed=0, jitter=.7):
+    """Returns the (n, 2) positions of the trees of a class over the
+    (xmin, ymin, xmax, ymax) extent the density raster covers, north up.
+
+    The extent is split in spacing x spacing cells, every cell holds one
+    candidate jittered within jitter of the cell around its centre, kept
+    with the probability of the density under it. The candidates only
+    depend on the seed and the grid, so redrawing a patch only adds or
+    removes the trees where the density changed"""
+
+    xmin, ymin, xmax, ymax = extent
+    nx = max(int(np.ceil((xmax - xmin) / spacing)), 1)
+    ny = max(int(np.ceil((ymax - ymin) / spacing)), 1)
+    rng = np.random.RandomState(seed)
+    offset = .5 + (rng.random_sample((2, ny, nx)) - .5) * jitter
+    keep = rng.random_sample((ny, nx))
+
+    x = xmin + (np.arange(nx)[None, :] + offset[0]) * spacing
+    y = ymax - (np.arange(ny)[:, None] + offset[1]) * spacing
+    h, w = density.shape
+    col = ((x - xmin) / (xmax - xmin) * w).astype(np.int64)
+    row = ((ymax - y) / (ymax - ymin) * h).astype(np.int64)
+    inside = (col < w) & (row < h)
+    col = np.minimum(col, w - 1)
+    row = np.minimum(row, h - 1)
+
+    take = inside & (keep < density[row, col])
+    return np.column_stack([x[take], y[take]])
+
+
+def setPoints(obj, co):
+    """ replaces the vertices of the instancing object by the (n, 3) points,
+    swapping in a new mesh only when their number changed """
+
+    me = obj.data
+    co = np.ascontiguousarray(co, np.float32)
+    if len(me.vertices) != len(co):
+        old = me
+        me = bpy.data.meshes.new(old.name)
+        me.vertices.add(len(co))
+        for mat in old.materials:
+            me.materials.append(mat)
+        obj.data = me
+        if old.users == 0:
+            bpy.data.meshes.remove(old)
+    me.vertices.foreach_set("co", co.ravel())
+    me.update()
+    return me
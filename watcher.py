@@ -0,0 +1,317 @@
+# Watch folder backends. A background thread turns file system changes into
+# ChangeEvent tuples on a queue that the modal operator drains on its tick.
+
+import os
+import sys
+import time
+import queue
+import select
+import shutil
+import struct
+import ctypes
+import ctypes.util
+import threading
+from collections import namedtuple
+
+CREATED = "created"
+CHANGED = "changed"
+CLOSED = "closed"
+MOVED = "moved"
+DELETED = "deleted"
+
+ChangeEvent = namedtuple("ChangeEvent", ["kind", "layer", "name", "path",
+                                         "time"])
+
+# inotify flags, see inotify(7) #
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# only completed writes are reported, not every intermediate modification #
+inotifyKinds = ((IN_CLOSE_WRITE, CLOSED), (IN_MOVED_TO, MOVED),
+                (IN_DELETE, DELETED), (IN_MOVED_FROM, DELETED))
+eventHeader = struct.Struct("iIII")
+
+
+def _libc():
+    """ returns libc when it provides inotify, None otherwise """
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6",
+                           use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class FolderWatcher:
+    """Watches a folder on a background thread and queues a ChangeEvent for
+    every change to a file that classify() maps to a layer. Uses inotify on
+    Linux and falls back to polling the folder every interval seconds"""
+
+    def __init__(self, folder, classify, interval=1.0, backend=None):
+
+        self.folder = folder
+        self.classify = classify
+        self.interval = interval
+        self.events = queue.Queue()
+        self.backend = backend or ("inotify" if _libc() else "polling")
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+
+        self._stop.clear()
+        target = self._inotify if self.backend == "inotify" else self._poll
+        self._thread = threading.Thread(target=target,
+                                        name="TL folder watcher")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(2 * self.interval)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def drain(self):
+        """ returns the events queued since the last call, oldest first """
+
+        events = []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def _emit(self, kind, name):
+
+        layer = self.classify(name)
+        if layer:
+            self.events.put(ChangeEvent(kind, layer, name,
+                                        os.path.join(self.folder, name),
+                                        time.time()))
+
+    def _scan(self):
+        """ returns a {name: (size, mtime)} snapshot of the folder """
+
+        snapshot = {}
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            return snapshot
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file():
+                snapshot[entry.name] = (stat.st_size, stat.st_mtime)
+        return snapshot
+
+    def _poll(self):
+
+        previous = {}
+        while not self._stop.is_set():
+            current = self._scan()
+            for name, stat in current.items():
+                if name not in previous:
+                    self._emit(CREATED, name)
+                elif previous[name] != stat:
+                    self._emit(CHANGED, name)
+            for name in previous:
+                if name not in current:
+                    self._emit(DELETED, name)
+            previous = current
+            self._stop.wait(self.interval)
+
+    def _inotify(self):
+
+        libc = _libc()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC) if libc else -1
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+        if fd < 0 or libc.inotify_add_watch(
+                fd, os.fsencode(self.folder), mask) < 0:
+            if fd >= 0:
+                os.close(fd)
+            print("inotify unavailable for {0}, polling instead".format(
+                self.folder))
+            self.backend = "polling"
+            return self._poll()
+
+        try:
+            for name in self._scan():
+                self._emit(CREATED, name)
+            while not self._stop.is_set():
+                ready = select.select([fd], [], [], .5)[0]
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                self._dispatch(data)
+        finally:
+            os.close(fd)
+
+    def _dispatch(self, data):
+
+        pos = 0
+        while pos + eventHeader.size <= len(data):
+            wd, mask, cookie, length = eventHeader.unpack_from(data, pos)
+            pos += eventHeader.size
+            name = data[pos:pos + length].rstrip(b"\x00")
+            pos += length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were dropped, report every file as changed #
+                for name in self._scan():
+                    self._emit(CHANGED, name)
+                continue
+            for flag, kind in inotifyKinds:
+                if mask & flag and name:
+                    self._emit(kind, os.fsdecode(name))
+                    break
+
+
+# handed off files are moved to claimFolder/<seq>/<name> in the watch
+# folder, so that a newer version written meanwhile is left alone #
+claimFolder = ".claimed"
+
+# data holds the decoded file contents once a decoder has run #
+Update = namedtuple("Update", ["seq", "layer", "name", "path", "time",
+                               "data"])
+Update.__new__.__defaults__ = (None,)
+
+
+class Handoff:
+    """Turns watcher events into updates of completely written files.
+
+    A file is complete when it was renamed into the folder, when a sidecar
+    marker (name + markerExt) exists, or when its size and mtime, and those
+    of its companion files, did not change for settle seconds. Every update
+    gets a sequence number. Versions of a file superseded before they were
+    handed off are counted in skipped and only the newest is returned.
+
+    Handed off files and their companions are claimed: moved out of the
+    way under claimFolder with the name they had, the update path points
+    to the claimed file and release() removes it once done with"""
+
+    markerExt = ".ready"
+
+    def __init__(self, settle=.25, companions=None, requireMarker=False):
+
+        self.settle = settle
+        self.companions = companions or {}
+        self.requireMarker = requireMarker
+        self.seq = 0
+        self.skipped = 0
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def feed(self, events):
+
+        for event in events:
+            if event.kind == DELETED:
+                self._pending.pop(event.name, None)
+                continue
+            entry = self._pending.setdefault(event.name, {
+                "stat": None, "since": event.time, "renamed": False,
+                "versions": 0})
+            entry["event"] = event
+            entry["renamed"] = entry["renamed"] or event.kind == MOVED
+            if event.kind in (CLOSED, MOVED):
+                entry["versions"] += 1
+
+    def _stat(self, path):
+        """ returns the size and mtime of the file and its companions, None
+        while any of them is missing """
+
+        root, ext = os.path.splitext(path)
+        paths = [path] + [root + c for c in self.companions.get(ext, ())]
+        try:
+            return tuple((st.st_size, st.st_mtime)
+                         for st in [os.stat(p) for p in paths])
+        except OSError:
+            return None
+
+    def collect(self, events=(), now=None):
+        """ feeds the passed events and returns the updates of the files
+        completed since the last call, in sequence order """
+
+        self.feed(events)
+        now = time.time() if now is None else now
+        updates = []
+        for name, entry in list(self._pending.items()):
+            event = entry["event"]
+            stat = self._stat(event.path)
+            if stat is None:
+                continue
+            marker = event.path + self.markerExt
+            if os.path.exists(marker):
+                try:
+                    os.remove(marker)
+                except OSError:
+                    pass
+            elif self.requireMarker:
+                continue
+            elif not entry["renamed"]:
+                if stat != entry["stat"]:
+                    entry["stat"] = stat
+                    entry["since"] = now
+                if now - entry["since"] < self.settle:
+                    continue
+
+            del self._pending[name]
+            self.skipped += max(0, entry["versions"] - 1)
+            self.seq += 1
+            path = self.claim(event.path, self.seq)
+            if path is None:
+                continue
+            updates.append(Update(self.seq, event.layer, name, path,
+                                  stat[0][1]))
+        return updates
+
+    def claim(self, path, seq):
+        """ moves the file and its companions to their claim folder and
+        returns the new path, None when the file is gone """
+
+        folder, name = os.path.split(path)
+        target = os.path.join(folder, claimFolder, str(seq))
+        os.makedirs(target, exist_ok=True)
+        root, ext = os.path.splitext(name)
+        try:
+            os.replace(path, os.path.join(target, name))
+        except OSError:
+            shutil.rmtree(target, ignore_errors=True)
+            return None
+        for companion in self.companions.get(ext, ()):
+            try:
+                os.replace(os.path.join(folder, root + companion),
+                           os.path.join(target, root + companion))
+            except OSError:
+                pass
+        return os.path.join(target, name)
+
+
+def release(update):
+    """ removes what is left of a claimed update file and its companions """
+
+    folder = os.path.dirname(update.path)
+    if os.path.basename(os.path.dirname(folder)) == claimFolder:
+        shutil.rmtree(folder, ignore_errors=True)